@@ -2,15 +2,27 @@
 """
 Flask后端应用 - 智慧水利监测数据API（带用户认证）
 """
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, make_response, request
 from flask_cors import CORS
+from functools import wraps
 import sqlite3
 import os
+import io
+import json
+import math
+import base64
 import pandas as pd
 from datetime import datetime, timedelta
 
 # 导入认证模块
 from auth import auth_bp, read_permission_required, write_permission_required
+from storage import (
+    COLUMNAR_BINARY, COLUMNAR_JSON, EXPORT_FORMATS, EXPORT_LAYOUTS, MEASUREMENT_SCOPES, MeasurementScan,
+    analytics_mirror, db_pool, downsample, encode_columnar_binary, encode_columnar_json, export_chunks, fetch_batch,
+    fetch_ordered, from_epoch, gzip_chunks, ingest_queue, instrument_catalog, iter_records, migrate_database,
+    normalize_time, partition_router, query_statistics, query_summaries, query_summary, response_cache, to_epoch,
+    wide_columns
+)
 
 # 创建Flask应用
 app = Flask(__name__)
@@ -36,14 +48,65 @@ else:
 # 注册认证蓝图
 app.register_blueprint(auth_bp)
 
-# 数据库路径
-DB_PATH = os.path.join(os.path.dirname(__file__), '../backend/data/monitoring.db')
+# 启动时执行未应用的数据库迁移
+migrate_database()
+
+# 请求结束时把连接归还连接池
+db_pool.init_app(app)
 
 def get_db_connection():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # 返回字典格式的结果
-    return conn
+    """获取数据库连接（连接池中请求范围内共享的连接，close()不会真正关闭）"""
+    return db_pool.connection()
+
+# ==================== 响应缓存 ====================
+# 测量数据接口按 Accept 协商的表示，第一个为默认值
+MEASUREMENT_MIMETYPES = ['application/json', COLUMNAR_JSON, COLUMNAR_BINARY]
+
+def response_format():
+    """按请求头 Accept 返回测量数据的表示：application/json、列式JSON或二进制列式表示"""
+    return request.accept_mimetypes.best_match(MEASUREMENT_MIMETYPES, default=MEASUREMENT_MIMETYPES[0])
+
+def cached_response(scopes, by_instrument=False):
+    """按数据版本缓存GET响应并设置强ETag，请求的 If-None-Match 与之相同时返回304
+
+    缓存键为 (端点, 排序后的查询参数, 协商的表示, 角色)，只缓存200响应；版本号在执行视图函数之前读取，
+    执行期间的写入最多使缓存项比版本号更新，不会返回过期的数据。
+    by_instrument 为True时带 instrument_id 的请求只随该仪器的数据失效。
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not response_cache.enabled:
+                return f(*args, **kwargs)
+            
+            conn = get_db_connection()
+            instrument_id = request.args.get('instrument_id') if by_instrument else None
+            version = response_cache.version(conn, scopes, instrument_id or None)
+            conn.close()
+            
+            key = (
+                request.endpoint,
+                tuple(sorted((name, value.strip()) for name, value in request.args.items(multi=True))),
+                response_format(),
+                g.role
+            )
+            entry = response_cache.lookup(key, version)
+            if entry is None:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                entry = response_cache.store(key, version, response.get_data(), response.mimetype)
+            
+            response = app.response_class(entry.body, mimetype=entry.mimetype)
+            response.set_etag(entry.etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Accept')
+            response = response.make_conditional(request)
+            if response.status_code == 304:
+                response_cache.record_not_modified()
+            return response
+        return decorated
+    return decorator
 
 # ==================== 健康检查端点 ====================
 @app.route('/api/health', methods=['GET'])
@@ -75,6 +138,7 @@ def index():
 # ==================== 监测类型端点 ====================
 @app.route('/api/types', methods=['GET'])
 @read_permission_required
+@cached_response(('type',))
 def get_monitoring_types():
     """获取监测类型列表"""
     conn = get_db_connection()
@@ -90,22 +154,11 @@ def get_monitoring_types():
 # ==================== 仪器端点 ====================
 @app.route('/api/instruments', methods=['GET'])
 @read_permission_required
+@cached_response(('catalog', 'type'))
 def get_instruments():
-    """获取仪器列表"""
+    """获取仪器列表（读取仪器目录，目录未变化时直接返回进程内缓存）"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT DISTINCT instrument_id, type_id
-        FROM measurement
-        ORDER BY instrument_id
-    ''')
-    instruments = cursor.fetchall()
-    
-    # 获取类型名称
-    cursor.execute('SELECT id, name FROM monitoring_type')
-    type_map = {id: name for id, name in cursor.fetchall()}
-    
+    instruments = instrument_catalog.get(conn)
     conn.close()
     
     result = []
@@ -113,16 +166,98 @@ def get_instruments():
         result.append({
             'instrument_id': inst['instrument_id'],
             'type_id': inst['type_id'],
-            'type_name': type_map.get(inst['type_id'], '未知类型')
+            'type_name': inst['type_name'] or '未知类型',
+            'location': inst['location'],
+            'position': inst['position'],
+            'elevation': inst['elevation'],
+            'installed_at': inst['installed_at'],
+            'first_time': inst['first_time'],
+            'last_time': inst['last_time'],
+            'count': inst['row_count']
         })
     
     return jsonify(result)
 
 # ==================== 测量数据端点 ====================
+# 返回给客户端的测量记录列（measure_ts 只用于过滤和排序，不返回）
+MEASUREMENT_COLUMNS = '''
+    m.id, m.type_id, m.instrument_id, m.measure_time, m.value, m.water_level,
+    m.created_at, m.updated_at, t.name as type_name, t.unit
+'''
+
+def encode_cursor(measure_ts, measurement_id):
+    """把最后一条记录的 (measure_ts, id) 编码为不透明的分页游标"""
+    raw = json.dumps([measure_ts, measurement_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """解码分页游标，返回 (measure_ts, id)，无效时抛出 ValueError
+
+    兼容 measure_ts 上线前以 measure_time 字符串编码的游标。
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        measure_ts, measurement_id = json.loads(raw)
+        if isinstance(measure_ts, str):
+            measure_ts = to_epoch(measure_ts)
+    except (ValueError, TypeError):
+        raise ValueError('无效的分页游标')
+    if not isinstance(measure_ts, int) or not isinstance(measurement_id, int):
+        raise ValueError('无效的分页游标')
+    return measure_ts, measurement_id
+
+def build_measurement_query(type_id=None, instrument_id=None, start_ts=None, end_ts=None):
+    """构建测量记录查询，返回 (query, params)
+
+    query 中 {table} 为热数据表或归档分区的表，末尾不带 ORDER BY 和 LIMIT。
+    """
+    query = f'''
+        SELECT {MEASUREMENT_COLUMNS}, m.measure_ts
+        FROM {{table}} m
+        JOIN monitoring_type t ON m.type_id = t.id
+        WHERE 1=1
+    '''
+    params = []
+    
+    if type_id:
+        query += ' AND m.type_id = ?'
+        params.append(type_id)
+    
+    if instrument_id:
+        query += ' AND m.instrument_id = ?'
+        params.append(instrument_id)
+    
+    if start_ts is not None:
+        query += ' AND m.measure_ts >= ?'
+        params.append(start_ts)
+    
+    if end_ts is not None:
+        query += ' AND m.measure_ts <= ?'
+        params.append(end_ts)
+    
+    return query, params
+
+def columnar_response(rows, mimetype, meta=None):
+    """按协商的列式表示（列式JSON或二进制）返回测量记录，meta 为附加的顶层字段"""
+    if mimetype == COLUMNAR_BINARY:
+        return app.response_class(encode_columnar_binary(rows, meta), mimetype=mimetype)
+    return app.response_class(encode_columnar_json(rows, meta), mimetype=mimetype)
+
 @app.route('/api/measurements', methods=['GET'])
 @read_permission_required
+@cached_response(MEASUREMENT_SCOPES, by_instrument=True)
 def get_measurements():
-    """获取测量数据"""
+    """获取测量数据
+
+    默认按 LIMIT/OFFSET 分页并直接返回记录数组；带 cursor 参数（第一页传空值）时
+    按 (measure_ts, id) 游标分页，返回 {data, next_cursor}，深分页同样走索引范围扫描。
+    start_time/end_time 为ISO 8601时间（不带时区的按UTC处理），换算为整数秒后按 measure_ts 过滤，
+    分区路由据此裁剪归档分区，按时间从新到旧依次查询热数据和各分区，取够一页即停止；
+    列式分区按同样的过滤条件（MeasurementScan）在内存映射的文件上读取。
+    带 max_points 参数时不分页（忽略 limit/offset），每个 (监测类型, 仪器) 序列按LTTB算法
+    抽取至多 max_points 个点，返回按时间倒序的记录数组，供图表绘制。
+    请求头 Accept 为列式JSON或二进制列式表示时，同样的记录按列返回，序列元数据只出现一次（见 storage/payloads.py）。
+    """
     # 获取查询参数
     type_id = request.args.get('type_id', type=int)
     instrument_id = request.args.get('instrument_id')
@@ -130,96 +265,119 @@ def get_measurements():
     end_time = request.args.get('end_time')
     limit = request.args.get('limit', default=100, type=int)
     offset = request.args.get('offset', default=0, type=int)
+    max_points = request.args.get('max_points', type=int)
+    cursor_mode = 'cursor' in request.args
+    cursor_key = None
+    mimetype = response_format()
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    if 'max_points' in request.args:
+        if max_points is None or max_points < 3:
+            return jsonify({'error': '参数错误', 'message': 'max_points 必须是不小于3的整数'}), 400
+        if cursor_mode:
+            return jsonify({'error': '参数错误', 'message': 'cursor 和 max_points 不能同时使用'}), 400
     
-    # 构建查询
-    query = '''
-        SELECT m.*, t.name as type_name, t.unit
-        FROM measurement m
-        JOIN monitoring_type t ON m.type_id = t.id
-        WHERE 1=1
-    '''
-    params = []
-    
-    if type_id:
-        query += ' AND m.type_id = ?'
-        params.append(type_id)
+    if cursor_mode:
+        if 'offset' in request.args:
+            return jsonify({'error': '参数错误', 'message': 'cursor 和 offset 不能同时使用'}), 400
+        if request.args['cursor']:
+            try:
+                cursor_key = decode_cursor(request.args['cursor'])
+            except ValueError as e:
+                return jsonify({'error': '参数错误', 'message': str(e)}), 400
     
-    if instrument_id:
-        query += ' AND m.instrument_id = ?'
-        params.append(instrument_id)
+    try:
+        start_ts = to_epoch(start_time) if start_time else None
+        end_ts = to_epoch(end_time) if end_time else None
+    except ValueError as e:
+        return jsonify({'error': '参数错误', 'message': str(e)}), 400
     
-    if start_time:
-        query += ' AND m.measure_time >= ?'
-        params.append(start_time)
+    conn = get_db_connection()
+    query, params = build_measurement_query(type_id, instrument_id, start_ts, end_ts)
     
-    if end_time:
-        query += ' AND m.measure_time <= ?'
-        params.append(end_time)
+    if max_points:
+        # 按序列降采样，先读取轻量列抽样，再读取选中记录的完整列
+        scan = MeasurementScan(type_id, instrument_id, start_ts, end_ts, None, False)
+        measurements = downsample(conn, partition_router, query, params, scan, max_points)
+        conn.close()
+        if mimetype != 'application/json':
+            return columnar_response(measurements, mimetype)
+        for m in measurements:
+            del m['measure_ts']
+        return jsonify(measurements)
     
-    query += ' ORDER BY m.measure_time DESC LIMIT ? OFFSET ?'
-    params.extend([limit, offset])
+    if cursor_mode:
+        # 从上一页最后一条记录之后继续，多取一条用于判断是否还有下一页
+        if cursor_key:
+            query += ' AND m.measure_ts <= ? AND (m.measure_ts < ? OR m.id < ?)'
+            params.extend([cursor_key[0], cursor_key[0], cursor_key[1]])
+            end_ts = cursor_key[0] if end_ts is None else min(end_ts, cursor_key[0])
+        query += ' ORDER BY m.measure_ts DESC, m.id DESC'
+        fetch_limit, fetch_offset = limit + 1, 0
+    else:
+        query += ' ORDER BY m.measure_ts DESC'
+        fetch_limit, fetch_offset = limit, offset
     
-    cursor.execute(query, params)
-    measurements = cursor.fetchall()
+    scan = MeasurementScan(type_id, instrument_id, start_ts, end_ts, cursor_key, cursor_mode)
+    tables = partition_router.sources(conn, start_ts, end_ts)
+    rows = fetch_ordered(conn, tables, query, params, fetch_limit, fetch_offset, scan)
     
     conn.close()
     
-    return jsonify([dict(m) for m in measurements])
+    page = rows[:limit] if cursor_mode else rows
+    next_cursor = None
+    if cursor_mode and len(rows) > limit and page:
+        next_cursor = encode_cursor(page[-1]['measure_ts'], page[-1]['id'])
+    
+    # 列式表示直接从查询结果按列读取，不转换为逐条记录的字典
+    if mimetype != 'application/json':
+        return columnar_response(page, mimetype, {'next_cursor': next_cursor} if cursor_mode else None)
+    
+    measurements = [dict(m) for m in rows]
+    page = measurements[:limit] if cursor_mode else measurements
+    for m in measurements:
+        del m['measure_ts']
+    
+    if not cursor_mode:
+        return jsonify(measurements)
+    return jsonify({
+        'data': page,
+        'next_cursor': next_cursor
+    })
 
 # ==================== 统计数据端点 ====================
 @app.route('/api/statistics', methods=['GET'])
 @read_permission_required
+@cached_response(MEASUREMENT_SCOPES)
 def get_statistics():
-    """获取统计数据"""
+    """获取统计数据（读取按监测类型维护的计数器，耗时与测量记录数无关；启用分析镜像时在镜像上聚合）"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 总记录数
-    cursor.execute('SELECT COUNT(*) FROM measurement')
-    total_measurements = cursor.fetchone()[0]
-    
-    # 按类型统计
-    cursor.execute('''
-        SELECT t.name, COUNT(*) as count, AVG(m.value) as avg_value
-        FROM measurement m
-        JOIN monitoring_type t ON m.type_id = t.id
-        GROUP BY t.id, t.name
-    ''')
-    type_stats = cursor.fetchall()
-    
-    # 时间范围
-    cursor.execute('SELECT MIN(measure_time), MAX(measure_time) FROM measurement')
-    time_range = cursor.fetchone()
-    
-    # 仪器数量
-    cursor.execute('SELECT COUNT(DISTINCT instrument_id) FROM measurement')
-    instrument_count = cursor.fetchone()[0]
-    
+    if analytics_mirror:
+        stats = analytics_mirror.statistics(conn)
+    else:
+        stats = query_statistics(conn)
     conn.close()
     
     return jsonify({
-        'total_measurements': total_measurements,
+        'total_measurements': stats['total_measurements'],
         'type_statistics': [
             {
                 'name': stat['name'],
                 'count': stat['count'],
                 'avg_value': round(stat['avg_value'] or 0, 2)
             }
-            for stat in type_stats
+            for stat in stats['type_statistics']
         ],
         'time_range': {
-            'start': time_range[0],
-            'end': time_range[1]
+            'start': stats['time_range'][0],
+            'end': stats['time_range'][1]
         },
-        'instrument_count': instrument_count
+        'instrument_count': stats['instrument_count']
     })
 
 # ==================== 数据摘要端点 ====================
 @app.route('/api/measurements/summary', methods=['GET'])
 @read_permission_required
+@cached_response(MEASUREMENT_SCOPES, by_instrument=True)
 def get_measurements_summary():
     """获取数据摘要（按时间间隔分组）"""
     interval = request.args.get('interval', 'month')  # day, week, month, year
@@ -228,82 +386,266 @@ def get_measurements_summary():
     end_time = request.args.get('end_time')  # 结束时间，用于确定查询的时间范围
     limit = request.args.get('limit', default=12, type=int)
     
-    # 根据间隔确定日期格式
-    if interval == 'day':
-        date_format = '%Y-%m-%d'
-    elif interval == 'week':
-        date_format = '%Y-%W'
-    elif interval == 'month':
-        date_format = '%Y-%m'
-    else:  # year
-        date_format = '%Y'
-    
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    query = '''
-        SELECT 
-            strftime(?, m.measure_time) as period,
-            COUNT(*) as count,
-            AVG(m.value) as avg_value,
-            MIN(m.value) as min_value,
-            MAX(m.value) as max_value
-        FROM measurement m
-        WHERE 1=1
-    '''
-    params = [date_format]
-    
-    if type_id:
-        query += ' AND m.type_id = ?'
-        params.append(type_id)
-    
-    if instrument_id:
-        query += ' AND m.instrument_id = ?'
-        params.append(instrument_id)
-    
-    if end_time:
-        # 根据间隔计算开始时间
-        if interval == 'day':
-            # 查询最近limit天的数据
-            query += ' AND m.measure_time <= ?'
-            params.append(end_time)
-        elif interval == 'week':
-            # 查询最近limit周的数据
-            query += ' AND m.measure_time <= ?'
-            params.append(end_time)
-        elif interval == 'month':
-            # 查询最近limit个月的数据
-            query += ' AND m.measure_time <= ?'
-            params.append(end_time)
-        else:  # year
-            # 查询最近limit年的数据
-            query += ' AND m.measure_time <= ?'
-            params.append(end_time)
-    
-    query += '''
-        GROUP BY period
-        ORDER BY period DESC
-        LIMIT ?
-    '''
-    params.append(limit)
-    
-    cursor.execute(query, params)
-    summary = cursor.fetchall()
-    
-    conn.close()
+    try:
+        summary = summary_rows(conn, interval, type_id, instrument_id, end_time, limit)
+    except ValueError as e:
+        return jsonify({'error': '参数错误', 'message': str(e)}), 400
+    finally:
+        conn.close()
     
-    return jsonify([
+    return jsonify(format_summary(summary))
+
+def summary_rows(conn, interval, type_id, instrument_id, end_time, limit):
+    """查询一个摘要，end_time 无效时抛出 ValueError
+
+    完整的时间段从汇总表读取，end_time所在的时间段从测量记录补算；启用分析镜像时在镜像上聚合。
+    """
+    if analytics_mirror:
+        return analytics_mirror.summary(conn, interval, type_id, instrument_id, end_time, limit)
+    return query_summary(conn, interval, type_id, instrument_id, end_time, limit, router=partition_router)
+
+def format_summary(summary):
+    """把摘要行转换为响应格式（数值保留2位小数）"""
+    return [
         {
-            'period': row['period'],
+            'period': row['period'] or None,
             'count': row['count'],
             'avg_value': round(row['avg_value'] or 0, 2),
             'min_value': round(row['min_value'] or 0, 2),
             'max_value': round(row['max_value'] or 0, 2)
         }
         for row in summary
-    ])
+    ]
+
+# ==================== 批量查询端点 ====================
+# 一次批量请求最多包含的子查询数
+BATCH_MAX_QUERIES = 50
+
+def parse_batch_query(item):
+    """校验批量请求中的一个子查询并补全默认值（与对应GET接口的默认值相同），无效时抛出 ValueError"""
+    if not isinstance(item, dict) or item.get('kind') not in ('measurements', 'summary'):
+        raise ValueError('kind 必须是 measurements 或 summary')
+    query = {'kind': item['kind']}
+    for name in ('type_id', 'limit', 'offset', 'max_points'):
+        value = item.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+            raise ValueError(f'{name} 必须是整数')
+        query[name] = value
+    for name in ('instrument_id', 'start_time', 'end_time', 'interval'):
+        value = item.get(name)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f'{name} 必须是字符串')
+        query[name] = value or None
+    
+    if query['kind'] == 'summary':
+        query['interval'] = query['interval'] or 'month'
+        query['limit'] = 12 if query['limit'] is None else query['limit']
+        if query['end_time']:
+            normalize_time(query['end_time'])
+        return query
+    
+    query['limit'] = 100 if query['limit'] is None else query['limit']
+    query['offset'] = query['offset'] or 0
+    if query['max_points'] is not None and query['max_points'] < 3:
+        raise ValueError('max_points 必须是不小于3的整数')
+    query['start_ts'] = to_epoch(query['start_time']) if query['start_time'] else None
+    query['end_ts'] = to_epoch(query['end_time']) if query['end_time'] else None
+    return query
+
+def run_batch_measurements(conn, queries, results):
+    """执行测量数据子查询，queries 为 (下标, 子查询) 列表，结果写入 results
+
+    只涉及热数据的分页查询合并为一条 UNION ALL 语句（每个子查询仍按索引读取各自的 LIMIT 条）；
+    降采样和涉及归档分区的查询在同一连接上逐个执行。返回结果与 GET /api/measurements 相同。
+    """
+    archived_until = partition_router.archived_until(conn)
+    merged = []
+    for index, query in queries:
+        sql, params = build_measurement_query(
+            query['type_id'], query['instrument_id'], query['start_ts'], query['end_ts']
+        )
+        if query['max_points']:
+            scan = MeasurementScan(
+                query['type_id'], query['instrument_id'], query['start_ts'], query['end_ts'], None, False
+            )
+            results[index] = downsample(conn, partition_router, sql, params, scan, query['max_points'])
+            continue
+        sql += ' ORDER BY m.measure_ts DESC'
+        if archived_until is None or (query['start_ts'] is not None and query['start_ts'] > archived_until):
+            merged.append((index, (sql.format(table='measurement'), params, query['limit'], query['offset'])))
+            continue
+        scan = MeasurementScan(
+            query['type_id'], query['instrument_id'], query['start_ts'], query['end_ts'], None, False
+        )
+        tables = partition_router.sources(conn, query['start_ts'], query['end_ts'])
+        rows = fetch_ordered(conn, tables, sql, params, query['limit'], query['offset'], scan)
+        results[index] = [dict(row) for row in rows]
+    
+    pages = fetch_batch(conn, [page for _, page in merged])
+    for (index, _), rows in zip(merged, pages):
+        results[index] = [dict(row) for row in rows]
+        for m in results[index]:
+            del m['batch_index']
+    for index, _ in queries:
+        for m in results[index]:
+            del m['measure_ts']
+
+def run_batch_summaries(conn, queries, results):
+    """执行摘要子查询，queries 为 (下标, 子查询) 列表，结果写入 results
+
+    只有 instrument_id 不同的子查询合并为一条SQL（query_summaries）；
+    不带 instrument_id 的子查询和启用分析镜像时逐个执行。返回结果与 GET /api/measurements/summary 相同。
+    """
+    groups = {}
+    for index, query in queries:
+        key = (query['interval'], query['type_id'], query['end_time'], query['limit'])
+        groups.setdefault(key, []).append((index, query['instrument_id']))
+    
+    for (interval, type_id, end_time, limit), members in groups.items():
+        instrument_ids = [instrument_id for _, instrument_id in members if instrument_id]
+        summaries = {}
+        if not analytics_mirror and len(set(instrument_ids)) > 1:
+            summaries = query_summaries(
+                conn, interval, instrument_ids, type_id, end_time, limit, router=partition_router
+            )
+        for index, instrument_id in members:
+            if instrument_id in summaries:
+                rows = summaries[instrument_id]
+            else:
+                rows = summary_rows(conn, interval, type_id, instrument_id, end_time, limit)
+            results[index] = format_summary(rows)
+
+@app.route('/api/batch', methods=['POST'])
+@read_permission_required
+def batch_query():
+    """批量查询：一个请求执行多个测量数据和摘要子查询
+
+    请求体为 {"queries": [...]}，每个子查询的 kind 为 measurements 或 summary，其余字段与对应GET接口的
+    查询参数相同（不支持 cursor）。所有子查询共用一次认证和一个连接，响应 {"results": [...]} 与 queries
+    一一对应，每项与对应GET接口的响应体相同；参数无效的子查询为 {error, message}，不影响其他子查询。
+    """
+    data = request.get_json(silent=True)
+    queries = data.get('queries') if isinstance(data, dict) else None
+    if not isinstance(queries, list) or not queries:
+        return jsonify({'error': '参数错误', 'message': '请求体必须包含非空的 queries 数组'}), 400
+    if len(queries) > BATCH_MAX_QUERIES:
+        return jsonify({'error': '参数错误', 'message': f'每次最多 {BATCH_MAX_QUERIES} 个子查询'}), 400
+    
+    results = [None] * len(queries)
+    parsed = {'measurements': [], 'summary': []}
+    for index, item in enumerate(queries):
+        try:
+            query = parse_batch_query(item)
+        except ValueError as e:
+            results[index] = {'error': '参数错误', 'message': str(e)}
+            continue
+        parsed[query['kind']].append((index, query))
+    
+    conn = get_db_connection()
+    try:
+        run_batch_measurements(conn, parsed['measurements'], results)
+        run_batch_summaries(conn, parsed['summary'], results)
+    finally:
+        conn.close()
+    
+    return jsonify({'results': results})
+
+# ==================== 数据导出端点 ====================
+@app.route('/api/measurements/export', methods=['GET'])
+@read_permission_required
+def export_measurements():
+    """流式导出测量数据文件（CSV或NDJSON）
+
+    过滤参数与 GET /api/measurements 相同，instrument_id 可以重复或用逗号分隔以导出多个仪器；
+    format 为 csv（默认）或 ndjson，layout 为 long（默认，每条记录一行）或 wide（每个测量时间一行，
+    每个 (仪器, 监测类型) 一列测量值）。记录按时间升序从SQLite游标分块读取、边编码边发送，
+    请求头 Accept-Encoding 包含 gzip 时边生成边压缩，导出全部历史也不会在内存中累积。
+    不经过响应缓存。
+    """
+    export_format = request.args.get('format', 'csv')
+    layout = request.args.get('layout', 'long')
+    type_id = request.args.get('type_id', type=int)
+    instrument_ids = []
+    for value in request.args.getlist('instrument_id'):
+        for instrument_id in value.split(','):
+            if instrument_id.strip() and instrument_id.strip() not in instrument_ids:
+                instrument_ids.append(instrument_id.strip())
+    start_time = request.args.get('start_time')
+    end_time = request.args.get('end_time')
+    
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': '参数错误', 'message': f'format 必须是 {" 或 ".join(EXPORT_FORMATS)}'}), 400
+    if layout not in EXPORT_LAYOUTS:
+        return jsonify({'error': '参数错误', 'message': f'layout 必须是 {" 或 ".join(EXPORT_LAYOUTS)}'}), 400
+    
+    try:
+        start_ts = to_epoch(start_time) if start_time else None
+        end_ts = to_epoch(end_time) if end_time else None
+    except ValueError as e:
+        return jsonify({'error': '参数错误', 'message': str(e)}), 400
+    
+    conn = get_db_connection()
+    columns = wide_columns(conn, type_id, instrument_ids) if layout == 'wide' else None
+    conn.close()
+    queries = []
+    for instrument_id in instrument_ids or [None]:
+        query, params = build_measurement_query(type_id, instrument_id, start_ts, end_ts)
+        queries.append((query, params, MeasurementScan(type_id, instrument_id, start_ts, end_ts, None, False)))
+    compress = 'gzip' in request.accept_encodings
+    
+    def generate():
+        # 响应体在请求结束后才生成，使用单独的连接，发送完毕或客户端断开时归还
+        stream_conn = db_pool.detached()
+        try:
+            records = iter_records(stream_conn, partition_router, queries, start_ts, end_ts)
+            chunks = export_chunks(records, export_format, columns)
+            yield from gzip_chunks(chunks) if compress else chunks
+        finally:
+            stream_conn.close()
+    
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    response = Response(generate(), mimetype=mimetype)
+    name = 'measurements' if len(instrument_ids) != 1 else f'measurements_{instrument_ids[0]}'
+    response.headers.set('Content-Disposition', 'attachment', filename=f'{name}.{extension}')
+    response.headers['Cache-Control'] = 'no-store'
+    response.vary.add('Accept-Encoding')
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
 
 # ==================== 写入数据端点（需要管理员权限） ====================
+# 读连接是只读的，所有写入经由写入队列合并提交
+def fetch_measurement(cursor, measurement_id):
+    """获取带类型名称和单位的测量记录"""
+    cursor.execute(f'''
+        SELECT {MEASUREMENT_COLUMNS}
+        FROM measurement m
+        JOIN monitoring_type t ON m.type_id = t.id
+        WHERE m.id = ?
+    ''', (measurement_id,))
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+def parse_number(data, field):
+    """返回字段的数值（float），缺失或为空时返回None
+
+    与批量写入的校验一致，接受数字和数字字符串；布尔值、非数字文本和非有限值抛出 ValueError，
+    避免文本值进入由触发器维护的汇总表和计数器。
+    """
+    value = data.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f'{field} 必须是数字')
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} 必须是数字')
+    if not math.isfinite(number):
+        raise ValueError(f'{field} 必须是数字')
+    return number
+
 @app.route('/api/measurements', methods=['POST'])
 @write_permission_required
 def create_measurement():
@@ -319,44 +661,55 @@ def create_measurement():
         if field not in data:
             return jsonify({'error': '参数缺失', 'message': f'缺少必要字段: {field}'}), 400
     
+    # 时间统一保存为UTC的 YYYY-MM-DD HH:MM:SS
+    try:
+        measure_time = normalize_time(data['measure_time'])
+        type_id = parse_number(data, 'type_id')
+        value = parse_number(data, 'value')
+        water_level = parse_number(data, 'water_level')
+    except ValueError as e:
+        return jsonify({'error': '参数错误', 'message': str(e)}), 400
+    
+    if value is None:
+        return jsonify({'error': '参数缺失', 'message': '缺少必要字段: value'}), 400
+    
+    instrument_id = str(data['instrument_id'] or '').strip()
+    if not instrument_id:
+        return jsonify({'error': '参数缺失', 'message': '缺少必要字段: instrument_id'}), 400
+    
     conn = get_db_connection()
-    cursor = conn.cursor()
+    type_ids = [row['id'] for row in conn.execute('SELECT id FROM monitoring_type').fetchall()]
+    conn.close()
+    if type_id is None or not type_id.is_integer() or int(type_id) not in type_ids:
+        return jsonify({'error': '参数错误', 'message': 'type_id 不是有效的监测类型'}), 400
     
-    try:
+    def insert(cursor):
         cursor.execute('''
-            INSERT INTO measurement (type_id, instrument_id, measure_time, value, water_level)
-            VALUES (?, ?, ?, ?, ?)
+            INSERT INTO measurement (type_id, instrument_id, measure_time, value, water_level, measure_ts)
+            VALUES (?1, ?2, ?3, ?4, ?5, CAST(strftime('%s', ?3) AS INTEGER))
         ''', (
-            data['type_id'],
-            data['instrument_id'],
-            data['measure_time'],
-            data['value'],
-            data.get('water_level')
+            int(type_id),
+            instrument_id,
+            measure_time,
+            value,
+            water_level
         ))
         
-        measurement_id = cursor.lastrowid
-        conn.commit()
-        
         # 获取新创建的记录
-        cursor.execute('''
-            SELECT m.*, t.name as type_name, t.unit
-            FROM measurement m
-            JOIN monitoring_type t ON m.type_id = t.id
-            WHERE m.id = ?
-        ''', (measurement_id,))
-        
-        new_measurement = cursor.fetchone()
-        
-        conn.close()
+        return fetch_measurement(cursor, cursor.lastrowid)
+    
+    try:
+        new_measurement = ingest_queue.submit(insert)
         
         return jsonify({
             'message': '测量记录创建成功',
-            'data': dict(new_measurement)
+            'data': new_measurement
         }), 201
         
+    except sqlite3.IntegrityError as e:
+        # 唯一键冲突，或时间早于归档截止时间
+        return jsonify({'error': '记录冲突', 'message': str(e)}), 409
     except Exception as e:
-        conn.rollback()
-        conn.close()
         return jsonify({'error': '创建失败', 'message': str(e)}), 500
 
 @app.route('/api/measurements/<int:measurement_id>', methods=['PUT'])
@@ -368,99 +721,272 @@ def update_measurement(measurement_id):
     if not data:
         return jsonify({'error': '无效请求', 'message': '请求体必须是JSON格式'}), 400
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # 构建更新语句
+    update_fields = []
+    params = []
     
-    try:
-        # 检查记录是否存在
-        cursor.execute('SELECT id FROM measurement WHERE id = ?', (measurement_id,))
-        if not cursor.fetchone():
-            conn.close()
-            return jsonify({'error': '记录不存在', 'message': f'ID为{measurement_id}的记录不存在'}), 404
-        
-        # 构建更新语句
-        update_fields = []
-        params = []
-        
-        if 'value' in data:
-            update_fields.append('value = ?')
-            params.append(data['value'])
-        
-        if 'measure_time' in data:
-            update_fields.append('measure_time = ?')
-            params.append(data['measure_time'])
-        
-        if 'water_level' in data:
-            update_fields.append('water_level = ?')
-            params.append(data['water_level'])
-        
-        if not update_fields:
-            conn.close()
-            return jsonify({'error': '无效请求', 'message': '没有提供要更新的字段'}), 400
-        
-        params.append(measurement_id)
-        
-        update_query = f'''
-            UPDATE measurement 
-            SET {', '.join(update_fields)}, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        '''
-        
+    if 'value' in data:
+        try:
+            value = parse_number(data, 'value')
+        except ValueError as e:
+            return jsonify({'error': '参数错误', 'message': str(e)}), 400
+        if value is None:
+            return jsonify({'error': '参数错误', 'message': 'value 不能为空'}), 400
+        update_fields.append('value = ?')
+        params.append(value)
+    
+    if 'measure_time' in data:
+        try:
+            params.append(normalize_time(data['measure_time']))
+        except ValueError as e:
+            return jsonify({'error': '参数错误', 'message': str(e)}), 400
+        update_fields.append('measure_time = ?')
+    
+    if 'water_level' in data:
+        try:
+            params.append(parse_number(data, 'water_level'))
+        except ValueError as e:
+            return jsonify({'error': '参数错误', 'message': str(e)}), 400
+        update_fields.append('water_level = ?')
+    
+    if not update_fields:
+        return jsonify({'error': '无效请求', 'message': '没有提供要更新的字段'}), 400
+    
+    params.append(measurement_id)
+    
+    update_query = f'''
+        UPDATE measurement 
+        SET {', '.join(update_fields)}, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    '''
+    
+    def update(cursor):
         cursor.execute(update_query, params)
-        conn.commit()
+        # 记录不存在时没有行被更新
+        if cursor.rowcount == 0:
+            return None
         
         # 获取更新后的记录
-        cursor.execute('''
-            SELECT m.*, t.name as type_name, t.unit
-            FROM measurement m
-            JOIN monitoring_type t ON m.type_id = t.id
-            WHERE m.id = ?
-        ''', (measurement_id,))
-        
-        updated_measurement = cursor.fetchone()
+        return fetch_measurement(cursor, measurement_id)
+    
+    try:
+        updated_measurement = ingest_queue.submit(update)
         
-        conn.close()
+        if updated_measurement is None:
+            return jsonify({'error': '记录不存在', 'message': f'ID为{measurement_id}的记录不存在'}), 404
         
         return jsonify({
             'message': '测量记录更新成功',
-            'data': dict(updated_measurement)
+            'data': updated_measurement
         }), 200
         
+    except sqlite3.IntegrityError as e:
+        return jsonify({'error': '记录冲突', 'message': str(e)}), 409
     except Exception as e:
-        conn.rollback()
-        conn.close()
         return jsonify({'error': '更新失败', 'message': str(e)}), 500
 
 @app.route('/api/measurements/<int:measurement_id>', methods=['DELETE'])
 @write_permission_required
 def delete_measurement(measurement_id):
     """删除测量记录（需要写入权限）"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    def delete(cursor):
+        cursor.execute('DELETE FROM measurement WHERE id = ?', (measurement_id,))
+        return cursor.rowcount
     
     try:
+        deleted = ingest_queue.submit(delete)
+        
         # 检查记录是否存在
-        cursor.execute('SELECT id FROM measurement WHERE id = ?', (measurement_id,))
-        if not cursor.fetchone():
-            conn.close()
+        if not deleted:
             return jsonify({'error': '记录不存在', 'message': f'ID为{measurement_id}的记录不存在'}), 404
         
-        # 删除记录
-        cursor.execute('DELETE FROM measurement WHERE id = ?', (measurement_id,))
-        conn.commit()
-        
-        conn.close()
-        
         return jsonify({
             'message': '测量记录删除成功',
             'data': {'id': measurement_id}
         }), 200
         
     except Exception as e:
-        conn.rollback()
-        conn.close()
         return jsonify({'error': '删除失败', 'message': str(e)}), 500
 
+# ==================== 批量写入端点（需要管理员权限） ====================
+# 单次批量写入的最大记录数
+MAX_BULK_ROWS = 10000
+
+def parse_bulk_body():
+    """解析批量写入请求体，支持JSON数组、NDJSON和CSV，返回记录列表"""
+    mimetype = request.mimetype
+    if mimetype in ('application/x-ndjson', 'application/ndjson', 'application/jsonlines'):
+        lines = request.get_data(as_text=True).splitlines()
+        return [json.loads(line) for line in lines if line.strip()]
+    if mimetype == 'text/csv':
+        df = pd.read_csv(io.StringIO(request.get_data(as_text=True)), dtype=str,
+                         keep_default_na=False)
+        return df.to_dict('records')
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('measurements')
+    if not isinstance(data, list):
+        raise ValueError('请求体必须是JSON数组、NDJSON或CSV格式')
+    return data
+
+def parse_measure_times(series):
+    """按列解析测量时间并格式化为 YYYY-MM-DD HH:MM:SS，带时区的时间转换为UTC，无效值为None"""
+    times = pd.to_datetime(series, errors='coerce', format='mixed', utc=True)
+    return times.dt.tz_localize(None).dt.strftime('%Y-%m-%d %H:%M:%S').where(times.notna(), None)
+
+def validate_bulk_rows(records, type_ids, archived_until=None):
+    """按列校验批量测量记录，archived_until 为归档截止时间（UTC秒），不晚于它的记录只读
+
+    返回 (有效记录的元组列表, 有效记录的行号列表, {行号: 错误信息})
+    """
+    errors = {}
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors[index] = '记录必须是JSON对象'
+    df = pd.DataFrame.from_records(
+        [record if isinstance(record, dict) else {} for record in records]
+    )
+
+    def column(field):
+        if field not in df.columns:
+            return pd.Series([None] * len(df), dtype=object)
+        values = df[field]
+        # CSV和JSON中的空字符串视为缺失
+        return values.where(values.astype(str).str.strip() != '', None)
+
+    def flag(mask, message):
+        for index in mask[mask].index:
+            errors.setdefault(index, message)
+
+    for field in ['type_id', 'instrument_id', 'measure_time', 'value']:
+        flag(column(field).isna(), f'缺少必要字段: {field}')
+
+    type_id = pd.to_numeric(column('type_id'), errors='coerce')
+    flag(~type_id.isin(type_ids), 'type_id 不是有效的监测类型')
+
+    value = pd.to_numeric(column('value'), errors='coerce')
+    flag(value.isna(), 'value 必须是数字')
+
+    raw_water_level = column('water_level')
+    water_level = pd.to_numeric(raw_water_level, errors='coerce')
+    flag(raw_water_level.notna() & water_level.isna(), 'water_level 必须是数字')
+
+    # 时间只接受字符串：数字会被 pd.to_datetime 当作纳秒解析为1970年的时间
+    raw_measure_time = column('measure_time')
+    is_text = raw_measure_time.map(lambda value: isinstance(value, str))
+    flag(raw_measure_time.notna() & ~is_text, 'measure_time 必须是时间字符串（如 YYYY-MM-DD HH:MM:SS）')
+    measure_time = parse_measure_times(raw_measure_time.where(is_text, None))
+    flag(measure_time.isna(), 'measure_time 不是有效的时间')
+    if archived_until is not None:
+        flag(measure_time <= from_epoch(archived_until), '该时间早于归档截止时间，已归档的数据只读')
+
+    instrument_id = column('instrument_id').astype(str).str.strip()
+
+    # 同一请求中重复的唯一键只保留第一条
+    key = pd.DataFrame({'type_id': type_id, 'instrument_id': instrument_id, 'measure_time': measure_time})
+    flag(key.duplicated(), '请求中存在重复的记录（type_id, instrument_id, measure_time）')
+
+    valid = [index for index in range(len(df)) if index not in errors]
+    rows = list(zip(
+        type_id[valid].astype(int).tolist(),
+        instrument_id[valid].tolist(),
+        measure_time[valid].tolist(),
+        value[valid].astype(float).tolist(),
+        water_level[valid].astype(object).where(water_level[valid].notna(), None).tolist(),
+    ))
+    return rows, valid, errors
+
+@app.route('/api/measurements/bulk', methods=['POST'])
+@write_permission_required
+def create_measurements_bulk():
+    """批量创建测量记录（需要写入权限）
+
+    有效记录作为写入队列中的一个操作在一个事务中逐条写入，唯一键 (type_id, instrument_id, measure_time)
+    已存在的记录跳过（状态为 duplicate），不影响其他记录；返回逐行状态，不回读写入的记录。
+    """
+    try:
+        records = parse_bulk_body()
+    except ValueError as e:
+        return jsonify({'error': '无效请求', 'message': str(e)}), 400
+
+    if not records:
+        return jsonify({'error': '无效请求', 'message': '没有提供测量记录'}), 400
+    if len(records) > MAX_BULK_ROWS:
+        return jsonify({'error': '无效请求', 'message': f'单次最多写入 {MAX_BULK_ROWS} 条记录'}), 413
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM monitoring_type')
+    type_ids = [row['id'] for row in cursor.fetchall()]
+    archived_until = partition_router.archived_until(conn)
+    conn.close()
+
+    rows, valid, errors = validate_bulk_rows(records, type_ids, archived_until)
+
+    def insert(cursor):
+        # 与已有记录唯一键冲突的行不写入（也不触发维护派生表的触发器），返回这些行在 rows 中的位置
+        duplicates = []
+        for position, row in enumerate(rows):
+            cursor.execute('''
+                INSERT INTO measurement (type_id, instrument_id, measure_time, value, water_level, measure_ts)
+                VALUES (?1, ?2, ?3, ?4, ?5, CAST(strftime('%s', ?3) AS INTEGER))
+                ON CONFLICT (type_id, instrument_id, measure_time) DO NOTHING
+            ''', row)
+            if cursor.rowcount == 0:
+                duplicates.append(position)
+        return duplicates
+
+    try:
+        duplicates = ingest_queue.submit(insert) if rows else []
+    except sqlite3.IntegrityError as e:
+        return jsonify({'error': '记录冲突', 'message': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': '创建失败', 'message': str(e)}), 500
+
+    duplicated = {valid[position] for position in duplicates}
+    results = []
+    for index in range(len(records)):
+        if index in errors:
+            results.append({'index': index, 'status': 'error', 'message': errors[index]})
+        elif index in duplicated:
+            results.append({
+                'index': index, 'status': 'duplicate',
+                'message': '记录已存在（type_id, instrument_id, measure_time）'
+            })
+        else:
+            results.append({'index': index, 'status': 'created'})
+    created = len(valid) - len(duplicated)
+    if created:
+        status_code = 201
+    else:
+        status_code = 409 if duplicated else 400
+
+    return jsonify({
+        'message': f'批量写入完成：成功 {created} 条，重复 {len(duplicated)} 条，失败 {len(errors)} 条',
+        'data': {
+            'total': len(records),
+            'created': created,
+            'duplicates': len(duplicated),
+            'failed': len(errors),
+            'results': results
+        }
+    }), status_code
+
+# ==================== 运行指标端点 ====================
+@app.route('/api/metrics', methods=['GET'])
+@read_permission_required
+def get_metrics():
+    """获取当前worker进程的运行指标"""
+    return jsonify({
+        'pid': os.getpid(),
+        'pool': db_pool.metrics(),
+        'ingest': ingest_queue.metrics(),
+        'instrument_catalog': instrument_catalog.metrics(),
+        'partitions': partition_router.metrics(),
+        'response_cache': response_cache.metrics(),
+        'analytics': analytics_mirror.metrics() if analytics_mirror else {'engine': 'sqlite'}
+    })
+
 # ==================== 用户管理端点（需要管理员权限） ====================
 @app.route('/api/users', methods=['GET'])
 @write_permission_required
@@ -508,11 +1034,13 @@ def create_user():
         conn.close()
         return jsonify({'error': '用户已存在', 'message': '用户名已存在'}), 400
     
-    try:
-        # 使用bcrypt哈希密码
-        import bcrypt
-        password_hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
+    conn.close()
+    
+    # 使用bcrypt哈希密码
+    import bcrypt
+    password_hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    
+    def insert(cursor):
         cursor.execute('''
             INSERT INTO users (username, password_hash, name, email, role)
             VALUES (?, ?, ?, ?, ?)
@@ -524,28 +1052,23 @@ def create_user():
             data['role']
         ))
         
-        user_id = cursor.lastrowid
-        conn.commit()
-        
         # 获取新创建的用户
         cursor.execute('''
             SELECT id, username, name, email, role, created_at, updated_at
             FROM users
             WHERE id = ?
-        ''', (user_id,))
-        
-        new_user = cursor.fetchone()
-        
-        conn.close()
+        ''', (cursor.lastrowid,))
+        return dict(cursor.fetchone())
+    
+    try:
+        new_user = ingest_queue.submit(insert)
         
         return jsonify({
             'message': '用户创建成功',
-            'data': dict(new_user)
+            'data': new_user
         }), 201
         
     except Exception as e:
-        conn.rollback()
-        conn.close()
         return jsonify({'error': '创建失败', 'message': str(e)}), 500
 
 @app.route('/api/users/<int:user_id>', methods=['DELETE'])
@@ -567,11 +1090,13 @@ def delete_user(user_id):
             conn.close()
             return jsonify({'error': '禁止删除', 'message': '不能删除默认管理员用户'}), 400
         
+        conn.close()
+        
         # 删除用户
-        cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
-        conn.commit()
+        def delete(cursor):
+            cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
         
-        conn.close()
+        ingest_queue.submit(delete)
         
         return jsonify({
             'message': '用户删除成功',
@@ -579,7 +1104,6 @@ def delete_user(user_id):
         }), 200
         
     except Exception as e:
-        conn.rollback()
         conn.close()
         return jsonify({'error': '删除失败', 'message': str(e)}), 500
 
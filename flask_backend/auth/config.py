@@ -2,9 +2,9 @@
 认证模块配置
 """
 import os
-import sqlite3
 import bcrypt
 from datetime import timedelta
+from storage import db_pool
 
 class AuthConfig:
     """认证配置类"""
@@ -16,7 +16,7 @@ class AuthConfig:
     REFRESH_TOKEN_EXPIRES = timedelta(days=7)
     
     # 数据库路径
-    DB_PATH = os.path.join(os.path.dirname(__file__), '../../backend/data/monitoring.db')
+    DB_PATH = os.environ.get('DB_PATH', os.path.join(os.path.dirname(__file__), '../../backend/data/monitoring.db'))
     
     # 权限配置
     PERMISSIONS = {
@@ -26,10 +26,8 @@ class AuthConfig:
     
     @classmethod
     def get_db_connection(cls):
-        """获取数据库连接"""
-        conn = sqlite3.connect(cls.DB_PATH)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """获取数据库连接（与数据路由共用连接池，同一请求内复用同一个连接）"""
+        return db_pool.connection()
     
     @classmethod
     def get_user(cls, username):
@@ -5,6 +5,7 @@ from flask import Blueprint, request, jsonify, g
 from .config import AuthConfig
 from .jwt_utils import JWTManager
 from .decorators import token_required
+from storage import ingest_queue
 
 # 创建认证蓝图
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -195,16 +196,18 @@ def create_user():
     import bcrypt
     password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
     
-    # 插入新用户
-    cursor.execute('''
-        INSERT INTO users (username, password_hash, name, email, role, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, datetime('now'), datetime('now'))
-    ''', (username, password_hash, name, email, role))
-    
-    user_id = cursor.lastrowid
-    conn.commit()
     conn.close()
     
+    # 插入新用户（经由写入队列）
+    def insert(cursor):
+        cursor.execute('''
+            INSERT INTO users (username, password_hash, name, email, role, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, datetime('now'), datetime('now'))
+        ''', (username, password_hash, name, email, role))
+        return cursor.lastrowid
+    
+    user_id = ingest_queue.submit(insert)
+    
     return jsonify({
         'message': '用户创建成功',
         'data': {
@@ -262,11 +265,14 @@ def delete_user(user_id):
             'message': '请求的资源不存在'
         }), 404
     
-    # 删除用户
-    cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
-    conn.commit()
     conn.close()
     
+    # 删除用户
+    def delete(cursor):
+        cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
+    
+    ingest_queue.submit(delete)
+    
     return jsonify({
         'message': '用户删除成功',
         'data': {
@@ -350,10 +356,13 @@ def update_user(user_id):
     update_values.append(user_id)
     update_query = f'UPDATE users SET {", ".join(update_fields)} WHERE id = ?'
     
-    cursor.execute(update_query, update_values)
-    conn.commit()
     conn.close()
     
+    def update(cursor):
+        cursor.execute(update_query, update_values)
+    
+    ingest_queue.submit(update)
+    
     return jsonify({
         'message': '用户更新成功',
         'data': {
@@ -0,0 +1,978 @@
+#!/usr/bin/env python3
+"""
+性能基准脚本 - 在gunicorn下对比API优化前后的吞吐量和延迟
+
+用法:
+    python benchmark.py pool          # 每次新建连接 vs 连接池
+    python benchmark.py concurrency   # 批量写入期间的读请求：回滚日志 vs WAL
+    python benchmark.py pagination    # 第1页与深分页的延迟：OFFSET vs 游标
+    python benchmark.py epoch         # 范围查询和摘要补算：measure_time 字符串 vs 整数 measure_ts
+    python benchmark.py partition     # 近期/早期范围查询、主库大小和VACUUM耗时：单库 vs 按年归档分区
+    python benchmark.py columnar      # 归档分区的磁盘占用和扫描速度：SQLite分区 vs 列式分区
+    python benchmark.py analytics     # 统计、摘要和按年聚合：SQLite（汇总表和计数器） vs DuckDB分析镜像
+    python benchmark.py cache         # 读接口：不缓存 vs 响应缓存 vs 条件请求（304）
+    python benchmark.py downsample    # 图表序列的延迟和响应大小：原始记录 vs LTTB降采样（max_points）
+    python benchmark.py batch         # 页面加载的延迟：逐个GET请求 vs 一个批量查询请求
+    python benchmark.py export        # 全部历史的导出：一次性读取后序列化 vs 流式CSV/NDJSON（首字节、总耗时、内存峰值）
+    python benchmark.py payload       # 测量数据的响应大小和每个请求的服务端CPU：JSON vs 列式JSON vs 二进制
+"""
+import argparse
+import gzip
+import json
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from storage import (
+    COLUMNAR_BINARY, COLUMNAR_JSON, AnalyticsMirror, MeasurementScan, PartitionRouter, StorageConfig, archive_before, compact_partitions,
+    export_chunks, fetch_ordered, from_epoch, gzip_chunks, iter_records, list_partitions, partition_size,
+    query_statistics, query_summary, rebuild_derived, set_journal_mode, suspend_triggers, to_epoch
+)
+from storage.rollups import INTERVAL_FORMATS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 默认压测的读端点
+READ_PATHS = [
+    '/api/types',
+    '/api/instruments',
+    '/api/statistics',
+    '/api/measurements?limit=100',
+    '/api/measurements/summary?interval=month&limit=12',
+]
+
+def free_port():
+    """获取一个空闲端口"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class GunicornServer:
+    """以子进程方式启动gunicorn，env中的变量覆盖当前环境变量"""
+
+    def __init__(self, env=None, workers=2, threads=4):
+        self.env = dict(os.environ, **(env or {}))
+        self.workers = workers
+        self.threads = threads
+        self.port = free_port()
+        self.base_url = f'http://127.0.0.1:{self.port}'
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{self.port}',
+             '--workers', str(self.workers), '--threads', str(self.threads),
+             '--log-level', 'warning', 'app_with_auth:app'],
+            cwd=BASE_DIR, env=self.env
+        )
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                urllib.request.urlopen(self.base_url + '/api/health', timeout=1).read()
+                return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError('gunicorn启动超时')
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+    def cpu_seconds(self):
+        """返回各worker进程累计的CPU时间（用户态+内核态，秒；读取 /proc，只支持Linux）"""
+        total = 0
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            # 去掉进程名后第2个字段为父进程id，第12、13个字段为 utime、stime
+            if int(fields[1]) == self.process.pid:
+                total += int(fields[11]) + int(fields[12])
+        return total / os.sysconf('SC_CLK_TCK')
+
+def login(base_url, username, password):
+    """登录获取访问令牌"""
+    body = json.dumps({'username': username, 'password': password}).encode('utf-8')
+    req = urllib.request.Request(
+        base_url + '/api/auth/login', data=body, headers={'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.loads(resp.read())['data']['access_token']
+
+def fetch(base_url, path, token, headers=None, data=None):
+    """发送请求（带 data 时为POST），返回 (状态码, 响应体, 耗时秒)"""
+    req = urllib.request.Request(
+        base_url + path, data=data, headers=dict({'Authorization': f'Bearer {token}'}, **(headers or {}))
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            body = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        status = e.code
+    return status, body, time.perf_counter() - started
+
+def summarize(results, elapsed):
+    """汇总 (状态码, 响应体, 耗时秒) 列表为吞吐量和延迟分位数"""
+    latencies = sorted(seconds * 1000 for _, _, seconds in results)
+    return {
+        'requests': len(results),
+        'errors': sum(1 for status, _, _ in results if status >= 400),
+        'rps': len(results) / elapsed,
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+        'max_ms': latencies[-1],
+    }
+
+def run_load(base_url, paths, token, total, concurrency, headers=None):
+    """轮流请求paths共total次，返回吞吐量和延迟分位数；headers 为 {路径: 请求头}"""
+    def one(i):
+        path = paths[i % len(paths)]
+        return fetch(base_url, path, token, (headers or {}).get(path))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(total)))
+    return summarize(results, time.perf_counter() - started)
+
+def run_until(base_url, paths, token, concurrency, stop):
+    """concurrency个线程持续轮流请求paths，直到stop被设置"""
+    results = []
+
+    def loop(offset):
+        i = offset
+        while not stop.is_set():
+            results.append(fetch(base_url, paths[i % len(paths)], token))
+            i += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=loop, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(results, time.perf_counter() - started)
+
+def print_results(rows):
+    """输出结果表格"""
+    print(f'{"场景":<16}{"请求数":>8}{"错误":>6}{"req/s":>10}{"p50(ms)":>10}{"p95(ms)":>10}{"max(ms)":>10}')
+    for label, result in rows:
+        print(f'{label:<16}{result["requests"]:>8}{result["errors"]:>6}{result["rps"]:>10.1f}'
+              f'{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}{result["max_ms"]:>10.2f}')
+
+def bench_pool(args):
+    """对比每次新建连接与连接池复用连接的吞吐量"""
+    rows = []
+    for label, pool_size in [('每次新建连接', '0'), ('连接池', str(args.pool_size))]:
+        with GunicornServer({'DB_POOL_SIZE': pool_size}, args.workers, args.threads) as server:
+            token = login(server.base_url, args.username, args.password)
+            # 预热
+            run_load(server.base_url, READ_PATHS, token, len(READ_PATHS) * 4, args.concurrency)
+            rows.append((label, run_load(
+                server.base_url, READ_PATHS, token, args.requests, args.concurrency
+            )))
+    print_results(rows)
+
+def bench_cache(args):
+    """读接口的吞吐量：不缓存 vs 响应缓存 vs 响应缓存加条件请求（If-None-Match，返回304）"""
+    rows = []
+    for label, cache_size in [('不缓存', '0'), ('响应缓存', str(args.cache_size))]:
+        with GunicornServer({'RESPONSE_CACHE_SIZE': cache_size}, args.workers, args.threads) as server:
+            token = login(server.base_url, args.username, args.password)
+            # 预热（每个worker都缓存一遍）
+            run_load(server.base_url, READ_PATHS, token, len(READ_PATHS) * 4, args.concurrency)
+            rows.append((label, run_load(
+                server.base_url, READ_PATHS, token, args.requests, args.concurrency
+            )))
+            if cache_size == '0':
+                continue
+            etags = {}
+            for path in READ_PATHS:
+                req = urllib.request.Request(server.base_url + path, headers={'Authorization': f'Bearer {token}'})
+                with urllib.request.urlopen(req, timeout=30) as resp:
+                    etags[path] = {'If-None-Match': resp.headers['ETag']}
+            rows.append(('条件请求(304)', run_load(
+                server.base_url, READ_PATHS, token, args.requests, args.concurrency, etags
+            )))
+    print_results(rows)
+
+def bench_downsample(args):
+    """图表序列的延迟和响应大小：返回全部原始记录 vs 服务端LTTB降采样（max_points）"""
+    conn = sqlite3.connect(StorageConfig.DB_PATH)
+    instrument_id, total = conn.execute('''
+        SELECT instrument_id, COUNT(*) FROM measurement
+        GROUP BY instrument_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone() or (None, 0)
+    type_total = conn.execute('SELECT COUNT(*) FROM measurement WHERE type_id = ?', (args.type_id,)).fetchone()[0]
+    conn.close()
+    if not total:
+        raise SystemExit('没有测量数据')
+    print(f'单仪器 {instrument_id}: {total} 条，类型 {args.type_id}: {type_total} 条，max_points={args.max_points}')
+
+    scenarios = [
+        ('单仪器 原始', {'instrument_id': instrument_id, 'limit': total}),
+        ('单仪器 降采样', {'instrument_id': instrument_id, 'max_points': args.max_points}),
+        ('按类型 原始', {'type_id': args.type_id, 'limit': max(type_total, 1)}),
+        ('按类型 降采样', {'type_id': args.type_id, 'max_points': args.max_points}),
+    ]
+    rows, sizes = [], []
+    # 关闭响应缓存，测量每次请求的查询和抽样耗时
+    with GunicornServer({'RESPONSE_CACHE_SIZE': '0'}, args.workers, args.threads) as server:
+        token = login(server.base_url, args.username, args.password)
+        for label, params in scenarios:
+            path = '/api/measurements?' + urlencode(params)
+            status, body, _ = fetch(server.base_url, path, token)
+            sizes.append((label, len(json.loads(body)) if status == 200 else 0, len(body)))
+            run_sequential(server.base_url, path, token, 3)
+            rows.append((label, run_sequential(server.base_url, path, token, args.repeat)))
+    print_results(rows)
+    print(f'\n{"场景":<16}{"记录数":>10}{"响应大小(KB)":>16}')
+    for label, count, size in sizes:
+        print(f'{label:<16}{count:>10}{size / 1024:>16.1f}')
+
+def batch_queries(instrument_ids, end_time):
+    """监测页面一次加载的子查询：每个仪器的最新20条记录、按年摘要和 end_time 之前12个月的月度摘要"""
+    queries = []
+    for instrument_id in instrument_ids:
+        queries += [
+            {'kind': 'measurements', 'instrument_id': instrument_id, 'limit': 20},
+            {'kind': 'summary', 'interval': 'year', 'instrument_id': instrument_id, 'limit': 50},
+            {
+                'kind': 'summary', 'interval': 'month', 'instrument_id': instrument_id,
+                'end_time': end_time, 'limit': 12
+            },
+        ]
+    return queries
+
+def bench_batch(args):
+    """页面加载的延迟：每个子查询一个GET请求（浏览器并发6个） vs 一个 POST /api/batch 请求"""
+    conn = sqlite3.connect(StorageConfig.DB_PATH)
+    instrument_ids = [row[0] for row in conn.execute('''
+        SELECT instrument_id FROM instrument GROUP BY instrument_id ORDER BY SUM(row_count) DESC LIMIT ?
+    ''', (args.instruments,))]
+    last_time = conn.execute('SELECT MAX(last_time) FROM instrument').fetchone()[0]
+    conn.close()
+    if not instrument_ids:
+        raise SystemExit('没有测量数据')
+    queries = batch_queries(instrument_ids, f'{last_time[:4]}-12-31 23:59:59')
+    paths = [
+        ('/api/measurements?' if query['kind'] == 'measurements' else '/api/measurements/summary?')
+        + urlencode({name: value for name, value in query.items() if name != 'kind'})
+        for query in queries
+    ]
+    body = json.dumps({'queries': queries}).encode('utf-8')
+    print(f'{len(instrument_ids)} 个仪器，每次页面加载 {len(queries)} 个子查询')
+
+    def separate(base_url, token):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(lambda path: fetch(base_url, path, token), paths))
+        return max(status for status, _, _ in results), b'', time.perf_counter() - started
+
+    def batched(base_url, token):
+        return fetch(base_url, '/api/batch', token, {'Content-Type': 'application/json'}, body)
+
+    rows = []
+    # 关闭响应缓存，两种方式都执行全部查询
+    with GunicornServer({'RESPONSE_CACHE_SIZE': '0'}, args.workers, args.threads) as server:
+        token = login(server.base_url, args.username, args.password)
+        for label, load in [('逐个请求', separate), ('批量请求', batched)]:
+            load(server.base_url, token)
+            started = time.perf_counter()
+            results = [load(server.base_url, token) for _ in range(args.repeat)]
+            rows.append((label, summarize(results, time.perf_counter() - started)))
+    print_results(rows)
+    print('\n每行为一次页面加载（req/s 即每秒页面加载数）')
+
+# 导出的查询，与 GET /api/measurements/export 不带过滤条件时相同
+EXPORT_QUERY = '''
+    SELECT m.id, m.type_id, m.instrument_id, m.measure_time, m.value, m.water_level,
+           m.created_at, m.updated_at, t.name AS type_name, t.unit, m.measure_ts
+    FROM {table} m
+    JOIN monitoring_type t ON m.type_id = t.id
+'''
+
+def bench_export(args):
+    """导出全部历史：一次性读取全部记录后序列化为JSON数组 vs 流式编码为CSV/NDJSON（可选gzip）
+
+    在当前数据库的副本（按 --scale 放大）上于进程内执行，记录首个块的耗时、总耗时、输出字节数，
+    另用 tracemalloc 单独执行一次记录Python内存峰值（流式导出的峰值应与记录数无关）。
+    """
+    conn = sqlite3.connect(StorageConfig.DB_PATH)
+    if list_partitions(conn):
+        raise SystemExit('当前数据库已有归档分区，请先用 migrate.py --restore 全部恢复')
+    conn.close()
+
+    def one_shot(conn, router):
+        rows = fetch_ordered(conn, router.sources(conn), EXPORT_QUERY + ' ORDER BY m.measure_ts', [], -1)
+        yield json.dumps([dict(row) for row in rows], ensure_ascii=False).encode('utf-8')
+
+    def streamed(export_format, compress):
+        def run(conn, router):
+            scan = MeasurementScan(None, None, None, None, None, False)
+            chunks = export_chunks(iter_records(conn, router, [(EXPORT_QUERY, [], scan)]), export_format)
+            return gzip_chunks(chunks) if compress else chunks
+        return run
+
+    scenarios = [
+        ('一次性读取（JSON数组）', one_shot),
+        ('流式CSV', streamed('csv', False)),
+        ('流式NDJSON', streamed('ndjson', False)),
+        ('流式CSV + gzip', streamed('csv', True)),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f'复制数据库（{args.scale} 倍）...')
+        path = os.path.join(tmp, 'export.db')
+        copy_database(path, args.scale, 'epoch').close()
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        conn.row_factory = sqlite3.Row
+        router = PartitionRouter()
+        total = conn.execute('SELECT COUNT(*) FROM measurement').fetchone()[0]
+        print(f'测量记录 {total} 条\n')
+
+        print(f'{"场景":<22} {"首个块ms":>10} {"总耗时s":>10} {"输出MB":>10} {"内存峰值MB":>12}')
+        for label, run in scenarios:
+            started = time.perf_counter()
+            first, size = None, 0
+            for chunk in run(conn, router):
+                if first is None:
+                    first = time.perf_counter() - started
+                size += len(chunk)
+            elapsed = time.perf_counter() - started
+
+            tracemalloc.start()
+            for _ in run(conn, router):
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'{label:<22} {first * 1000:>10.1f} {elapsed:>10.2f} {size / 1048576:>10.1f} {peak / 1048576:>12.1f}')
+        conn.close()
+
+def bench_payload(args):
+    """测量数据的响应大小和每个请求的服务端CPU时间：JSON（逐条记录） vs 列式JSON vs 二进制列式表示"""
+    conn = sqlite3.connect(StorageConfig.DB_PATH)
+    type_total = conn.execute('SELECT COUNT(*) FROM measurement WHERE type_id = ?', (args.type_id,)).fetchone()[0]
+    conn.close()
+    if not type_total:
+        raise SystemExit(f'类型 {args.type_id} 没有测量数据')
+    queries = [
+        ('100条', {'limit': 100}),
+        (f'{args.limit}条', {'limit': args.limit}),
+        (f'类型{args.type_id}全部', {'type_id': args.type_id, 'limit': type_total}),
+        ('降采样', {'type_id': args.type_id, 'max_points': 200}),
+    ]
+    formats = [('JSON', 'application/json'), ('列式JSON', COLUMNAR_JSON), ('二进制', COLUMNAR_BINARY)]
+
+    print(f'{"场景":<24}{"响应KB":>10}{"gzip后KB":>10}{"CPU ms/请求":>14}{"p50 ms":>10}')
+    # 关闭响应缓存，每次请求都查询和序列化
+    with GunicornServer({'RESPONSE_CACHE_SIZE': '0'}, 1, 1) as server:
+        token = login(server.base_url, args.username, args.password)
+        for label, params in queries:
+            path = '/api/measurements?' + urlencode(params)
+            for name, mimetype in formats:
+                headers = {'Accept': mimetype}
+                _, body, _ = fetch(server.base_url, path, token, headers)
+                for _ in range(3):
+                    fetch(server.base_url, path, token, headers)
+                cpu = server.cpu_seconds()
+                results = [fetch(server.base_url, path, token, headers) for _ in range(args.repeat)]
+                cpu = (server.cpu_seconds() - cpu) / args.repeat
+                latency = statistics.median(seconds for _, _, seconds in results) * 1000
+                print(f'{label + " " + name:<24}{len(body) / 1024:>10.1f}{len(gzip.compress(body)) / 1024:>10.1f}'
+                      f'{cpu * 1000:>14.2f}{latency:>10.2f}')
+        print('\nCPU为gunicorn worker进程（1个worker、1个线程）的用户态+内核态时间，包括认证和查询')
+
+# 基准写入的测量记录使用的仪器编号，结束后删除
+BENCH_INSTRUMENT = '__benchmark__'
+
+def bulk_write(db_path, transactions, rows_per_transaction, chunk_size=5000, pause=0.1):
+    """模拟数据导入：每个事务分块写入，块之间暂停pause秒（相当于解析下一块的时间），返回写入行数"""
+    conn = sqlite3.connect(db_path, timeout=60)
+    start = datetime(2100, 1, 1)
+    written = 0
+    try:
+        for _ in range(transactions):
+            for offset in range(0, rows_per_transaction, chunk_size):
+                rows = [
+                    (1, BENCH_INSTRUMENT,
+                     (start + timedelta(minutes=written + i)).strftime('%Y-%m-%d %H:%M:%S'), 1.0)
+                    for i in range(min(chunk_size, rows_per_transaction - offset))
+                ]
+                conn.executemany(
+                    'INSERT INTO measurement (type_id, instrument_id, measure_time, value) '
+                    'VALUES (?, ?, ?, ?)',
+                    rows
+                )
+                written += len(rows)
+                time.sleep(pause)
+            conn.commit()
+    finally:
+        conn.rollback()
+        conn.execute('DELETE FROM measurement WHERE instrument_id = ?', (BENCH_INSTRUMENT,))
+        conn.commit()
+        conn.close()
+    return written
+
+def bench_concurrency(args):
+    """批量写入进行时的读请求延迟与错误：回滚日志模式 vs WAL模式"""
+    rows = []
+    for label, mode in [('回滚日志(DELETE)', 'DELETE'), ('WAL', 'WAL')]:
+        set_journal_mode(StorageConfig.DB_PATH, mode)
+        with GunicornServer({'DB_JOURNAL_MODE': mode}, args.workers, args.threads) as server:
+            token = login(server.base_url, args.username, args.password)
+            run_load(server.base_url, READ_PATHS, token, len(READ_PATHS) * 4, args.concurrency)
+
+            stop = threading.Event()
+            written = []
+
+            def writer():
+                try:
+                    started = time.perf_counter()
+                    count = bulk_write(StorageConfig.DB_PATH, args.transactions, args.rows, pause=args.pause)
+                    written.append(count / (time.perf_counter() - started))
+                finally:
+                    stop.set()
+
+            write_thread = threading.Thread(target=writer)
+            write_thread.start()
+            result = run_until(server.base_url, READ_PATHS, token, args.concurrency, stop)
+            write_thread.join()
+            rows.append((label, result))
+            print(f'{label}: 写入 {written[0]:.0f} 行/秒')
+    set_journal_mode(StorageConfig.DB_PATH)
+    print_results(rows)
+
+def run_sequential(base_url, path, token, repeat):
+    """顺序请求同一路径repeat次，返回延迟分位数"""
+    started = time.perf_counter()
+    results = [fetch(base_url, path, token) for _ in range(repeat)]
+    return summarize(results, time.perf_counter() - started)
+
+def bench_pagination(args):
+    """第1页与第N页的延迟：LIMIT/OFFSET分页 vs (measure_ts, id)游标分页"""
+    from app_with_auth import encode_cursor
+
+    filters = {'type_id': args.type_id} if args.type_id else {}
+    where = 'WHERE type_id = ?' if args.type_id else ''
+    offset = (args.page - 1) * args.limit
+
+    # 第N页的游标是第N-1页最后一条记录
+    conn = sqlite3.connect(StorageConfig.DB_PATH)
+    row = conn.execute(f'''
+        SELECT measure_ts, id FROM measurement {where}
+        ORDER BY measure_ts DESC, id DESC LIMIT 1 OFFSET ?
+    ''', list(filters.values()) + [offset - 1]).fetchone()
+    conn.close()
+    if row is None:
+        raise SystemExit(f'数据不足 {args.page} 页（每页 {args.limit} 条）')
+
+    scenarios = [
+        ('OFFSET 第1页', dict(filters, limit=args.limit)),
+        (f'OFFSET 第{args.page}页', dict(filters, limit=args.limit, offset=offset)),
+        ('游标 第1页', dict(filters, limit=args.limit, cursor='')),
+        (f'游标 第{args.page}页', dict(filters, limit=args.limit, cursor=encode_cursor(*row))),
+    ]
+    rows = []
+    with GunicornServer(workers=args.workers, threads=args.threads) as server:
+        token = login(server.base_url, args.username, args.password)
+        for label, params in scenarios:
+            path = '/api/measurements?' + urlencode(params)
+            run_sequential(server.base_url, path, token, 3)
+            rows.append((label, run_sequential(server.base_url, path, token, args.repeat)))
+    print_results(rows)
+
+# 迁移7之前按 measure_time 字符串过滤和排序的索引
+TEXT_TIME_INDEXES = {
+    'idx_measurement_instrument_time': 'instrument_id, measure_time, value',
+    'idx_measurement_type_time': 'type_id, measure_time, value',
+    'idx_measurement_time_value': 'measure_time, value',
+}
+EPOCH_INDEXES = ['idx_measurement_instrument_ts', 'idx_measurement_type_ts', 'idx_measurement_ts_value']
+
+# 迁移7之前摘要端点补算 end_time 所在时间段的查询：逐行 strftime 分段
+TEXT_SUMMARY_SQL = '''
+    SELECT period, SUM(row_count), SUM(value_sum) / NULLIF(SUM(value_count), 0), MIN(min_value), MAX(max_value)
+    FROM (
+        SELECT period, row_count, value_count, value_sum, min_value, max_value
+        FROM measurement_rollup
+        WHERE interval = ? AND type_id = ? AND period < strftime(?, ?)
+        UNION ALL
+        SELECT strftime(?, measure_time), 1, value IS NOT NULL, IFNULL(value, 0), value, value
+        FROM measurement
+        WHERE measure_time <= ?
+          AND measure_time >= datetime(?, (SELECT printf('-%d days', span_days) FROM rollup_interval WHERE interval = ?))
+          AND strftime(?, measure_time) = strftime(?, ?)
+          AND type_id = ?
+    )
+    GROUP BY period
+    ORDER BY period DESC
+    LIMIT ?
+'''
+
+def copy_database(path, scale, time_indexes):
+    """把当前数据库复制到path并放大测量记录为scale倍（复制的记录使用不同的仪器编号）
+
+    time_indexes 为 'text' 时换成迁移7之前的 measure_time 索引，为 'epoch' 时保留 measure_ts 索引。
+    """
+    source = sqlite3.connect(StorageConfig.DB_PATH)
+    conn = sqlite3.connect(path)
+    source.backup(conn)
+    source.close()
+    # 放大数据时不维护派生表，副本用完即删
+    suspend_triggers(conn)
+    for copy in range(1, scale):
+        conn.execute('''
+            INSERT INTO measurement (type_id, instrument_id, measure_time, value, water_level, measure_ts)
+            SELECT type_id, instrument_id || ?, measure_time, value, water_level, measure_ts
+            FROM measurement WHERE instrument_id NOT LIKE '%#%'
+        ''', (f'#{copy}',))
+    if time_indexes == 'text':
+        for name in EPOCH_INDEXES:
+            conn.execute(f'DROP INDEX {name}')
+        for name, columns in TEXT_TIME_INDEXES.items():
+            conn.execute(f'CREATE INDEX {name} ON measurement ({columns})')
+    conn.execute('ANALYZE')
+    conn.commit()
+    return conn
+
+def run_query(run, repeat):
+    """执行run()共repeat次，返回延迟分位数"""
+    results = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        query_started = time.perf_counter()
+        run()
+        results.append((200, None, time.perf_counter() - query_started))
+    return summarize(results, time.perf_counter() - started)
+
+def bench_epoch(args):
+    """范围查询和摘要补算的延迟：measure_time 字符串（迁移7之前） vs 整数 measure_ts
+
+    两种方式分别在当前数据库的副本上执行（副本可按 --scale 放大），查询与改动前后的端点一致。
+    """
+    conn = sqlite3.connect(StorageConfig.DB_PATH)
+    last_time = conn.execute(
+        'SELECT MAX(measure_time) FROM measurement WHERE type_id = ?', (args.type_id,)
+    ).fetchone()[0]
+    conn.close()
+    if last_time is None:
+        raise SystemExit(f'类型 {args.type_id} 没有测量数据')
+    # 范围查询取最后一整年，摘要补算取最后一条记录所在年份的年中
+    year = int(last_time[:4]) - 1
+    start_time, end_time = f'{year}-01-01 00:00:00', f'{year}-12-31 23:59:59'
+    summary_end = f'{year + 1}-06-30 00:00:00'
+
+    text_range = f'''
+        SELECT m.id, m.instrument_id, m.measure_time, m.value, t.name
+        FROM measurement m JOIN monitoring_type t ON m.type_id = t.id
+        WHERE m.type_id = ? AND m.measure_time >= ? AND m.measure_time <= ?
+        ORDER BY m.measure_time DESC LIMIT ?
+    '''
+    epoch_range = text_range.replace('m.measure_time >=', 'm.measure_ts >=').replace(
+        'm.measure_time <=', 'm.measure_ts <=').replace('ORDER BY m.measure_time', 'ORDER BY m.measure_ts')
+    text_count = '''
+        SELECT COUNT(*), AVG(value) FROM measurement
+        WHERE type_id = ? AND measure_time >= ? AND measure_time <= ?
+    '''
+    epoch_count = text_count.replace('measure_time', 'measure_ts')
+    date_format = INTERVAL_FORMATS[args.interval]
+    start_ts, end_ts = to_epoch(start_time), to_epoch(end_time)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f'复制数据库（{args.scale} 倍）...')
+        text_conn = copy_database(os.path.join(tmp, 'text.db'), args.scale, 'text')
+        epoch_conn = copy_database(os.path.join(tmp, 'epoch.db'), args.scale, 'epoch')
+        total = epoch_conn.execute('SELECT COUNT(*) FROM measurement').fetchone()[0]
+        print(f'测量记录 {total} 条，范围 {start_time} ~ {end_time}，摘要 end_time={summary_end}')
+        scenarios = [
+            ('范围查询 TEXT', lambda: text_conn.execute(
+                text_range, (args.type_id, start_time, end_time, args.limit)).fetchall()),
+            ('范围查询 整数', lambda: epoch_conn.execute(
+                epoch_range, (args.type_id, start_ts, end_ts, args.limit)).fetchall()),
+            ('范围聚合 TEXT', lambda: text_conn.execute(
+                text_count, (args.type_id, start_time, end_time)).fetchall()),
+            ('范围聚合 整数', lambda: epoch_conn.execute(
+                epoch_count, (args.type_id, start_ts, end_ts)).fetchall()),
+            ('摘要 TEXT', lambda: text_conn.execute(TEXT_SUMMARY_SQL, (
+                args.interval, args.type_id, date_format, summary_end,
+                date_format, summary_end, summary_end, args.interval,
+                date_format, date_format, summary_end, args.type_id, 12)).fetchall()),
+            ('摘要 整数', lambda: query_summary(
+                epoch_conn, args.interval, args.type_id, None, summary_end, 12)),
+        ]
+        for label, run in scenarios:
+            run_query(run, 3)
+            rows.append((label, run_query(run, args.repeat)))
+        text_conn.close()
+        epoch_conn.close()
+    print_results(rows)
+
+# 与 GET /api/measurements 相同的按时间倒序的范围查询
+PARTITION_RANGE_SQL = '''
+    SELECT m.id, m.instrument_id, m.measure_time, m.value, m.water_level
+    FROM {table} m
+    WHERE m.type_id = ? AND m.measure_ts >= ? AND m.measure_ts <= ?
+    ORDER BY m.measure_ts DESC
+'''
+
+def vacuum_database(conn, path):
+    """VACUUM数据库，返回 (耗时秒数, 文件字节数)"""
+    started = time.perf_counter()
+    conn.execute('VACUUM')
+    return time.perf_counter() - started, os.path.getsize(path)
+
+def bench_partition(args):
+    """近期和早期范围查询的延迟、主库大小和VACUUM耗时：单库 vs 按年归档分区
+
+    两种方式分别在当前数据库的副本上执行（副本可按 --scale 放大），分区副本归档 --before 之前的年份，
+    查询与 GET /api/measurements、/api/measurements/summary 的执行路径一致（按时间裁剪分区、只读挂载）。
+    """
+    conn = sqlite3.connect(StorageConfig.DB_PATH)
+    if list_partitions(conn):
+        raise SystemExit('当前数据库已有归档分区，请先用 migrate.py --restore 全部恢复')
+    first_ts, last_ts = conn.execute('SELECT MIN(measure_ts), MAX(measure_ts) FROM measurement').fetchone()
+    conn.close()
+    if first_ts is None:
+        raise SystemExit('没有测量数据')
+    first_year, last_year = int(from_epoch(first_ts)[:4]), int(from_epoch(last_ts)[:4])
+    before = args.before or last_year - 3
+    if not first_year < before <= last_year:
+        raise SystemExit(f'--before 需要在 {first_year + 1} ~ {last_year} 之间')
+    # 近期范围取最后一条记录所在年份，早期范围取最后一个归档年份
+    ranges = [('近期', last_year), ('早期', before - 1)]
+
+    rows = []
+    sizes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f'复制数据库（{args.scale} 倍）...')
+        paths = {'单库': os.path.join(tmp, 'single.db'), '分区': os.path.join(tmp, 'partitioned.db')}
+        for label, path in paths.items():
+            copy_conn = copy_database(path, args.scale, 'epoch')
+            if label == '分区':
+                archived = archive_before(copy_conn, before, os.path.join(tmp, 'partitions'))
+                print(f'归档 {len(archived)} 个年份，共 {sum(count for _, count in archived)} 条记录')
+            elapsed, size = vacuum_database(copy_conn, path)
+            partition_size = sum(os.path.getsize(p.path) for p in list_partitions(copy_conn))
+            copy_conn.close()
+            sizes.append((label, size, partition_size, elapsed))
+
+        for label, path in paths.items():
+            read_conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            router = PartitionRouter(readonly=True)
+            for range_label, year in ranges:
+                start_ts, end_ts = to_epoch(f'{year}-01-01'), to_epoch(f'{year}-12-31 23:59:59')
+                params = [args.type_id, start_ts, end_ts]
+                run = lambda: fetch_ordered(
+                    read_conn, router.sources(read_conn, start_ts, end_ts),
+                    PARTITION_RANGE_SQL, params, args.limit)
+                run_query(run, 3)
+                rows.append((f'{range_label}范围 {year} {label}', run_query(run, args.repeat)))
+            run = lambda: query_summary(read_conn, args.interval, args.type_id, None, None, 12, router=router)
+            run_query(run, 3)
+            rows.append((f'摘要 {label}', run_query(run, args.repeat)))
+            read_conn.close()
+    print_results(rows)
+    print(f'\n{"方式":<8}{"主库(MB)":>12}{"分区(MB)":>12}{"VACUUM(s)":>12}')
+    for label, size, partition_size, elapsed in sizes:
+        print(f'{label:<8}{size / 1048576:>12.2f}{partition_size / 1048576:>12.2f}{elapsed:>12.3f}')
+
+def bench_columnar(args):
+    """归档分区的磁盘占用和扫描速度：SQLite分区 vs 列式分区
+
+    在当前数据库的副本上归档 --before 之前的年份，先测SQLite分区，转换为列式分区后再测同样的查询
+    （与 GET /api/measurements、/api/measurements/summary 的执行路径一致）。
+    """
+    conn = sqlite3.connect(StorageConfig.DB_PATH)
+    if list_partitions(conn):
+        raise SystemExit('当前数据库已有归档分区，请先用 migrate.py --restore 全部恢复')
+    first_ts = conn.execute('SELECT MIN(measure_ts) FROM measurement').fetchone()[0]
+    instrument_id = conn.execute(
+        'SELECT instrument_id FROM measurement WHERE type_id = ? LIMIT 1', (args.type_id,)
+    ).fetchone()
+    conn.close()
+    if first_ts is None or instrument_id is None:
+        raise SystemExit(f'类型 {args.type_id} 没有测量数据')
+    first_year = int(from_epoch(first_ts)[:4])
+    if args.before <= first_year:
+        raise SystemExit(f'--before 需要大于最早的年份 {first_year}')
+    # 扫描最后一个归档年份
+    year = args.before - 1
+    start_ts, end_ts = to_epoch(f'{year}-01-01'), to_epoch(f'{year}-12-31 23:59:59')
+    scans = [
+        (f'{year}全年', MeasurementScan(None, None, start_ts, end_ts, None, False), -1),
+        (f'{year}类型{args.type_id}', MeasurementScan(args.type_id, None, start_ts, end_ts, None, False), -1),
+        (f'{year}单仪器100条', MeasurementScan(None, instrument_id[0], start_ts, end_ts, None, False), 100),
+    ]
+
+    rows = []
+    sizes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f'复制数据库（{args.scale} 倍）...')
+        path = os.path.join(tmp, 'archive.db')
+        copy_conn = copy_database(path, args.scale, 'epoch')
+        archived = archive_before(copy_conn, args.before, os.path.join(tmp, 'partitions'))
+        print(f'归档 {len(archived)} 个年份，共 {sum(count for _, count in archived)} 条记录')
+        for label in ('SQLite', '列式'):
+            if label == '列式':
+                started = time.perf_counter()
+                compact_partitions(copy_conn)
+                print(f'转换为列式分区耗时 {time.perf_counter() - started:.2f}s')
+            partitions = list_partitions(copy_conn)
+            sizes.append((label, sum(partition_size(p) for p in partitions), sum(p.row_count for p in partitions)))
+
+            read_conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            read_conn.row_factory = sqlite3.Row
+            router = PartitionRouter(readonly=True)
+            for scan_label, scan, limit in scans:
+                query, params = measurement_query(scan)
+                # 与接口一致，把结果转换为字典
+                run = lambda: [dict(m) for m in fetch_ordered(
+                    read_conn, router.sources(read_conn, scan.start_ts, scan.end_ts), query, params, limit, 0, scan)]
+                count = len(run())
+                run_query(run, 3)
+                rows.append((f'{scan_label}({count}行) {label}', run_query(run, args.repeat)))
+            run = lambda: query_summary(
+                read_conn, 'month', args.type_id, None, f'{year}-06-15 12:00:00', 12, router=router)
+            run_query(run, 3)
+            rows.append((f'摘要 {label}', run_query(run, args.repeat)))
+            read_conn.close()
+        copy_conn.close()
+    print_results(rows)
+    print(f'\n{"分区格式":<8}{"记录数":>12}{"磁盘(KB)":>12}{"字节/行":>10}')
+    for label, size, count in sizes:
+        print(f'{label:<8}{count:>12}{size / 1024:>12.0f}{size / max(count, 1):>10.1f}')
+
+# 不经过汇总表的按类型、按年聚合（汇总表没有覆盖的分析查询，两个引擎都全表扫描）
+YEARLY_SQL = {
+    'SQLite': '''
+        SELECT type_id, strftime('%Y', measure_ts, 'unixepoch') AS year,
+               COUNT(*), AVG(value), MIN(value), MAX(value)
+        FROM measurement GROUP BY 1, 2 ORDER BY 1, 2
+    ''',
+    'DuckDB': '''
+        SELECT type_id, strftime(make_timestamp(measure_ts * 1000000), '%Y') AS year,
+               COUNT(*), AVG(value), MIN(value), MAX(value)
+        FROM measurement GROUP BY 1, 2 ORDER BY 1, 2
+    ''',
+}
+
+def bench_analytics(args):
+    """统计和摘要的聚合：SQLite（汇总表和计数器） vs DuckDB分析镜像
+
+    在当前数据库的副本（可按 --scale 放大）上对比 /api/statistics、/api/measurements/summary 的执行路径，
+    另测不经过汇总表的按年聚合、镜像全量加载和追加新记录后的同步耗时，并核对两种引擎的摘要结果。
+    """
+    conn = sqlite3.connect(StorageConfig.DB_PATH)
+    if list_partitions(conn):
+        raise SystemExit('当前数据库已有归档分区，请先用 migrate.py --restore 全部恢复')
+    last_time, instrument_id = conn.execute(
+        'SELECT MAX(measure_time), MIN(instrument_id) FROM measurement WHERE type_id = ?', (args.type_id,)
+    ).fetchone()
+    conn.close()
+    if last_time is None:
+        raise SystemExit(f'类型 {args.type_id} 没有测量数据')
+    # 摘要的 end_time 取最后一条记录所在年份的年中，包含未结束的时间段
+    summary_end = f'{last_time[:4]}-06-15 12:00:00'
+    summaries = [
+        (f'摘要month类型{args.type_id}', ('month', args.type_id, None, summary_end, 12)),
+        (f'摘要day类型{args.type_id}', ('day', args.type_id, None, summary_end, 400)),
+        ('摘要year单仪器', ('year', None, instrument_id, None, 50)),
+    ]
+
+    rows = []
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f'复制数据库（{args.scale} 倍）...')
+        path = os.path.join(tmp, 'analytics.db')
+        copy_conn = copy_database(path, args.scale, 'epoch')
+        # 放大时没有维护派生表，按副本的记录重建
+        rebuild_derived(copy_conn)
+        copy_conn.commit()
+        total = copy_conn.execute('SELECT COUNT(*) FROM measurement').fetchone()[0]
+        print(f'测量记录 {total} 条，摘要 end_time={summary_end}')
+
+        read_conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        read_conn.row_factory = sqlite3.Row
+        try:
+            mirror = AnalyticsMirror()
+        except RuntimeError as e:
+            raise SystemExit(str(e))
+        started = time.perf_counter()
+        mirror.sync(read_conn)
+        print(f'镜像全量加载耗时 {time.perf_counter() - started:.2f}s')
+
+        scenarios = [
+            ('统计 SQLite', lambda: query_statistics(read_conn)),
+            ('统计 DuckDB', lambda: mirror.statistics(read_conn)),
+        ]
+        for label, params in summaries:
+            expected = [tuple(row) for row in query_summary(read_conn, *params)]
+            actual = [tuple(row.values()) for row in mirror.summary(read_conn, *params)]
+            mismatches += summary_mismatches(expected, actual)
+            scenarios += [
+                (f'{label} SQLite', lambda params=params: query_summary(read_conn, *params)),
+                (f'{label} DuckDB', lambda params=params: mirror.summary(read_conn, *params)),
+            ]
+        scenarios += [
+            ('按年聚合 SQLite', lambda: read_conn.execute(YEARLY_SQL['SQLite']).fetchall()),
+            ('按年聚合 DuckDB', lambda: mirror.query(YEARLY_SQL['DuckDB'])),
+        ]
+        for label, run in scenarios:
+            run_query(run, 3)
+            rows.append((label, run_query(run, args.repeat)))
+
+        # 写入新记录后第一次查询前的追加同步
+        copy_conn.execute('''
+            INSERT INTO measurement (type_id, instrument_id, measure_time, value, measure_ts)
+            SELECT type_id, instrument_id || '#new', measure_time, value, measure_ts FROM measurement
+            ORDER BY id DESC LIMIT ?
+        ''', (args.append,))
+        copy_conn.commit()
+        started = time.perf_counter()
+        mirror.sync(read_conn)
+        append_seconds = time.perf_counter() - started
+        read_conn.close()
+        copy_conn.close()
+    print_results(rows)
+    print(f'\n写入 {args.append} 条记录后镜像追加同步耗时 {append_seconds * 1000:.1f}ms')
+    print(f'摘要结果不一致的时间段（保留2位小数后比较）: {mismatches}')
+
+def summary_mismatches(expected, actual):
+    """比较两组 (period, count, avg, min, max)，返回保留2位小数后不一致的时间段数"""
+    def rounded(rows):
+        return {row[0]: (row[1],) + tuple(round(v or 0, 2) for v in row[2:]) for row in rows}
+    expected, actual = rounded(expected), rounded(actual)
+    return sum(1 for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key))
+
+def measurement_query(scan):
+    """按 MeasurementScan 生成与 GET /api/measurements 相同的SQL和参数"""
+    query = '''
+        SELECT m.id, m.type_id, m.instrument_id, m.measure_time, m.value, m.water_level,
+               m.created_at, m.updated_at, t.name AS type_name, t.unit, m.measure_ts
+        FROM {table} m
+        JOIN monitoring_type t ON m.type_id = t.id
+        WHERE m.measure_ts >= ? AND m.measure_ts <= ?
+    '''
+    params = [scan.start_ts, scan.end_ts]
+    if scan.type_id:
+        query += ' AND m.type_id = ?'
+        params.append(scan.type_id)
+    if scan.instrument_id:
+        query += ' AND m.instrument_id = ?'
+        params.append(scan.instrument_id)
+    return query + ' ORDER BY m.measure_ts DESC', params
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='API性能基准（需要安装gunicorn，并已导入数据）')
+    parser.add_argument('--username', default='admin', help='登录用户名')
+    parser.add_argument('--password', default='admin123', help='登录密码')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker数（与app_spec.yaml一致）')
+    parser.add_argument('--threads', type=int, default=4, help='每个worker的线程数')
+    parser.add_argument('--requests', type=int, default=2000, help='每个场景的请求总数')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发请求数')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pool = subparsers.add_parser('pool', help='每次新建连接 vs 连接池')
+    pool.add_argument('--pool-size', type=int, default=8, help='每个worker的连接池大小')
+    pool.set_defaults(func=bench_pool)
+
+    concurrency = subparsers.add_parser('concurrency', help='批量写入期间的读请求：回滚日志 vs WAL')
+    concurrency.add_argument('--transactions', type=int, default=10, help='写入事务数')
+    concurrency.add_argument('--rows', type=int, default=50000, help='每个事务写入的行数')
+    concurrency.add_argument('--pause', type=float, default=0.1, help='每写入5000行后的暂停秒数（模拟解析）')
+    concurrency.set_defaults(func=bench_concurrency)
+
+    pagination = subparsers.add_parser('pagination', help='第1页与深分页的延迟：OFFSET vs 游标')
+    pagination.add_argument('--page', type=int, default=1000, help='深分页的页码')
+    pagination.add_argument('--limit', type=int, default=20, help='每页条数')
+    pagination.add_argument('--type-id', type=int, help='只查询指定监测类型')
+    pagination.add_argument('--repeat', type=int, default=50, help='每个场景的顺序请求次数')
+    pagination.set_defaults(func=bench_pagination)
+
+    epoch = subparsers.add_parser('epoch', help='范围查询和摘要补算：measure_time 字符串 vs 整数 measure_ts')
+    epoch.add_argument('--type-id', type=int, default=4, help='查询的监测类型')
+    epoch.add_argument('--interval', default='year', choices=['day', 'week', 'month', 'year'],
+                       help='摘要的时间间隔')
+    epoch.add_argument('--limit', type=int, default=1000, help='范围查询返回的行数')
+    epoch.add_argument('--scale', type=int, default=1, help='把测量记录复制为多少倍后测试')
+    epoch.add_argument('--repeat', type=int, default=200, help='每个场景的执行次数')
+    epoch.set_defaults(func=bench_epoch)
+
+    partition = subparsers.add_parser('partition', help='近期/早期范围查询、主库大小和VACUUM耗时：单库 vs 按年归档分区')
+    partition.add_argument('--before', type=int, help='归档此年份之前的数据（默认最后一年往前3年）')
+    partition.add_argument('--type-id', type=int, default=4, help='查询的监测类型')
+    partition.add_argument('--interval', default='month', choices=['day', 'week', 'month', 'year'],
+                           help='摘要的时间间隔')
+    partition.add_argument('--limit', type=int, default=1000, help='范围查询返回的行数')
+    partition.add_argument('--scale', type=int, default=1, help='把测量记录复制为多少倍后测试')
+    partition.add_argument('--repeat', type=int, default=200, help='每个场景的执行次数')
+    partition.set_defaults(func=bench_partition)
+
+    columnar = subparsers.add_parser('columnar', help='归档分区的磁盘占用和扫描速度：SQLite分区 vs 列式分区')
+    columnar.add_argument('--before', type=int, default=2021, help='归档此年份之前的数据')
+    columnar.add_argument('--type-id', type=int, default=1, help='按类型扫描和摘要的监测类型')
+    columnar.add_argument('--scale', type=int, default=1, help='把测量记录复制为多少倍后测试')
+    columnar.add_argument('--repeat', type=int, default=50, help='每个场景的执行次数')
+    columnar.set_defaults(func=bench_columnar)
+
+    analytics = subparsers.add_parser('analytics', help='统计、摘要和按年聚合：SQLite vs DuckDB分析镜像')
+    analytics.add_argument('--type-id', type=int, default=1, help='摘要的监测类型')
+    analytics.add_argument('--append', type=int, default=100, help='测试追加同步时写入的记录数')
+    analytics.add_argument('--scale', type=int, default=1, help='把测量记录复制为多少倍后测试')
+    analytics.add_argument('--repeat', type=int, default=50, help='每个场景的执行次数')
+    analytics.set_defaults(func=bench_analytics)
+
+    cache = subparsers.add_parser('cache', help='读接口：不缓存 vs 响应缓存 vs 条件请求（304）')
+    cache.add_argument('--cache-size', type=int, default=256, help='每个worker缓存的响应数')
+    cache.set_defaults(func=bench_cache)
+
+    downsample = subparsers.add_parser('downsample', help='图表序列的延迟和响应大小：原始记录 vs LTTB降采样')
+    downsample.add_argument('--max-points', type=int, default=200, help='每个序列的最大点数')
+    downsample.add_argument('--type-id', type=int, default=1, help='按类型查询的监测类型')
+    downsample.add_argument('--repeat', type=int, default=20, help='每个场景的顺序请求次数')
+    downsample.set_defaults(func=bench_downsample)
+
+    batch = subparsers.add_parser('batch', help='页面加载的延迟：逐个GET请求 vs 一个批量查询请求')
+    batch.add_argument('--instruments', type=int, default=4, help='页面上的仪器数（每个仪器3个子查询）')
+    batch.add_argument('--repeat', type=int, default=30, help='页面加载次数')
+    batch.set_defaults(func=bench_batch)
+
+    export = subparsers.add_parser('export', help='全部历史的导出：一次性读取 vs 流式CSV/NDJSON')
+    export.add_argument('--scale', type=int, default=20, help='把测量记录复制为多少倍后测试')
+    export.set_defaults(func=bench_export)
+
+    payload = subparsers.add_parser('payload', help='测量数据的响应大小和服务端CPU：JSON vs 列式JSON vs 二进制')
+    payload.add_argument('--type-id', type=int, default=1, help='按类型查询的监测类型')
+    payload.add_argument('--limit', type=int, default=1000, help='分页查询的条数')
+    payload.add_argument('--repeat', type=int, default=100, help='每个场景的顺序请求次数')
+    payload.set_defaults(func=bench_payload)
+
+    return parser.parse_args()
+
+def main():
+    """主函数"""
+    args = parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
@@ -2,15 +2,63 @@
 """
 数据导入脚本 - 将Excel数据导入SQLite数据库
 """
+import argparse
+import hashlib
+import itertools
+import openpyxl
 import pandas as pd
+from openpyxl.cell.cell import ERROR_CODES
 import sqlite3
 import numpy as np
 import os
+import re
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from storage import (
+    StorageConfig, archive_year, archived_until, compact_partition, configure_connection, from_epoch,
+    list_partitions, migrate, rebuild_derived, restore_triggers, set_journal_mode, suspend_triggers
+)
 
 # 数据库路径
 DB_PATH = os.path.join(os.path.dirname(__file__), '../backend/data/monitoring.db')
 
+# Excel数据目录
+DATA_DIR = os.path.join(os.path.dirname(__file__), '../backend/data')
+
+# 从脏字符串（如"12.3mm"）中提取第一个数字
+NUMBER_PATTERN = re.compile(r'([-+]?(?:\d*\.\d+|\d+))')
+
+# 批量写入时每次executemany的行数
+CHUNK_SIZE = 5000
+
+# 默认解析进程数（每个Excel文件一个进程）
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# 解析结果缓存目录；解析或清洗逻辑变化时需要递增PARSER_VERSION使旧缓存失效
+CACHE_DIR = os.path.join(DATA_DIR, '.import_cache')
+PARSER_VERSION = 3
+CACHE_MAX_MB = 256
+
+# 长表（每行一个测量值）的列
+LONG_COLUMNS = ['type_id', 'instrument_id', 'measure_time', 'value', 'water_level']
+
+# measure_ts 在插入时直接计算，不经过触发器
+INSERT_SQL = '''
+    INSERT INTO measurement (type_id, instrument_id, measure_time, value, water_level, measure_ts)
+    VALUES (?1, ?2, ?3, ?4, ?5, CAST(strftime('%s', ?3) AS INTEGER))
+'''
+
+# 按唯一键upsert，值未变化时不改写记录
+UPSERT_SQL = INSERT_SQL + '''
+    ON CONFLICT (type_id, instrument_id, measure_time) DO UPDATE SET
+        value = excluded.value,
+        water_level = excluded.water_level,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE value IS NOT excluded.value OR water_level IS NOT excluded.water_level
+'''
+
 def clean_value(val):
     """清洗数据值：如果不是数字，返回0"""
     if pd.isna(val):
@@ -29,17 +77,21 @@ def clean_value(val):
         return 0.0
 
 def format_datetime(dt):
-    """格式化日期时间为字符串"""
+    """格式化日期时间为 YYYY-MM-DD HH:MM:SS 字符串，无法识别的值返回None
+
+    文本时间按日期解析后重新格式化（带时区的转换为UTC），保证 measure_time 格式统一、可换算为 measure_ts。
+    """
     if pd.isna(dt):
         return None
-    if isinstance(dt, pd.Timestamp):
+    if isinstance(dt, str):
+        dt = pd.to_datetime(dt.strip(), errors='coerce')
+        if pd.isna(dt):
+            return None
+        if dt.tzinfo is not None:
+            dt = dt.tz_convert('UTC').tz_localize(None)
+    if isinstance(dt, (pd.Timestamp, datetime)):
         return dt.strftime('%Y-%m-%d %H:%M:%S')
-    elif isinstance(dt, datetime):
-        return dt.strftime('%Y-%m-%d %H:%M:%S')
-    elif isinstance(dt, str):
-        return dt
-    else:
-        return str(dt)
+    return None
 
 def import_water_level(conn):
     """导入水位数据"""
@@ -60,19 +112,13 @@ def import_water_level(conn):
         # 处理上游水位
         if not pd.isna(row['upstream']):
             value = clean_value(row['upstream'])
-            cursor.execute('''
-                INSERT INTO measurement (type_id, instrument_id, measure_time, value)
-                VALUES (?, ?, ?, ?)
-            ''', (3, '上游', measure_time, value))  # type_id=3 是水位
+            cursor.execute(UPSERT_SQL, (3, '上游', measure_time, value, None))  # type_id=3 是水位
             count += 1
         
         # 处理下游水位
         if not pd.isna(row['downstream']):
             value = clean_value(row['downstream'])
-            cursor.execute('''
-                INSERT INTO measurement (type_id, instrument_id, measure_time, value)
-                VALUES (?, ?, ?, ?)
-            ''', (3, '下游', measure_time, value))
+            cursor.execute(UPSERT_SQL, (3, '下游', measure_time, value, None))
             count += 1
     
     print(f'  导入 {count} 条水位记录')
@@ -102,10 +148,7 @@ def import_tension_line(conn):
             instrument_id = col
             value = clean_value(row[col])
             
-            cursor.execute('''
-                INSERT INTO measurement (type_id, instrument_id, measure_time, value, water_level)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (1, instrument_id, measure_time, value, water_level))  # type_id=1 是引张线
+            cursor.execute(UPSERT_SQL, (1, instrument_id, measure_time, value, water_level))  # type_id=1 是引张线
             count += 1
     
     print(f'  导入 {count} 条引张线记录')
@@ -132,29 +175,18 @@ def import_static_level(conn):
             instrument_id = col
             value = clean_value(row[col])
             
-            cursor.execute('''
-                INSERT INTO measurement (type_id, instrument_id, measure_time, value)
-                VALUES (?, ?, ?, ?)
-            ''', (2, instrument_id, measure_time, value))  # type_id=2 是静力水准
+            cursor.execute(UPSERT_SQL, (2, instrument_id, measure_time, value, None))  # type_id=2 是静力水准
             count += 1
     
     print(f'  导入 {count} 条静力水准记录')
     return count
 
-def import_inverted_pendulum(conn):
-    """导入倒垂线数据"""
-    print('导入倒垂线数据...')
-    
-    # 读取前两行获取仪器和通道信息
-    df_header = pd.read_excel('../backend/data/倒垂线.xlsx', header=None, nrows=2)
-    
-    # 分析数据结构
-    print('  分析倒垂线数据结构...')
-    
-    # 第一行：仪器编号 (IP1, nan, IP3, nan, IP5, nan, ...)
-    # 第二行：通道信息 (观测时间, 左右岸CH1, 上下游CH2, 左右岸CH1, 上下游CH2, ...)
-    
-    # 构建仪器-通道映射
+def resolve_ip_channels(df_header):
+    """解析倒垂线两行表头，返回 [(列号, 仪器ID)] 映射
+
+    第一行：仪器编号 (IP1, nan, IP3, nan, IP5, nan, ...)
+    第二行：通道信息 (观测时间, 左右岸CH1, 上下游CH2, 左右岸CH1, 上下游CH2, ...)
+    """
     instrument_channel_map = []
     last_instrument = None
     
@@ -189,6 +221,24 @@ def import_inverted_pendulum(conn):
         instrument_id = f'{instrument}-{channel_suffix}'
         instrument_channel_map.append((col_idx, instrument_id))
     
+    return instrument_channel_map
+
+def import_inverted_pendulum(conn):
+    """导入倒垂线数据"""
+    print('导入倒垂线数据...')
+    
+    # 读取前两行获取仪器和通道信息
+    df_header = pd.read_excel('../backend/data/倒垂线.xlsx', header=None, nrows=2)
+    
+    # 分析数据结构
+    print('  分析倒垂线数据结构...')
+    
+    # 第一行：仪器编号 (IP1, nan, IP3, nan, IP5, nan, ...)
+    # 第二行：通道信息 (观测时间, 左右岸CH1, 上下游CH2, 左右岸CH1, 上下游CH2, ...)
+    
+    # 构建仪器-通道映射
+    instrument_channel_map = resolve_ip_channels(df_header)
+    
     print(f'  发现 {len(instrument_channel_map)} 个仪器通道组合')
     
     # 显示映射关系
@@ -218,10 +268,7 @@ def import_inverted_pendulum(conn):
             
             # 只导入有效数据（非零值）
             if value != 0.0:
-                cursor.execute('''
-                    INSERT INTO measurement (type_id, instrument_id, measure_time, value)
-                    VALUES (?, ?, ?, ?)
-                ''', (4, instrument_id, measure_time, value))  # type_id=4 是倒垂线
+                cursor.execute(UPSERT_SQL, (4, instrument_id, measure_time, value, None))  # type_id=4 是倒垂线
                 count += 1
     
     print(f'  导入 {count} 条倒垂线记录')
@@ -250,28 +297,779 @@ def import_inverted_pendulum(conn):
     
     return count
 
+# ==================== 批量导入 ====================
+def clean_column(series):
+    """按列清洗数据值，返回 (数值, 修复掩码, 拒绝掩码)
+
+    整列转换为数值；转换失败的字符串用预编译正则提取第一个数字（修复），
+    提取不到数字的单元格（拒绝）与空单元格一样保留为NaN，不与真实的0读数混淆。
+    """
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=float, copy=True)
+    dirty = np.isnan(values) & series.notna().to_numpy()
+    if dirty.any():
+        candidates = series[dirty]
+        is_string = (candidates.map(type) == str).to_numpy()
+        extracted = candidates[is_string].str.extract(NUMBER_PATTERN, expand=False)
+        values[np.flatnonzero(dirty)[is_string]] = pd.to_numeric(
+            extracted, errors='coerce'
+        ).to_numpy(dtype=float)
+    repaired = dirty & ~np.isnan(values)
+    rejected = dirty & np.isnan(values)
+    return pd.Series(values, index=series.index), repaired, rejected
+
+def format_datetime_column(series):
+    """按列格式化日期时间，无效时间为None"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        times = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+    else:
+        times = series.map(format_datetime)
+    return times.where(times.notna() & (times != ''), None)
+
+def melt_sheet(df, type_id, time_col, instrument_cols, water_level_col=None,
+               instrument_names=None):
+    """将宽表（每列一个仪器）融化为长表（每行一个测量值）
+
+    instrument_names: 列名到仪器ID的映射，默认直接使用列名
+    空单元格和无法提取数字的单元格不导入；各仪器修复/拒绝的单元格数记录在
+    返回长表的attrs['quality']中：{instrument_id: (修复数, 拒绝数)}。
+    """
+    times = format_datetime_column(df[time_col])
+    df = df[times.notna()]
+    times = times[times.notna()]
+
+    long = df[list(instrument_cols)].melt(
+        var_name='instrument_id', value_name='raw', ignore_index=False
+    )
+    if instrument_names is not None:
+        long['instrument_id'] = long['instrument_id'].map(instrument_names)
+
+    values, repaired, rejected = clean_column(long['raw'])
+    long['value'] = values.to_numpy()
+    counts = pd.DataFrame({
+        'instrument_id': long['instrument_id'], 'repaired': repaired, 'rejected': rejected,
+    }).groupby('instrument_id', sort=False)[['repaired', 'rejected']].sum()
+    counts = counts[(counts['repaired'] > 0) | (counts['rejected'] > 0)]
+    long = long[long['value'].notna()]
+
+    long['type_id'] = type_id
+    long['measure_time'] = times.reindex(long.index)
+    if water_level_col is not None:
+        water_level, _, _ = clean_column(df[water_level_col])
+        long['water_level'] = water_level.reindex(long.index)
+    else:
+        long['water_level'] = np.nan
+
+    # 同一仪器同一时间重复出现时保留最后一行
+    long = long.drop_duplicates(['instrument_id', 'measure_time'], keep='last')
+    result = long[LONG_COLUMNS].reset_index(drop=True)
+    result.attrs['quality'] = {
+        instrument_id: (int(row.repaired), int(row.rejected))
+        for instrument_id, row in counts.iterrows()
+    }
+    return result
+
+def merge_quality(report, source, frame):
+    """把长表attrs中的数据质量计数累加到report：{(数据源, 仪器ID): [修复数, 拒绝数]}"""
+    for instrument_id, (repaired, rejected) in frame.attrs.get('quality', {}).items():
+        counts = report.setdefault((source, instrument_id), [0, 0])
+        counts[0] += repaired
+        counts[1] += rejected
+
+def print_quality(report):
+    """输出各仪器修复/拒绝的单元格数"""
+    print('\n数据质量（修复：从文本中提取出数字；拒绝：无法识别为数字，未导入）:')
+    if not report:
+        print('  所有单元格均为有效数值')
+        return
+    for (source, instrument_id), (repaired, rejected) in sorted(report.items()):
+        print(f'  {source} {instrument_id}: 修复 {repaired}，拒绝 {rejected}')
+
+def melt_water_level(df):
+    """融化水位表：上游/下游两列"""
+    df.columns = ['measure_time', '上游', '下游']
+    # type_id=3 是水位
+    return melt_sheet(df, 3, 'measure_time', ['上游', '下游'])
+
+def melt_tension_line(df):
+    """融化引张线表：第一列是观测时间，第二列是水位，后面是各个仪器"""
+    # type_id=1 是引张线
+    return melt_sheet(df, 1, df.columns[0], df.columns[2:], water_level_col=df.columns[1])
+
+def melt_static_level(df):
+    """融化静力水准表：第一列是观测时间，后面是各个仪器"""
+    # type_id=2 是静力水准
+    return melt_sheet(df, 2, df.columns[0], df.columns[1:])
+
+def melt_inverted_pendulum(df, channel_map):
+    """融化倒垂线数据行（不含两行表头），列为原始列号"""
+    # type_id=4 是倒垂线
+    return melt_sheet(
+        df, 4, 0, [col_idx for col_idx, _ in channel_map],
+        instrument_names=dict(channel_map)
+    )
+
+def parse_water_level(path):
+    """解析水位表"""
+    return melt_water_level(pd.read_excel(path))
+
+def parse_tension_line(path):
+    """解析引张线表"""
+    return melt_tension_line(pd.read_excel(path))
+
+def parse_static_level(path):
+    """解析静力水准表"""
+    return melt_static_level(pd.read_excel(path))
+
+def parse_inverted_pendulum(path):
+    """解析倒垂线表：前两行是仪器/通道表头，只读取一次文件"""
+    raw = pd.read_excel(path, header=None)
+    return melt_inverted_pendulum(raw.iloc[2:], resolve_ip_channels(raw.iloc[:2]))
+
+# 数据源：(名称, Excel文件名, 解析函数)
+SOURCES = [
+    ('水位', '水位.xlsx', parse_water_level),
+    ('引张线', '引张线.xlsx', parse_tension_line),
+    ('静力水准', '静力水准.xlsx', parse_static_level),
+    ('倒垂线', '倒垂线.xlsx', parse_inverted_pendulum),
+]
+
+def iter_records(frame):
+    """将长表转换为可直接绑定到SQL的元组（NaN转换为None）"""
+    data = frame[LONG_COLUMNS].astype(object)
+    data = data.where(data.notna(), None)
+    return data.itertuples(index=False, name=None)
+
+def write_measurements(conn, frame, chunk_size=CHUNK_SIZE, upsert=False):
+    """分块executemany写入长表数据，返回 (提交的行数, 实际新增或修改的行数)
+
+    实际修改行数取自rowcount，不包含触发器对派生表的修改，upsert时值未变化的行不计入。
+    归档截止时间及之前的记录已在只读分区中，不再写入。
+    """
+    until = archived_until(conn)
+    if until is not None:
+        frame = frame[~(frame['measure_time'] <= from_epoch(until))]
+    cursor = conn.cursor()
+    sql = UPSERT_SQL if upsert else INSERT_SQL
+    records = iter_records(frame)
+    count = 0
+    changed = 0
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        cursor.executemany(sql, chunk)
+        count += len(chunk)
+        changed += cursor.rowcount
+    return count, changed
+
+# ==================== 增量导入 ====================
+def file_fingerprint(path):
+    """计算文件内容的SHA-256指纹"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def row_hashes(frame):
+    """逐行哈希测量记录（与行所在位置无关），分批计算的结果可以直接拼接"""
+    return pd.util.hash_pandas_object(
+        frame[['measure_time', 'value', 'water_level']], index=False
+    ).to_numpy()
+
+def frame_digest(frame):
+    """计算一段测量记录的内容摘要，用于判断已导入的历史数据是否被修改"""
+    return hashlib.sha1(row_hashes(frame).tobytes()).hexdigest()
+
+class WatermarkTracker:
+    """逐批累计各仪器的水位线：最后测量时间、行数和内容摘要"""
+
+    def __init__(self):
+        self.instruments = {}
+
+    def update(self, frame):
+        """累计一批长表数据，同一仪器的各批需按原始顺序传入"""
+        for instrument_id, group in frame.groupby('instrument_id', sort=False):
+            state = self.instruments.get(instrument_id)
+            if state is None:
+                state = self.instruments[instrument_id] = {
+                    'type_id': int(group['type_id'].iloc[0]),
+                    'last_measure_time': None,
+                    'row_count': 0,
+                    'digest': hashlib.sha1(),
+                }
+            last_measure_time = group['measure_time'].max()
+            if state['last_measure_time'] is None or last_measure_time > state['last_measure_time']:
+                state['last_measure_time'] = last_measure_time
+            state['row_count'] += len(group)
+            state['digest'].update(row_hashes(group).tobytes())
+
+    def save(self, conn, source, fingerprint):
+        """写入数据源各仪器的水位线"""
+        conn.executemany('''
+            INSERT OR REPLACE INTO import_watermark
+                (source, instrument_id, type_id, last_measure_time, row_count,
+                 history_digest, file_fingerprint, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', [
+            (source, instrument_id, state['type_id'], state['last_measure_time'],
+             state['row_count'], state['digest'].hexdigest(), fingerprint)
+            for instrument_id, state in self.instruments.items()
+        ])
+
+def load_watermarks(conn, source):
+    """读取数据源各仪器的水位线 {instrument_id: (last_measure_time, history_digest, file_fingerprint)}"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT instrument_id, last_measure_time, history_digest, file_fingerprint
+        FROM import_watermark
+        WHERE source = ?
+    ''', (source,))
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+def save_watermarks(conn, source, frame, fingerprint):
+    """按本次解析的完整数据更新数据源各仪器的水位线"""
+    tracker = WatermarkTracker()
+    tracker.update(frame)
+    tracker.save(conn, source, fingerprint)
+
+def select_new_rows(frame, watermarks):
+    """选出需要写入的行
+
+    历史部分（不晚于水位线）摘要未变化的仪器只取水位线之后的新数据；
+    新仪器或历史被修改的仪器整体upsert，由唯一键去重、只改写变化的值。
+    """
+    parts = []
+    for instrument_id, group in frame.groupby('instrument_id', sort=False):
+        mark = watermarks.get(instrument_id)
+        if mark is not None:
+            last_measure_time, history_digest, _ = mark
+            newer = group['measure_time'] > last_measure_time
+            if frame_digest(group[~newer]) == history_digest:
+                group = group[newer]
+        parts.append(group)
+    if not parts:
+        return frame.iloc[:0]
+    return pd.concat(parts)
+
+# 待导入的数据源
+ImportJob = namedtuple('ImportJob', 'name filename parser path fingerprint watermarks')
+
+# ==================== 解析缓存 ====================
+def cache_path(job):
+    """解析缓存文件路径，由解析函数、文件内容指纹和解析器版本决定"""
+    return os.path.join(
+        CACHE_DIR, f'{job.parser.__name__}-{job.fingerprint[:32]}-v{PARSER_VERSION}.npz'
+    )
+
+def load_cached_frame(job):
+    """读取缓存的长表，未命中返回None"""
+    path = cache_path(job)
+    try:
+        with np.load(path) as data:
+            frame = pd.DataFrame({column: data[column] for column in LONG_COLUMNS})
+            frame.attrs['quality'] = {
+                instrument_id: (int(repaired), int(rejected))
+                for instrument_id, repaired, rejected in zip(
+                    data['quality_instrument'], data['quality_repaired'], data['quality_rejected']
+                )
+            }
+    except (OSError, KeyError, ValueError):
+        return None
+    # 更新修改时间，淘汰时按最近使用排序
+    os.utime(path)
+    return frame
+
+def store_cached_frame(job, frame, max_bytes):
+    """以未压缩的列式npz格式缓存长表，然后按大小上限淘汰最久未使用的缓存"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(job)
+    tmp_path = path + '.tmp.npz'
+    quality = frame.attrs.get('quality', {})
+    np.savez(
+        tmp_path,
+        type_id=frame['type_id'].to_numpy(dtype=np.int64),
+        instrument_id=frame['instrument_id'].to_numpy(dtype=str),
+        measure_time=frame['measure_time'].to_numpy(dtype=str),
+        value=frame['value'].to_numpy(dtype=np.float64),
+        water_level=frame['water_level'].to_numpy(dtype=np.float64),
+        quality_instrument=np.array(list(quality), dtype=str),
+        quality_repaired=np.array([counts[0] for counts in quality.values()], dtype=np.int64),
+        quality_rejected=np.array([counts[1] for counts in quality.values()], dtype=np.int64),
+    )
+    os.replace(tmp_path, path)
+    evict_cache(max_bytes)
+
+def evict_cache(max_bytes):
+    """按最近使用时间淘汰缓存文件，直到总大小不超过max_bytes"""
+    entries = []
+    for filename in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, filename)
+        if filename.endswith('.npz') and os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+def timed_parse(parser, path):
+    """解析单个Excel文件并计时，可在子进程中运行，返回 (长表, 解析耗时)"""
+    started = time.perf_counter()
+    frame = parser(path)
+    return frame, time.perf_counter() - started
+
+def iter_parsed(jobs, workers, cache_max_mb=CACHE_MAX_MB, force_reparse=False):
+    """按jobs顺序产出 (job, 长表, 解析耗时, 是否命中缓存)
+
+    内容未变化的文件直接读取解析缓存；其余文件在workers大于1时在进程池中并行解析，
+    主进程写入前一个文件时后面的文件继续解析。cache_max_mb为0时不使用缓存。
+    """
+    use_cache = cache_max_mb > 0
+    cached = {}
+    if use_cache and not force_reparse:
+        for job in jobs:
+            started = time.perf_counter()
+            frame = load_cached_frame(job)
+            if frame is not None:
+                cached[job.name] = (frame, time.perf_counter() - started)
+
+    to_parse = [job for job in jobs if job.name not in cached]
+    if workers > 1 and len(to_parse) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(to_parse)))
+        futures = {job.name: executor.submit(timed_parse, job.parser, job.path) for job in to_parse}
+    else:
+        executor = None
+        futures = {}
+
+    try:
+        for job in jobs:
+            if job.name in cached:
+                yield (job,) + cached[job.name] + (True,)
+                continue
+            if job.name in futures:
+                frame, seconds = futures[job.name].result()
+            else:
+                frame, seconds = timed_parse(job.parser, job.path)
+            if use_cache:
+                store_cached_frame(job, frame, cache_max_mb * 1024 * 1024)
+            yield job, frame, seconds, False
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def import_bulk(conn, chunk_size=CHUNK_SIZE, incremental=False, workers=1,
+                cache_max_mb=CACHE_MAX_MB, force_reparse=False, quality=None):
+    """批量导入所有数据源，返回 (导入总行数, 实际新增或修改的行数)，数据质量计数累加到quality
+
+    incremental为True时跳过未变化的文件，只upsert水位线之后或内容有变化的记录。
+    解析在进程池中进行（内容未变化的文件读取解析缓存），写入始终由当前连接单线程完成。
+    """
+    jobs = []
+    for name, filename, parser in SOURCES:
+        path = os.path.join(DATA_DIR, filename)
+        fingerprint = file_fingerprint(path)
+        watermarks = load_watermarks(conn, name) if incremental else {}
+        if watermarks and all(mark[2] == fingerprint for mark in watermarks.values()):
+            print(f'{name}: 文件未变化，跳过')
+            continue
+        jobs.append(ImportJob(name, filename, parser, path, fingerprint, watermarks))
+
+    total = 0
+    total_changed = 0
+    timings = []
+    parsed = iter_parsed(jobs, workers, cache_max_mb, force_reparse)
+    for job, frame, parse_seconds, from_cache in parsed:
+        started = time.perf_counter()
+        rows = select_new_rows(frame, job.watermarks) if incremental else frame
+        count, changed = write_measurements(conn, rows, chunk_size, upsert=incremental)
+        save_watermarks(conn, job.name, frame, job.fingerprint)
+        write_seconds = time.perf_counter() - started
+        if quality is not None:
+            merge_quality(quality, job.name, frame)
+
+        source = '读取缓存' if from_cache else '解析'
+        print(f'导入{job.name}数据: {count} 条记录（{source} {parse_seconds:.2f}s，'
+              f'写入 {write_seconds:.2f}s，{count / (parse_seconds + write_seconds):.0f} 行/秒）')
+        timings.append((job.filename, count, parse_seconds, write_seconds))
+        total += count
+        total_changed += changed
+
+    if timings:
+        print('\n耗时明细:')
+        print(f'  {"文件":<12}{"记录数":>10}{"解析(s)":>10}{"写入(s)":>10}')
+        for filename, count, parse_seconds, write_seconds in timings:
+            print(f'  {filename:<12}{count:>10}{parse_seconds:>10.2f}{write_seconds:>10.2f}')
+        print(f'  {"合计":<12}{total:>10}{sum(t[2] for t in timings):>10.2f}'
+              f'{sum(t[3] for t in timings):>10.2f}')
+    return total, total_changed
+
+# ==================== 流式导入 ====================
+# 按每个单元格约256字节（宽表+融化后的长表）估算一批数据占用的内存
+BYTES_PER_CELL = 256
+MAX_MEMORY_MB = 64
+
+def header_labels(row):
+    """按pd.read_excel的规则生成列名：空表头为'Unnamed: n'，重复列名追加'.n'"""
+    labels = []
+    seen = {}
+    for idx, value in enumerate(row):
+        label = f'Unnamed: {idx}' if value is None else value
+        if label in seen:
+            seen[label] += 1
+            label = f'{label}.{seen[label]}'
+        else:
+            seen[label] = 0
+        labels.append(label)
+    return labels
+
+def excel_row(row, width):
+    """按表头宽度截断或补齐一行，与pd.read_excel一致地把空字符串和错误值（如#REF!）视为空"""
+    row = (row + (None,) * (width - len(row)))[:width]
+    return tuple(
+        None if value == '' or (isinstance(value, str) and value in ERROR_CODES) else value
+        for value in row
+    )
+
+def iter_sheet_batches(path, header_rows, batch_rows=None, max_memory_mb=MAX_MEMORY_MB):
+    """以只读模式逐行读取第一个工作表，一次遍历产出 (表头行, 数据行批次)
+
+    未指定batch_rows时按max_memory_mb和表头列数估算每批行数。
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [list(row) for row in itertools.islice(rows, header_rows)]
+        # 去掉表头末尾的空列，数据行按表头宽度截断或补齐
+        width = len(header[0])
+        while width and all(row[width - 1] is None for row in header):
+            width -= 1
+        header = [row[:width] for row in header]
+        if not batch_rows:
+            batch_rows = max(1, max_memory_mb * 1024 * 1024 // (width * BYTES_PER_CELL))
+
+        while True:
+            batch = [
+                excel_row(row, width) for row in itertools.islice(rows, batch_rows)
+            ]
+            if not batch:
+                break
+            yield header, batch
+    finally:
+        workbook.close()
+
+def stream_water_level(header, batch):
+    """流式融化一批水位数据"""
+    return melt_water_level(pd.DataFrame(batch, columns=header_labels(header[0])))
+
+def stream_tension_line(header, batch):
+    """流式融化一批引张线数据"""
+    return melt_tension_line(pd.DataFrame(batch, columns=header_labels(header[0])))
+
+def stream_static_level(header, batch):
+    """流式融化一批静力水准数据"""
+    return melt_static_level(pd.DataFrame(batch, columns=header_labels(header[0])))
+
+def stream_inverted_pendulum(header, batch):
+    """流式融化一批倒垂线数据，两行表头在首次遍历时一并读取"""
+    return melt_inverted_pendulum(pd.DataFrame(batch), resolve_ip_channels(pd.DataFrame(header)))
+
+# 流式导入：数据源名称 -> (表头行数, 批次融化函数)
+STREAM_MELTERS = {
+    '水位': (1, stream_water_level),
+    '引张线': (1, stream_tension_line),
+    '静力水准': (1, stream_static_level),
+    '倒垂线': (2, stream_inverted_pendulum),
+}
+
+def import_stream(conn, chunk_size=CHUNK_SIZE, incremental=False, batch_rows=None,
+                  max_memory_mb=MAX_MEMORY_MB, quality=None):
+    """流式导入所有数据源，返回 (导入总行数, 实际新增或修改的行数)，数据质量计数累加到quality
+
+    逐批读取、清洗并写入，内存占用与文件大小无关。批次之间可能出现重复的唯一键，
+    因此始终以upsert方式写入；增量模式下文件有变化时整体upsert，只改写变化的值。
+    """
+    total = 0
+    total_changed = 0
+    for name, filename, _ in SOURCES:
+        path = os.path.join(DATA_DIR, filename)
+        fingerprint = file_fingerprint(path)
+        watermarks = load_watermarks(conn, name) if incremental else {}
+        if watermarks and all(mark[2] == fingerprint for mark in watermarks.values()):
+            print(f'{name}: 文件未变化，跳过')
+            continue
+
+        header_rows, melter = STREAM_MELTERS[name]
+        tracker = WatermarkTracker()
+        started = time.perf_counter()
+        count = 0
+        batches = 0
+        for header, batch in iter_sheet_batches(path, header_rows, batch_rows, max_memory_mb):
+            frame = melter(header, batch)
+            written, changed = write_measurements(conn, frame, chunk_size, upsert=True)
+            count += written
+            total_changed += changed
+            tracker.update(frame)
+            if quality is not None:
+                merge_quality(quality, name, frame)
+            batches += 1
+        tracker.save(conn, name, fingerprint)
+        elapsed = time.perf_counter() - started
+
+        print(f'导入{name}数据: {count} 条记录（{batches} 批，{elapsed:.2f}s，'
+              f'{count / elapsed:.0f} 行/秒）')
+        total += count
+    return total, total_changed
+
+# ==================== 仪器信息 ====================
+# 仪器信息表文件名及其中的行标签
+INSTRUMENT_INFO_FILE = '仪器信息.xlsx'
+INSTRUMENT_INFO_LABELS = {
+    'location': '部位',
+    'position': '平面位置(m)',
+    'elevation': '高程(m)',
+    'installed_at': '埋设时间',
+}
+
+# 台账信息写入仪器目录，值未变化时不改写（不递增目录版本号）
+INSTRUMENT_INFO_SQL = '''
+    INSERT INTO instrument (instrument_id, type_id, location, position, elevation, installed_at)
+    VALUES (:instrument_id, :type_id, :location, :position, :elevation, :installed_at)
+    ON CONFLICT (instrument_id, type_id) DO UPDATE SET
+        location = excluded.location,
+        position = excluded.position,
+        elevation = excluded.elevation,
+        installed_at = excluded.installed_at
+    WHERE location IS NOT excluded.location OR position IS NOT excluded.position
+       OR elevation IS NOT excluded.elevation OR installed_at IS NOT excluded.installed_at
+'''
+
+# 倒垂线按通道导入（IP1-CH1、IP1-CH2），通道沿用所属仪器的台账信息
+CHANNEL_INFO_SQL = '''
+    UPDATE instrument SET
+        location = :location, position = :position, elevation = :elevation, installed_at = :installed_at
+    WHERE type_id = :type_id AND instrument_id GLOB :instrument_id || '-CH*'
+      AND (location IS NOT :location OR position IS NOT :position
+           OR elevation IS NOT :elevation OR installed_at IS NOT :installed_at)
+'''
+
+def parse_instrument_info(path):
+    """解析仪器信息表，返回 [(类型名称, 台账记录)]
+
+    每类仪器占若干行：首列为类型名称，第二列为行标签，之后每列一台仪器；
+    合并单元格（如同一批仪器共用的高程、埋设时间）的值填充到合并区域的每一列。
+    """
+    workbook = openpyxl.load_workbook(path, data_only=True)
+    sheet = workbook.worksheets[0]
+    grid = [list(row) for row in sheet.iter_rows(values_only=True)]
+    for merged in sheet.merged_cells.ranges:
+        value = grid[merged.min_row - 1][merged.min_col - 1]
+        for r in range(merged.min_row - 1, merged.max_row):
+            for c in range(merged.min_col - 1, merged.max_col):
+                grid[r][c] = value
+    workbook.close()
+
+    sections = []
+    for row in grid:
+        if row[0] is not None and str(row[0]).strip():
+            sections.append((str(row[0]).strip(), {}))
+        if sections and len(row) > 1 and row[1] is not None:
+            sections[-1][1][str(row[1]).strip()] = row
+
+    records = []
+    for type_name, rows in sections:
+        ids = rows.get('仪器编号')
+        if ids is None:
+            continue
+        for col in range(2, len(ids)):
+            if ids[col] is None or not str(ids[col]).strip():
+                continue
+            record = {'instrument_id': str(ids[col]).strip()}
+            for key, label in INSTRUMENT_INFO_LABELS.items():
+                row = rows.get(label)
+                record[key] = row[col] if row is not None and col < len(row) else None
+            if record['location'] is not None:
+                record['location'] = str(record['location']).strip()
+            if record['position'] is not None:
+                record['position'] = ' '.join(str(record['position']).split())
+            if record['elevation'] is not None:
+                record['elevation'] = clean_value(record['elevation'])
+            record['installed_at'] = format_datetime(record['installed_at'])
+            records.append((type_name, record))
+    return records
+
+def import_instrument_info(conn):
+    """把仪器信息表中的台账信息写入仪器目录，返回仪器数量"""
+    path = os.path.join(DATA_DIR, INSTRUMENT_INFO_FILE)
+    if not os.path.exists(path):
+        print(f'未找到{INSTRUMENT_INFO_FILE}，跳过仪器信息')
+        return 0
+    type_ids = dict(conn.execute('SELECT name, id FROM monitoring_type').fetchall())
+    records = []
+    for type_name, record in parse_instrument_info(path):
+        if type_name not in type_ids:
+            print(f'  仪器信息: 未知的监测类型 {type_name}，跳过 {record["instrument_id"]}')
+            continue
+        records.append(dict(record, type_id=type_ids[type_name]))
+    conn.executemany(INSTRUMENT_INFO_SQL, records)
+    conn.executemany(CHANNEL_INFO_SQL, records)
+    return len(records)
+
+# ==================== 快速写入模式 ====================
+def begin_fast_load(conn):
+    """进入快速写入模式并开启事务，返回被删除、需要在导入后重建的索引 [(名称, SQL)]
+
+    放宽日志与同步设置（仅对当前连接有效；WAL模式的数据库保持WAL），
+    在同一事务内删除measurement上的非唯一二级索引。唯一索引保留，用于upsert去重。
+    导入失败回滚时被删除的索引随事务一起恢复。
+    """
+    journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    if journal_mode.lower() != 'wal':
+        conn.execute('PRAGMA journal_mode = MEMORY')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA cache_size = -65536')
+
+    conn.execute('BEGIN IMMEDIATE')
+    indexes = conn.execute('''
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'measurement' AND sql IS NOT NULL
+    ''').fetchall()
+    deferred = [(name, sql) for name, sql in indexes if not sql.upper().startswith('CREATE UNIQUE')]
+    for name, _ in deferred:
+        conn.execute(f'DROP INDEX "{name}"')
+    return deferred
+
+def finish_fast_load(conn, deferred):
+    """在同一事务内重建导入前删除的索引，返回耗时（秒）"""
+    started = time.perf_counter()
+    for _, sql in deferred:
+        conn.execute(sql)
+    return time.perf_counter() - started
+
+def import_legacy(conn):
+    """逐行INSERT的旧导入流程，保留用于性能对比
+
+    按唯一键upsert：工作簿中重复的时间改写已有记录并触发UPDATE触发器。INSERT OR REPLACE 删除旧记录时
+    不触发DELETE触发器（recursive_triggers 关闭），派生表会重复计数。
+    """
+    total = 0
+    total += import_water_level(conn)
+    total += import_tension_line(conn)
+    total += import_static_level(conn)
+    total += import_inverted_pendulum(conn)
+    return total
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='将Excel监测数据导入SQLite数据库')
+    parser.add_argument('--legacy', action='store_true',
+                        help='使用逐行INSERT的旧导入流程（用于性能对比）')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f'每次executemany写入的行数（默认{CHUNK_SIZE}）')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'并行解析Excel的进程数，1表示在主进程中顺序解析（默认{DEFAULT_WORKERS}）')
+    parser.add_argument('--cache-max-mb', type=int, default=CACHE_MAX_MB,
+                        help=f'解析缓存的大小上限（MB），0表示不使用缓存（默认{CACHE_MAX_MB}）')
+    parser.add_argument('--force-reparse', action='store_true',
+                        help='忽略解析缓存，重新解析所有Excel文件并刷新缓存')
+    parser.add_argument('--stream', action='store_true',
+                        help='流式导入：只读模式逐行读取Excel并分批写入，内存占用有上限（不使用进程池和解析缓存）')
+    parser.add_argument('--batch-rows', type=int,
+                        help='流式导入每批读取的Excel行数，默认按--max-memory-mb估算')
+    parser.add_argument('--max-memory-mb', type=int, default=MAX_MEMORY_MB,
+                        help=f'流式导入每批数据的内存上限（MB，默认{MAX_MEMORY_MB}）')
+    parser.add_argument('--fast', action='store_true',
+                        help='快速写入模式：放宽日志/同步设置，导入期间删除二级索引，结束后重建索引并执行ANALYZE')
+    parser.add_argument('--incremental', action='store_true',
+                        help='增量导入：保留现有数据，按水位线只upsert新增或变化的记录')
+    return parser.parse_args()
+
 def main():
     """主函数"""
+    args = parse_args()
     print('开始导入监测数据...')
     print('=' * 50)
     
-    # 连接数据库
-    conn = sqlite3.connect(DB_PATH)
+    # 连接数据库（WAL模式下导入事务不会阻塞API的读请求）
+    set_journal_mode(DB_PATH)
+    conn = configure_connection(sqlite3.connect(DB_PATH), synchronous=StorageConfig.IMPORT_SYNCHRONOUS)
     cursor = conn.cursor()
     
-    # 清空现有的测量数据
-    print('清空现有数据...')
-    cursor.execute('DELETE FROM measurement')
+    # 表结构、唯一键和水位线表由迁移维护
+    applied = migrate(conn)
+    if applied:
+        print(f'执行数据库迁移: {applied}')
     
-    # 开始导入数据
-    total = 0
-    total += import_water_level(conn)
-    total += import_tension_line(conn)
-    total += import_static_level(conn)
-    total += import_inverted_pendulum(conn)
+    if args.incremental and args.legacy:
+        raise SystemExit('--incremental 不能与 --legacy 同时使用')
+    
+    until = archived_until(conn)
+    if args.incremental and until is not None:
+        print(f'{from_epoch(until)} 及之前的数据已归档为只读分区，增量导入跳过这部分记录')
     
-    # 提交更改
-    conn.commit()
+    started = time.perf_counter()
+    quality = {}
+    try:
+        if args.fast:
+            deferred_indexes = begin_fast_load(conn)
+            print(f'快速写入模式：暂时删除 {len(deferred_indexes)} 个索引')
+        elif not conn.in_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+        
+        # 全量导入时清空现有的测量数据，暂停派生表的触发器，导入后统一重建；
+        # 已归档的年份先注销，全部数据写入 measurement，提交后再按原来的年份和格式归档
+        archived_years = []
+        if not args.incremental:
+            suspended = suspend_triggers(conn)
+            print('清空现有数据...')
+            archived_years = sorted((partition.year, partition.format) for partition in list_partitions(conn))
+            cursor.execute('DELETE FROM measurement_partition')
+            cursor.execute('DELETE FROM measurement')
+            cursor.execute('DELETE FROM import_watermark')
+        
+        # 开始导入数据
+        if args.legacy:
+            total = import_legacy(conn)
+            changed = total
+        elif args.stream:
+            total, changed = import_stream(
+                conn, args.chunk_size, args.incremental, args.batch_rows, args.max_memory_mb,
+                quality
+            )
+        else:
+            total, changed = import_bulk(
+                conn, args.chunk_size, args.incremental, args.workers,
+                args.cache_max_mb, args.force_reparse, quality
+            )
+        
+        if args.fast:
+            index_seconds = finish_fast_load(conn, deferred_indexes)
+        
+        if not args.incremental:
+            derived = rebuild_derived(conn)
+            restore_triggers(conn, suspended)
+        
+        # 仪器台账信息写入仪器目录（记录数和首末时间由触发器或上面的重建维护）
+        instrument_count = import_instrument_info(conn)
+        
+        # 提交更改
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        conn.close()
+        print('导入失败，已回滚所有更改')
+        raise
+    elapsed = time.perf_counter() - started
+    
+    if args.fast:
+        analyze_started = time.perf_counter()
+        conn.execute('ANALYZE')
+        conn.commit()
+        analyze_seconds = time.perf_counter() - analyze_started
     
     # 统计导入的数据
     cursor.execute('SELECT type_id, COUNT(*) FROM measurement GROUP BY type_id')
@@ -283,10 +1081,22 @@ def main():
     
     print('=' * 50)
     print(f'导入完成！总共导入 {total} 条记录')
+    if args.incremental:
+        print(f'实际新增或修改 {changed} 条记录')
+    print(f'耗时 {elapsed:.2f}s，{total / elapsed:.0f} 行/秒')
+    print(f'更新 {instrument_count} 台仪器的台账信息')
+    if args.fast:
+        print(f'重建 {len(deferred_indexes)} 个索引耗时 {index_seconds:.2f}s，'
+              f'ANALYZE 耗时 {analyze_seconds:.2f}s')
+    if not args.incremental:
+        for name, (count, seconds) in derived.items():
+            print(f'重建 {name}: {count} 行，耗时 {seconds:.2f}s')
     print('\n按类型统计:')
     for type_id, count in stats:
         type_name = type_map.get(type_id, f'未知类型({type_id})')
         print(f'  {type_name}: {count} 条记录')
+    if not args.legacy:
+        print_quality(quality)
     
     # 显示一些示例数据
     print('\n示例数据（前3条）:')
@@ -299,6 +1109,17 @@ def main():
     for row in cursor.fetchall():
         print(f'  ID: {row[0]}, 类型: {row[1]}, 仪器: {row[2]}, 时间: {row[3]}, 值: {row[4]}, 水位: {row[5]}')
     
+    if archived_years:
+        print('\n重新归档:')
+        for year, partition_format in archived_years:
+            try:
+                print(f'  {year} 年: {archive_year(conn, year)} 条记录')
+                if partition_format == 'columnar':
+                    compact_partition(conn, list_partitions(conn)[0])
+            except ValueError as e:
+                print(f'  {year} 年未归档: {e}')
+                break
+    
     conn.close()
     print('\n数据导入完成！')
 
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本 - 执行迁移、查看状态、检查API查询的执行计划
+
+用法:
+    python migrate.py                 # 执行未应用的迁移
+    python migrate.py --status        # 查看迁移状态
+    python migrate.py --check-plans   # 检查各API端点查询的EXPLAIN QUERY PLAN，出现measurement全表扫描
+                                      # 或有读接口没有被检查时以非0状态退出
+    python migrate.py --rebuild       # 按测量记录重建汇总表等派生表
+    python migrate.py --check         # 校验派生表与测量记录是否一致，不一致时以非0状态退出
+    python migrate.py --partitions    # 查看已归档的分区
+    python migrate.py --archive-before 2024   # 把2024年之前已结束的年份按年归档为只读分区
+    python migrate.py --restore       # 把最新的分区恢复到 measurement 表
+    python migrate.py --columnar      # 把SQLite分区转换为列式分区（可与 --archive-before 同时使用）
+"""
+import argparse
+import re
+import sqlite3
+import sys
+from urllib.parse import urlencode
+from storage import (
+    StorageConfig, archive_before, check_derived, compact_partitions, configure_connection,
+    current_version, list_partitions, migrate, migration_status, partition_aggregates, partition_size,
+    rebuild_derived, restore_partition, to_epoch
+)
+
+# 不允许全表扫描的大表；monitoring_type、users等小表扫描不计
+FACT_TABLES = {'measurement'}
+
+# 不需要检查执行计划的端点：认证和用户管理、不查询数据库的端点，以及经由写入队列执行的写入端点
+PLAN_EXEMPT_ENDPOINTS = {
+    'static', 'index', 'health_check', 'get_metrics', 'get_users', 'create_user', 'delete_user',
+    'create_measurement', 'update_measurement', 'delete_measurement', 'create_measurements_bulk',
+}
+
+# 查询中的表名和别名（表名可带分区的挂载名前缀）
+TABLE_ALIAS_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+(?:\w+\.)?(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|GROUP\b|ORDER\b|LIMIT\b|LEFT\b|INNER\b)(\w+))?', re.IGNORECASE)
+
+def endpoint_paths(conn):
+    """根据库中的样例数据生成需要检查的端点请求，空库时使用占位的仪器和时间
+
+    应用中新增的读接口需要在这里添加请求，否则 check_plans 会报告该端点没有被检查。
+    """
+    from app_with_auth import encode_cursor
+
+    sample = conn.execute('''
+        SELECT type_id, instrument_id, MAX(measure_time) FROM measurement
+        WHERE type_id = (SELECT MIN(type_id) FROM measurement)
+        GROUP BY type_id, instrument_id
+        LIMIT 1
+    ''').fetchone()
+    type_id, instrument_id, last_time = sample or (1, 'IP1', '2024-12-31 00:00:00')
+    end_time = last_time
+    start_time = last_time[:4] + '-01-01 00:00:00'
+    cursor = encode_cursor(to_epoch(start_time), 1 << 40)
+
+    paths = ['/api/types', '/api/instruments', '/api/statistics']
+    measurement_params = [
+        {'limit': 100},
+        {'limit': 100, 'offset': 1000},
+        {'type_id': type_id, 'limit': 100},
+        {'instrument_id': instrument_id, 'limit': 100},
+        {'type_id': type_id, 'instrument_id': instrument_id, 'limit': 100},
+        {'instrument_id': instrument_id, 'start_time': start_time, 'end_time': end_time},
+        {'type_id': type_id, 'start_time': start_time, 'end_time': end_time},
+        {'limit': 100, 'cursor': ''},
+        {'limit': 100, 'cursor': cursor},
+        {'type_id': type_id, 'limit': 100, 'cursor': cursor},
+        {'instrument_id': instrument_id, 'limit': 100, 'cursor': cursor},
+        {'type_id': type_id, 'instrument_id': instrument_id, 'limit': 100, 'cursor': cursor},
+    ]
+    paths += ['/api/measurements?' + urlencode(params) for params in measurement_params]
+    for interval in ['day', 'week', 'month', 'year']:
+        summary_params = [
+            {'interval': interval},
+            {'interval': interval, 'type_id': type_id, 'end_time': end_time},
+            {'interval': interval, 'instrument_id': instrument_id, 'end_time': end_time},
+        ]
+        paths += ['/api/measurements/summary?' + urlencode(params) for params in summary_params]
+    
+    export_params = [
+        {'instrument_id': instrument_id},
+        {'type_id': type_id, 'start_time': start_time, 'end_time': end_time, 'format': 'ndjson'},
+        {'instrument_id': instrument_id, 'start_time': start_time, 'end_time': end_time, 'layout': 'wide'},
+    ]
+    paths += ['/api/measurements/export?' + urlencode(params) for params in export_params]
+    
+    # 批量查询：多个仪器的摘要合并为一条SQL，热数据的分页查询合并为一条 UNION ALL 语句
+    other = conn.execute(
+        'SELECT instrument_id FROM instrument WHERE instrument_id != ? LIMIT 1', (instrument_id,)
+    ).fetchone()
+    instrument_ids = [instrument_id] + ([other[0]] if other else [])
+    queries = []
+    for instrument in instrument_ids:
+        queries += [
+            {'kind': 'measurements', 'instrument_id': instrument, 'limit': 20},
+            {'kind': 'summary', 'interval': 'month', 'instrument_id': instrument, 'end_time': end_time},
+        ]
+    paths.append(('/api/batch', {'queries': queries}))
+    return paths
+
+def capture_queries(paths):
+    """通过测试客户端请求各端点，返回 {路径: [执行的SELECT语句]}
+
+    paths 中的 (路径, 请求体) 以POST请求，其余以GET请求。
+    """
+    from app_with_auth import app
+    from auth import JWTManager
+    from storage import db_pool
+
+    token = JWTManager.create_access_token({
+        'username': 'admin', 'role': 'admin', 'email': '', 'name': '查询计划检查'
+    })
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client()
+
+    statements = []
+    db_pool.set_trace_callback(statements.append)
+    captured = {}
+    try:
+        for path in paths:
+            statements.clear()
+            if isinstance(path, tuple):
+                path, body = path
+                response = client.post(path, json=body, headers=headers)
+            else:
+                response = client.get(path, headers=headers)
+            # 流式响应读取完响应体后才执行全部查询
+            response.get_data()
+            if response.status_code != 200:
+                raise SystemExit(f'{path} 返回 {response.status_code}')
+            captured[path] = [
+                sql for sql in statements if sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+            ]
+    finally:
+        db_pool.set_trace_callback(None)
+    return captured
+
+def uncovered_endpoints(paths):
+    """返回应用中需要检查执行计划、但 paths 中没有请求的端点"""
+    from app_with_auth import app
+
+    adapter = app.url_map.bind('localhost')
+    covered = set()
+    for path in paths:
+        method = 'POST' if isinstance(path, tuple) else 'GET'
+        url = path[0] if isinstance(path, tuple) else path
+        covered.add(adapter.match(url.split('?')[0], method=method)[0])
+    return sorted({
+        rule.endpoint for rule in app.url_map.iter_rules()
+        if rule.endpoint not in covered and rule.endpoint not in PLAN_EXEMPT_ENDPOINTS
+        and not rule.endpoint.startswith('auth.')
+    })
+
+def full_scans(sql, plan):
+    """返回执行计划中对大表的全表扫描步骤"""
+    aliases = {}
+    for table, alias in TABLE_ALIAS_PATTERN.findall(sql):
+        aliases[table.lower()] = table.lower()
+        if alias:
+            aliases[alias.lower()] = table.lower()
+    scans = []
+    for detail in plan:
+        match = re.match(r'SCAN (\w+)', detail)
+        if match and ' USING ' not in detail:
+            table = aliases.get(match.group(1).lower(), match.group(1).lower())
+            if table in FACT_TABLES:
+                scans.append(detail)
+    return scans
+
+def check_plans(conn):
+    """输出各端点查询的执行计划，返回问题的描述列表：measurement全表扫描和没有被检查的端点"""
+    paths = endpoint_paths(conn)
+    failures = [f'{endpoint}: 端点没有被检查（在 endpoint_paths 中添加请求）' for endpoint in uncovered_endpoints(paths)]
+    for path, statements in capture_queries(paths).items():
+        print(path)
+        for sql in statements:
+            plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+            scans = full_scans(sql, plan)
+            failures += [f'{path}: {detail}' for detail in scans]
+            print('    ' + ' '.join(sql.split())[:100])
+            for detail in plan:
+                marker = '  !! 全表扫描' if detail in scans else ''
+                print(f'        {detail}{marker}')
+    return failures
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='执行数据库迁移')
+    parser.add_argument('--db', default=StorageConfig.DB_PATH, help='数据库路径')
+    parser.add_argument('--target', type=int, help='只迁移到指定版本')
+    parser.add_argument('--status', action='store_true', help='只查看迁移状态')
+    parser.add_argument('--check-plans', action='store_true',
+                        help='检查API端点查询的执行计划，出现全表扫描时以非0状态退出')
+    parser.add_argument('--rebuild', action='store_true', help='按测量记录重建派生表')
+    parser.add_argument('--check', action='store_true', help='校验派生表，不一致时以非0状态退出')
+    parser.add_argument('--partitions', action='store_true', help='查看已归档的分区')
+    parser.add_argument('--archive-before', type=int, metavar='YEAR',
+                        help='从最早的年份开始，把该年之前已结束的年份按年归档为只读分区')
+    parser.add_argument('--partition-dir', default=StorageConfig.PARTITION_DIR, help='分区文件目录')
+    parser.add_argument('--restore', action='store_true', help='把最新的分区恢复到measurement表')
+    parser.add_argument('--columnar', action='store_true',
+                        help='把SQLite分区转换为按仪器存放、内存映射读取的列式分区')
+    args = parser.parse_args()
+
+    conn = configure_connection(sqlite3.connect(args.db))
+    try:
+        if args.archive_before or args.restore or args.columnar:
+            migrate(conn)
+            try:
+                if args.archive_before:
+                    archived = archive_before(conn, args.archive_before, args.partition_dir)
+                    for year, count in archived:
+                        print(f'归档 {year} 年: {count} 条记录')
+                    if not archived:
+                        print(f'{args.archive_before} 年之前没有需要归档的记录')
+                elif args.restore:
+                    restored = restore_partition(conn)
+                    print(f'恢复 {restored[0]} 年: {restored[1]} 条记录' if restored else '没有已归档的分区')
+                if args.columnar:
+                    compacted = compact_partitions(conn)
+                    for year, count, before, after in compacted:
+                        print(f'转换 {year} 年: {count} 条记录，{before / 1024:.0f} KB -> {after / 1024:.0f} KB')
+                    if not compacted:
+                        print('没有需要转换的SQLite分区')
+            except ValueError as e:
+                raise SystemExit(str(e))
+            return
+
+        if args.partitions:
+            partitions = list_partitions(conn)
+            for partition in partitions:
+                print(f'{partition.year}  {partition.format:<8} {partition.row_count:>10} 条  '
+                      f'{partition_size(partition) / 1024:>8.0f} KB  {partition.path}  归档于 {partition.archived_at}')
+            if not partitions:
+                print('没有已归档的分区')
+            return
+
+        if args.rebuild:
+            migrate(conn)
+            archived = partition_aggregates(conn)
+            conn.execute('BEGIN IMMEDIATE')
+            results = rebuild_derived(conn, archived)
+            conn.commit()
+            for name, (count, seconds) in results.items():
+                print(f'重建 {name}: {count} 行，{seconds:.2f}s')
+            return
+
+        if args.check:
+            failures = 0
+            for name, problems in check_derived(conn, partition_aggregates(conn)).items():
+                print(f'{name}: {"一致" if not problems else f"{len(problems)} 处不一致"}')
+                for problem in problems[:20]:
+                    print(f'    {problem}')
+                failures += len(problems)
+            if failures:
+                sys.exit(1)
+            return
+
+        if args.check_plans:
+            failures = check_plans(conn)
+            if failures:
+                print(f'发现 {len(failures)} 处问题:')
+                for failure in failures:
+                    print(f'    {failure}')
+                sys.exit(1)
+            print('未发现measurement全表扫描，所有读接口都已检查')
+            return
+
+        if not args.status:
+            applied = migrate(conn, args.target)
+            print(f'执行了 {len(applied)} 个迁移，当前版本 {current_version(conn)}')
+        for version, description, applied_at in migration_status(conn):
+            status = f'已执行 {applied_at}' if applied_at else '未执行'
+            print(f'{version:>4}  {description}  {status}')
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
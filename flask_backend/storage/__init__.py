@@ -0,0 +1,126 @@
+"""
+存储模块
+"""
+from .analytics import AnalyticsMirror
+from .catalog import CatalogCache, data_version
+from .config import StorageConfig
+from .derived import (
+    DERIVED_TABLES, aggregate_derived, check_derived, rebuild_derived, restore_triggers, suspend_triggers
+)
+from .downsample import downsample, lttb
+from .epoch import from_epoch, normalize_time, parse_time, to_epoch
+from .export import EXPORT_FORMATS, EXPORT_LAYOUTS, export_chunks, gzip_chunks, iter_records, wide_columns
+from .ingest import IngestQueue
+from .migrations import MIGRATIONS, current_version, migrate, migrate_database, migration_status
+from .partitions import (
+    MeasurementScan, PartitionRouter, archive_before, archive_year, archived_until, compact_partition,
+    compact_partitions, fetch_batch, fetch_ordered, list_partitions, partition_aggregates, partition_size,
+    restore_partition
+)
+from .payloads import COLUMNAR_BINARY, COLUMNAR_JSON, encode_columnar_binary, encode_columnar_json
+from .pool import ConnectionPool
+from .pragmas import configure_connection, connect_readonly, set_journal_mode
+from .responses import MEASUREMENT_SCOPES, ResponseCache
+from .rollups import query_summaries, query_summary
+from .stats import query_statistics
+
+# 数据路由和认证蓝图共用的只读连接池（每个worker进程一个）
+db_pool = ConnectionPool(
+    StorageConfig.DB_PATH,
+    size=StorageConfig.POOL_SIZE,
+    cached_statements=StorageConfig.CACHED_STATEMENTS,
+    health_check_interval=StorageConfig.HEALTH_CHECK_INTERVAL,
+    timeout=StorageConfig.POOL_TIMEOUT,
+    readonly=True,
+    journal_mode=StorageConfig.JOURNAL_MODE
+)
+
+# 所有写入（测量数据和用户管理）经由写入队列的专用连接合并提交
+ingest_queue = IngestQueue(
+    StorageConfig.DB_PATH,
+    max_batch=StorageConfig.INGEST_MAX_BATCH,
+    max_delay=StorageConfig.INGEST_MAX_DELAY_MS / 1000,
+    journal_mode=StorageConfig.JOURNAL_MODE,
+    checkpoint_idle=StorageConfig.CHECKPOINT_IDLE_MS / 1000,
+    checkpoint_max_interval=StorageConfig.CHECKPOINT_MAX_INTERVAL,
+    truncate_pages=StorageConfig.CHECKPOINT_TRUNCATE_PAGES,
+    synchronous=StorageConfig.SYNCHRONOUS
+)
+
+# /api/instruments 使用的仪器目录缓存，按 data_version 中 catalog 的版本号失效
+instrument_catalog = CatalogCache()
+
+# 读接口的分区路由，在连接池的只读连接上按需挂载归档分区
+partition_router = PartitionRouter(readonly=True)
+
+# 读接口的响应缓存，按 data_version 中相关范围的版本号失效
+response_cache = ResponseCache(
+    max_entries=StorageConfig.RESPONSE_CACHE_SIZE,
+    max_entry_bytes=StorageConfig.RESPONSE_CACHE_MAX_ENTRY_KB * 1024
+)
+
+# 配置为duckdb时，统计和摘要的聚合在进程内的分析镜像上执行；默认为None，使用汇总表和计数器
+analytics_mirror = AnalyticsMirror() if StorageConfig.ANALYTICS_ENGINE == 'duckdb' else None
+
+__all__ = [
+    'StorageConfig',
+    'AnalyticsMirror',
+    'CatalogCache',
+    'data_version',
+    'IngestQueue',
+    'ConnectionPool',
+    'DERIVED_TABLES',
+    'aggregate_derived',
+    'check_derived',
+    'rebuild_derived',
+    'restore_triggers',
+    'suspend_triggers',
+    'downsample',
+    'lttb',
+    'from_epoch',
+    'normalize_time',
+    'parse_time',
+    'to_epoch',
+    'EXPORT_FORMATS',
+    'EXPORT_LAYOUTS',
+    'export_chunks',
+    'gzip_chunks',
+    'iter_records',
+    'wide_columns',
+    'MIGRATIONS',
+    'current_version',
+    'migrate',
+    'migrate_database',
+    'migration_status',
+    'MeasurementScan',
+    'PartitionRouter',
+    'archive_before',
+    'archive_year',
+    'archived_until',
+    'compact_partition',
+    'compact_partitions',
+    'fetch_batch',
+    'fetch_ordered',
+    'list_partitions',
+    'partition_aggregates',
+    'partition_size',
+    'restore_partition',
+    'COLUMNAR_BINARY',
+    'COLUMNAR_JSON',
+    'encode_columnar_binary',
+    'encode_columnar_json',
+    'MEASUREMENT_SCOPES',
+    'ResponseCache',
+    'configure_connection',
+    'connect_readonly',
+    'set_journal_mode',
+    'query_summaries',
+    'query_summary',
+    'query_statistics',
+    'db_pool',
+    'ingest_queue',
+    'instrument_catalog',
+    'partition_router',
+    'response_cache',
+    'analytics_mirror'
+]
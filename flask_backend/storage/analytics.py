@@ -0,0 +1,211 @@
+"""
+分析镜像模块 - 在嵌入式列式引擎 DuckDB 中保存测量记录的分析列，执行统计和摘要的聚合查询
+
+DB_ANALYTICS_ENGINE=duckdb 时 /api/statistics 和 /api/measurements/summary 的聚合在镜像上执行
+（需要安装duckdb），事务性的读写仍然只在SQLite上。镜像在每个worker进程的内存中，只保存聚合用到的
+id、type_id、instrument_id、measure_ts、value 列，第一次查询时从主数据库和全部归档分区加载。
+
+之后每次查询先读 data_version 中 measurement、partition 的版本号和 measurement 的最大id（都是主键查找）：
+记录被修改或删除、全量导入、分区变化时版本号变化，重新加载镜像；只有新写入的记录时按id水位线追加。
+"""
+import sqlite3
+import threading
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+from .catalog import data_version
+from .columnar import ColumnarPartition
+from .epoch import from_epoch, parse_time, to_epoch
+from .partitions import list_partitions
+from .rollups import INTERVAL_FORMATS
+
+# 镜像表的列，与 measurement 表同名
+MIRROR_COLUMNS = ['id', 'type_id', 'instrument_id', 'measure_ts', 'value']
+
+MIRROR_TABLE = '''
+    CREATE TABLE measurement (id BIGINT, type_id INTEGER, instrument_id VARCHAR, measure_ts BIGINT, value DOUBLE)
+'''
+
+MIRROR_SELECT = '''
+    SELECT CAST(id AS BIGINT) AS id, CAST(type_id AS INTEGER) AS type_id,
+           CAST(instrument_id AS VARCHAR) AS instrument_id, CAST(measure_ts AS BIGINT) AS measure_ts,
+           CAST(value AS DOUBLE) AS value
+    FROM frame
+'''
+
+# 按id水位线读取新写入的记录
+APPEND_SQL = f'SELECT {", ".join(MIRROR_COLUMNS)} FROM measurement WHERE id > ?'
+
+STATISTICS_SQL = '''
+    SELECT type_id, COUNT(*), AVG(value), MIN(measure_ts), MAX(measure_ts)
+    FROM measurement
+    GROUP BY type_id
+    ORDER BY type_id
+'''
+
+TOTALS_SQL = '''
+    SELECT COUNT(*), MIN(measure_ts), MAX(measure_ts), COUNT(DISTINCT instrument_id)
+    FROM measurement
+'''
+
+# 时间段格式与汇总表一致（DuckDB 的 strftime 与 SQLite 的 %W 周编号规则相同）
+SUMMARY_SQL = '''
+    SELECT IFNULL(strftime(make_timestamp(measure_ts * 1000000), ?), '') AS period,
+           COUNT(*) AS count, AVG(value) AS avg_value, MIN(value) AS min_value, MAX(value) AS max_value
+    FROM measurement
+    WHERE TRUE {filters}
+    GROUP BY period
+    ORDER BY period DESC
+    LIMIT ?
+'''
+
+def partition_frame(partition):
+    """读取归档分区中镜像用到的列，返回 DataFrame"""
+    if partition.format == 'columnar':
+        pieces = []
+        for series in ColumnarPartition(partition.path).select():
+            pieces.append(pd.DataFrame({
+                'id': series.ids(),
+                'type_id': np.full(series.rows, series.type_id),
+                'instrument_id': np.full(series.rows, series.instrument_id, dtype=object),
+                'measure_ts': series.times(),
+                'value': series.floats('value'),
+            }))
+        return pd.concat(pieces, ignore_index=True) if pieces else pd.DataFrame(columns=MIRROR_COLUMNS)
+    conn = sqlite3.connect('file:' + quote(partition.path) + '?mode=ro&immutable=1', uri=True)
+    try:
+        return pd.DataFrame.from_records(
+            conn.execute(f'SELECT {", ".join(MIRROR_COLUMNS)} FROM measurement').fetchall(),
+            columns=MIRROR_COLUMNS
+        )
+    finally:
+        conn.close()
+
+
+class AnalyticsMirror:
+    """进程内的 DuckDB 分析镜像
+
+    查询前调用 sync() 与SQLite对齐：版本号没变且没有新记录时只做三次主键查找；
+    重新加载和追加在锁内、在SQLite的一个读事务中完成，读到的是同一个快照。
+    查询各自使用一个 DuckDB 游标，重新加载时用 CREATE OR REPLACE 原子替换镜像表。
+    """
+
+    def __init__(self):
+        try:
+            import duckdb
+        except ImportError:
+            raise RuntimeError('DB_ANALYTICS_ENGINE=duckdb 需要先安装duckdb（pip install duckdb）')
+        self._duck = duckdb.connect(':memory:')
+        self._duck.execute(MIRROR_TABLE)
+        self._lock = threading.Lock()
+        self._state = None
+        self._watermark = 0
+        self._stats = {'queries': 0, 'reloads': 0, 'appends': 0, 'appended_rows': 0, 'rows': 0}
+
+    def sync(self, conn):
+        """按版本号和id水位线让镜像与SQLite一致"""
+        if self._current(conn) == (self._state, self._watermark):
+            return
+        with self._lock:
+            conn.execute('BEGIN')
+            try:
+                state, watermark = self._current(conn)
+                if state == self._state and watermark == self._watermark:
+                    return
+                if state != self._state:
+                    self._reload(conn)
+                    self._stats['reloads'] += 1
+                else:
+                    frame = pd.DataFrame.from_records(
+                        conn.execute(APPEND_SQL, (self._watermark,)).fetchall(), columns=MIRROR_COLUMNS
+                    )
+                    self._duck.register('frame', frame)
+                    self._duck.execute(f'INSERT INTO measurement {MIRROR_SELECT}')
+                    self._duck.unregister('frame')
+                    self._stats['appends'] += 1
+                    self._stats['appended_rows'] += len(frame)
+                    self._stats['rows'] += len(frame)
+                self._state, self._watermark = state, watermark
+            finally:
+                conn.execute('COMMIT')
+
+    def _current(self, conn):
+        state = (data_version(conn, 'measurement'), data_version(conn, 'partition'))
+        return state, conn.execute('SELECT IFNULL(MAX(id), 0) FROM measurement').fetchone()[0]
+
+    def _reload(self, conn):
+        frames = [
+            pd.DataFrame.from_records(
+                conn.execute(f'SELECT {", ".join(MIRROR_COLUMNS)} FROM measurement').fetchall(),
+                columns=MIRROR_COLUMNS
+            )
+        ]
+        frames += [partition_frame(partition) for partition in list_partitions(conn)]
+        frame = pd.concat([f for f in frames if len(f)] or frames[:1], ignore_index=True)
+        self._duck.register('frame', frame)
+        self._duck.execute(f'CREATE OR REPLACE TABLE measurement AS {MIRROR_SELECT}')
+        self._duck.unregister('frame')
+        self._stats['rows'] = len(frame)
+
+    def query(self, sql, params=()):
+        """在镜像上执行只读查询并返回全部结果行（调用前先 sync）"""
+        cursor = self._duck.cursor()
+        try:
+            return cursor.execute(sql, params).fetchall()
+        finally:
+            cursor.close()
+            with self._lock:
+                self._stats['queries'] += 1
+
+    def statistics(self, conn):
+        """与 query_statistics 返回相同结构的总体统计（首末时间由 measure_ts 格式化）"""
+        self.sync(conn)
+        names = dict(conn.execute('SELECT id, name FROM monitoring_type').fetchall())
+        type_stats = [
+            {
+                'name': names[type_id], 'count': count, 'avg_value': avg_value,
+                'first_time': from_epoch(first_ts), 'last_time': from_epoch(last_ts)
+            }
+            for type_id, count, avg_value, first_ts, last_ts in self.query(STATISTICS_SQL)
+            if type_id in names
+        ]
+        total, first_ts, last_ts, instrument_count = self.query(TOTALS_SQL)[0]
+        return {
+            'total_measurements': total,
+            'type_statistics': type_stats,
+            'time_range': (
+                from_epoch(first_ts) if first_ts is not None else None,
+                from_epoch(last_ts) if last_ts is not None else None
+            ),
+            'instrument_count': instrument_count
+        }
+
+    def summary(self, conn, interval, type_id=None, instrument_id=None, end_time=None, limit=12):
+        """与 query_summary 返回相同的 (period, count, avg_value, min_value, max_value)，按时间段倒序
+
+        end_time 无效时抛出 ValueError；measure_ts <= end_time 的记录正好是汇总表中早于
+        end_time 所在时间段的完整时间段，加上该时间段中截止到 end_time 的部分。
+        """
+        if interval not in INTERVAL_FORMATS:
+            interval = 'year'
+        filters = ''
+        params = [INTERVAL_FORMATS[interval]]
+        if type_id:
+            filters += ' AND type_id = ?'
+            params.append(type_id)
+        if instrument_id:
+            filters += ' AND instrument_id = ?'
+            params.append(instrument_id)
+        if end_time:
+            filters += ' AND measure_ts <= ?'
+            params.append(to_epoch(parse_time(end_time)))
+        self.sync(conn)
+        # 与SQLite一样，limit 为负数时不限制行数（DuckDB 的 LIMIT 不接受负数，LIMIT NULL 表示不限制）
+        params.append(limit if limit >= 0 else None)
+        columns = ('period', 'count', 'avg_value', 'min_value', 'max_value')
+        return [dict(zip(columns, row)) for row in self.query(SUMMARY_SQL.format(filters=filters), params)]
+
+    def metrics(self):
+        """返回镜像指标"""
+        with self._lock:
+            return dict(self._stats, engine='duckdb', version=self._state, watermark=self._watermark)
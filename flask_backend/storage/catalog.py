@@ -0,0 +1,123 @@
+"""
+仪器目录模块 - instrument 表按 (仪器, 监测类型) 保存台账信息、首末观测时间和记录数
+
+记录数和首末时间由 measurement 上的触发器增量维护（见迁移5），台账信息由数据导入从仪器信息.xlsx写入。
+instrument 表每次变化时递增 data_version 中 catalog 的版本号，进程内的目录缓存按版本号失效。
+"""
+import itertools
+import threading
+from .rollups import merge_totals
+
+# 从测量记录直接计算目录的统计列
+AGGREGATE_SQL = '''
+    SELECT instrument_id, type_id, COUNT(*), MIN(measure_time), MAX(measure_time)
+    FROM {table}
+    GROUP BY type_id, instrument_id
+'''
+
+# 把归档分区的统计累加到目录
+MERGE_SQL = '''
+    INSERT INTO instrument (instrument_id, type_id, row_count, first_time, last_time) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (instrument_id, type_id) DO UPDATE SET
+        row_count = row_count + excluded.row_count,
+        first_time = CASE WHEN first_time IS NULL OR excluded.first_time < first_time
+                          THEN excluded.first_time ELSE first_time END,
+        last_time = CASE WHEN last_time IS NULL OR excluded.last_time > last_time
+                         THEN excluded.last_time ELSE last_time END
+'''
+
+CATALOG_QUERY = '''
+    SELECT i.instrument_id, i.type_id, t.name AS type_name, i.location, i.position, i.elevation,
+           i.installed_at, i.first_time, i.last_time, i.row_count
+    FROM instrument i
+    LEFT JOIN monitoring_type t ON t.id = i.type_id
+    WHERE i.row_count > 0
+    ORDER BY i.instrument_id, i.type_id
+'''
+
+def data_version(conn, scope):
+    """返回指定范围的数据版本号，范围不存在时为0"""
+    row = conn.execute('SELECT version FROM data_version WHERE scope = ?', (scope,)).fetchone()
+    return row[0] if row else 0
+
+def aggregate_catalog(conn, table='measurement'):
+    """按指定的测量记录表计算目录的统计列"""
+    return conn.execute(AGGREGATE_SQL.format(table=table)).fetchall()
+
+def rebuild_catalog(conn, archived=()):
+    """按测量记录重新计算目录的记录数和首末时间，保留台账信息，返回有记录的仪器数
+
+    archived 为归档分区的统计（aggregate_catalog 的结果），累加到 measurement 表的结果上。
+    """
+    conn.execute('''
+        UPDATE instrument SET row_count = 0, first_time = NULL, last_time = NULL
+        WHERE row_count != 0 OR first_time IS NOT NULL
+    ''')
+    conn.execute(f'''
+        INSERT INTO instrument (instrument_id, type_id, row_count, first_time, last_time)
+        SELECT * FROM ({AGGREGATE_SQL.format(table='measurement')}) WHERE 1
+        ON CONFLICT (instrument_id, type_id) DO UPDATE SET
+            row_count = excluded.row_count,
+            first_time = excluded.first_time,
+            last_time = excluded.last_time
+    ''')
+    conn.executemany(MERGE_SQL, archived)
+    return conn.execute('SELECT COUNT(*) FROM instrument WHERE row_count > 0').fetchone()[0]
+
+def check_catalog(conn, archived=()):
+    """对比目录和按测量记录（及归档分区的统计）重新计算的结果，返回不一致的描述列表"""
+    expected = {}
+    for row in itertools.chain(aggregate_catalog(conn), archived):
+        merge_totals(expected, tuple(row[:2]), tuple(row[2:]))
+    actual = {
+        tuple(row[:2]): tuple(row[2:])
+        for row in conn.execute('''
+            SELECT instrument_id, type_id, row_count, first_time, last_time FROM instrument
+            WHERE row_count != 0 OR first_time IS NOT NULL OR last_time IS NOT NULL
+        ''')
+    }
+    problems = []
+    for key in sorted(expected.keys() - actual.keys()):
+        problems.append(f'缺少仪器 {key}')
+    for key in sorted(actual.keys() - expected.keys()):
+        problems.append(f'多余的仪器统计 {key}: {actual[key]}')
+    for key in sorted(expected.keys() & actual.keys()):
+        if expected[key] != actual[key]:
+            problems.append(f'仪器 {key} 不一致: 应为 {expected[key]}，实际 {actual[key]}')
+    return problems
+
+
+class CatalogCache:
+    """进程内的仪器目录缓存
+
+    每次读取只查询一次 data_version（主键查找），版本号变化时才重新加载目录，
+    写入队列、数据导入和其他worker进程的修改都通过版本号感知。
+    """
+
+    def __init__(self, scope='catalog'):
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._version = None
+        self._instruments = None
+        self._stats = {'hits': 0, 'reloads': 0}
+
+    def get(self, conn):
+        """返回目录（字典列表），调用方不应修改返回的列表"""
+        version = data_version(conn, self.scope)
+        with self._lock:
+            if self._instruments is not None and version == self._version:
+                self._stats['hits'] += 1
+                return self._instruments
+        cursor = conn.execute(CATALOG_QUERY)
+        columns = [column[0] for column in cursor.description]
+        instruments = [dict(zip(columns, row)) for row in cursor]
+        with self._lock:
+            self._version = version
+            self._instruments = instruments
+            self._stats['reloads'] += 1
+        return instruments
+
+    def metrics(self):
+        """返回缓存指标"""
+        with self._lock:
+            return dict(self._stats, version=self._version, size=len(self._instruments or []))
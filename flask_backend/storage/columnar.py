@@ -0,0 +1,460 @@
+"""
+列式冷存储模块 - 已归档的年份按 (监测类型, 仪器) 保存为列式文件，读取时内存映射
+
+SQLite分区（见 partitions.py）可以转换为列式分区：每个年份一个目录 measurement_<年份>.col，
+目录中 manifest.json 登记各序列的文件名、行数和时间范围，每个 (监测类型, 仪器) 一个 .col 文件。
+文件中的各列按时间升序保存，按8字节对齐，读取时用 mmap 映射后直接作为numpy数组使用，不需要整体解压：
+- 时间：首个时间 + 相邻时间差除以公约数（日数据为86400）后按能容纳的最小无符号整数类型保存
+- 值、水位：float32（按最短十进制表示读回后与原值完全一致时），否则float64；NULL保存为NaN，整列为NULL时不保存
+- id：首个id + 相邻差值，按能容纳的最小有符号整数类型保存
+- created_at、updated_at：字典编码，保存不同取值的列表和下标
+"""
+import heapq
+import json
+import mmap
+import os
+import numpy as np
+
+MAGIC = b'MCOL\x01\x00\x00\x00'
+
+# 列式分区目录中登记各序列的文件
+MANIFEST = 'manifest.json'
+
+# 按时间升序逐条读取时，每个序列每次还原的最少行数
+MIN_CHUNK_ROWS = 64
+
+# 还原为行时的列顺序，与 partitions.PARTITION_COLUMNS 一致
+ROW_COLUMNS = ('id', 'type_id', 'instrument_id', 'measure_time', 'value', 'water_level',
+               'created_at', 'updated_at', 'measure_ts')
+
+UNSIGNED_TYPES = (np.uint8, np.uint16, np.uint32, np.uint64)
+SIGNED_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+def narrow(values, dtypes):
+    """转换为能容纳全部取值的最小整数类型"""
+    for dtype in dtypes:
+        info = np.iinfo(dtype)
+        if not len(values) or (values.min() >= info.min and values.max() <= info.max):
+            return values.astype(dtype)
+    raise ValueError('整数超出范围')
+
+def encode_times(times):
+    """时间差编码，返回 (元数据, 数组)"""
+    deltas = np.diff(times)
+    step = int(np.gcd.reduce(deltas)) if len(deltas) else 0
+    step = step or 1
+    return {'base': int(times[0]), 'step': step}, narrow(deltas // step, UNSIGNED_TYPES)
+
+def decode_times(meta, deltas):
+    """还原时间差编码的整数时间（UTC秒）"""
+    times = np.empty(len(deltas) + 1, dtype=np.int64)
+    times[0] = 0
+    np.cumsum(deltas, dtype=np.int64, out=times[1:])
+    times *= meta['step']
+    times += meta['base']
+    return times
+
+def encode_ids(ids):
+    """id差值编码，返回 (元数据, 数组)"""
+    return {'base': int(ids[0])}, narrow(np.diff(ids), SIGNED_TYPES)
+
+def decode_ids(meta, deltas):
+    """还原差值编码的id"""
+    return decode_times({'base': meta['base'], 'step': 1}, deltas)
+
+def encode_floats(values):
+    """浮点列编码，返回 (元数据, 数组)；整列为NULL时返回 (None, None)"""
+    array = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if np.isnan(array).all():
+        return None, None
+    single = array.astype(np.float32)
+    if np.array_equal(widen(single), array, equal_nan=True):
+        return {}, single
+    return {}, array
+
+def widen(values):
+    """把float32还原为能读回该float32的最短十进制数对应的float64，float64原样返回
+
+    按有效数字位数从1到9依次尝试四舍五入（整数除以10的幂，结果是该十进制数最接近的float64），
+    与 str(numpy.float32) 的最短表示一致；写入时核对还原结果，不一致的序列保存为float64。
+    """
+    singles = np.asarray(values)
+    if singles.dtype != np.float32:
+        return singles.astype(np.float64)
+    doubles = singles.astype(np.float64)
+    result = doubles.copy()
+    pending = np.flatnonzero(np.isfinite(doubles) & (doubles != 0))
+    magnitude = np.floor(np.log10(np.abs(doubles[pending]))).astype(np.int64)
+    for digits in range(1, 10):
+        if not len(pending):
+            break
+        exponent = digits - 1 - magnitude
+        scale = 10.0 ** np.abs(exponent)
+        candidate = np.where(
+            exponent >= 0,
+            np.round(doubles[pending] * scale) / scale,
+            np.round(doubles[pending] / scale) * scale
+        )
+        matched = candidate.astype(np.float32) == singles[pending]
+        result[pending[matched]] = candidate[matched]
+        pending, magnitude = pending[~matched], magnitude[~matched]
+    if len(pending):
+        result[pending] = singles[pending].astype(str).astype(np.float64)
+    return result
+
+def format_times(times):
+    """把整数时间（UTC秒）数组格式化为 measure_time 格式的字符串列表"""
+    return [
+        text.replace('T', ' ')
+        for text in np.datetime_as_string(times.astype('datetime64[s]'), unit='s').tolist()
+    ]
+
+def encode_strings(values):
+    """字典编码，返回 (元数据, 下标数组)"""
+    codes = {}
+    indexes = [codes.setdefault(value, len(codes)) for value in values]
+    return {'values': list(codes)}, narrow(np.array(indexes, dtype=np.int64), UNSIGNED_TYPES)
+
+def sort_values(candidates):
+    """返回 [(序列, 行下标)] 依次拼接后的值，用于排序（float64，NULL为-inf）
+
+    还原保持float32的大小顺序，各序列都是float32时直接比较编码值；
+    混有float64的序列时先还原，避免不同精度下的相同取值顺序错乱。
+    """
+    pieces = []
+    size = 0
+    for series, rows in candidates:
+        pieces.append((series, np.arange(size, size + len(rows)), rows))
+        size += len(rows)
+    dtypes = {series.raw('value').dtype for series, _ in candidates if series.raw('value') is not None}
+    if len(dtypes) > 1:
+        values = gather_floats(pieces, 'value', size)
+    else:
+        values = np.full(size, np.nan)
+        for series, positions, rows in pieces:
+            column = series.raw('value')
+            if column is not None:
+                values[positions] = column[rows]
+    values[np.isnan(values)] = -np.inf
+    return values
+
+def gather_floats(pieces, name, size):
+    """把 [(序列, 输出位置, 行下标)] 的浮点列还原到长度为size的数组（NULL为NaN），同一精度的各段合并后一次还原"""
+    result = np.full(size, np.nan)
+    groups = {}
+    for series, positions, rows in pieces:
+        column = series.raw(name)
+        if column is not None:
+            groups.setdefault(column.dtype, []).append((positions, column[rows]))
+    for group in groups.values():
+        result[np.concatenate([positions for positions, _ in group])] = widen(
+            np.concatenate([values for _, values in group]))
+    return result
+
+def gather_strings(pieces, name, size):
+    """把 [(序列, 输出位置, 行下标)] 的字典编码列还原为长度为size的列表"""
+    result = [None] * size
+    for series, positions, rows in pieces:
+        for position, value in zip(positions.tolist(), series.strings(name, rows)):
+            result[position] = value
+    return result
+
+def float_list(values):
+    """把浮点数组转换为列表，NaN转换为None"""
+    return [None if v != v else v for v in values.tolist()]
+
+def write_series(path, type_id, instrument_id, rows):
+    """把一个序列的记录（ROW_COLUMNS顺序的元组，按时间升序）写入列式文件，返回清单条目"""
+    columns = list(zip(*rows))
+    times = np.array(columns[8], dtype=np.int64)
+    encoded = {
+        'measure_ts': encode_times(times),
+        'id': encode_ids(np.array(columns[0], dtype=np.int64)),
+        'value': encode_floats(columns[4]),
+        'water_level': encode_floats(columns[5]),
+        'created_at': encode_strings(columns[6]),
+        'updated_at': encode_strings(columns[7]),
+    }
+    blocks = []
+    header = {'type_id': type_id, 'instrument_id': instrument_id, 'rows': len(rows), 'columns': {}}
+    offset = 0
+    for name, (meta, array) in encoded.items():
+        if array is None:
+            header['columns'][name] = None
+            continue
+        data = array.tobytes()
+        header['columns'][name] = dict(meta, dtype=array.dtype.str, offset=offset, count=len(array))
+        blocks.append(data + b'\0' * (-len(data) % 8))
+        offset += len(blocks[-1])
+    encoded_header = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    encoded_header += b' ' * (-(len(MAGIC) + 8 + len(encoded_header)) % 8)
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(encoded_header)).tobytes())
+        f.write(encoded_header)
+        for block in blocks:
+            f.write(block)
+    return {
+        'file': os.path.basename(path),
+        'type_id': type_id,
+        'instrument_id': instrument_id,
+        'rows': len(rows),
+        'start_ts': int(times[0]),
+        'end_ts': int(times[-1]),
+    }
+
+def write_partition(directory, rows):
+    """把按 (type_id, instrument_id, measure_ts) 排序的记录写成列式分区目录，返回总行数"""
+    os.makedirs(directory, exist_ok=True)
+    entries = []
+    series = []
+    key = None
+    for row in rows:
+        if (row[1], row[2]) != key:
+            if series:
+                entries.append(write_series(series_path(directory, len(entries)), *key, series))
+            key, series = (row[1], row[2]), []
+        series.append(tuple(row))
+    if series:
+        entries.append(write_series(series_path(directory, len(entries)), *key, series))
+    with open(os.path.join(directory, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump({'series': entries}, f, ensure_ascii=False)
+    return sum(entry['rows'] for entry in entries)
+
+def series_path(directory, number):
+    # 仪器编号可能包含中文或特殊字符，文件名只用序号，对应关系见清单
+    return os.path.join(directory, f'{number:05d}.col')
+
+def directory_size(directory):
+    """返回目录中文件的总字节数"""
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+class ColumnarSeries:
+    """一个 (监测类型, 仪器) 序列的列式文件，各列按需从内存映射中读取"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = np.frombuffer(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), dtype=np.uint8)
+        if bytes(self._map[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'不是列式文件: {path}')
+        length = int(self._map[len(MAGIC):len(MAGIC) + 8].view(np.uint64)[0])
+        start = len(MAGIC) + 8
+        header = json.loads(bytes(self._map[start:start + length]).decode('utf-8'))
+        self._data = start + length
+        self.type_id = header['type_id']
+        self.instrument_id = header['instrument_id']
+        self.rows = header['rows']
+        self._columns = header['columns']
+        self._times = None
+        self._ids = None
+
+    def raw(self, name):
+        """返回列的编码数组（内存映射的视图，不复制）；整列为NULL时返回None"""
+        meta = self._columns[name]
+        if meta is None:
+            return None
+        dtype = np.dtype(meta['dtype'])
+        start = self._data + meta['offset']
+        return self._map[start:start + dtype.itemsize * meta['count']].view(dtype)
+
+    def times(self):
+        """返回整数时间列（首次调用时解码后保存，序列文件只读）"""
+        if self._times is None:
+            self._times = decode_times(self._columns['measure_ts'], self.raw('measure_ts'))
+        return self._times
+
+    def ids(self):
+        if self._ids is None:
+            self._ids = decode_ids(self._columns['id'], self.raw('id'))
+        return self._ids
+
+    def floats(self, name, rows=None):
+        """返回浮点列（float64，NULL为NaN），rows 为行下标时只还原这些行"""
+        values = self.raw(name)
+        if values is None:
+            return np.full(self.rows if rows is None else len(rows), np.nan)
+        return widen(values if rows is None else values[rows])
+
+    def strings(self, name, rows):
+        values = self._columns[name]['values']
+        return [values[i] for i in self.raw(name)[rows].tolist()]
+
+    def records(self, rows, types, times=None, ids=None):
+        """按行下标还原记录字典（与 GET /api/measurements 的列一致，另含 measure_ts）"""
+        times = (self.times() if times is None else times)[rows]
+        type_name, unit = types.get(self.type_id, (None, None))
+        columns = zip(
+            (self.ids() if ids is None else ids)[rows].tolist(),
+            format_times(times),
+            float_list(self.floats('value', rows)),
+            float_list(self.floats('water_level', rows)),
+            self.strings('created_at', rows),
+            self.strings('updated_at', rows),
+            times.tolist()
+        )
+        return [
+            {
+                'id': measurement_id, 'type_id': self.type_id, 'instrument_id': self.instrument_id,
+                'measure_time': measure_time, 'value': value, 'water_level': water_level,
+                'created_at': created_at, 'updated_at': updated_at, 'type_name': type_name, 'unit': unit,
+                'measure_ts': measure_ts
+            }
+            for measurement_id, measure_time, value, water_level, created_at, updated_at, measure_ts in columns
+        ]
+
+    def iter_records(self, types, start_ts=None, end_ts=None, chunk_size=MIN_CHUNK_ROWS):
+        """按时间升序逐条返回时间范围内的记录字典，每次还原 chunk_size 行"""
+        times = self.times()
+        low = 0 if start_ts is None else int(np.searchsorted(times, start_ts, 'left'))
+        high = len(times) if end_ts is None else int(np.searchsorted(times, end_ts, 'right'))
+        for start in range(low, high, chunk_size):
+            yield from self.records(np.arange(start, min(start + chunk_size, high)), types)
+
+    def iter_rows(self):
+        """按 ROW_COLUMNS 顺序逐行返回全部记录"""
+        rows = np.arange(self.rows)
+        for record in self.records(rows, {}):
+            yield tuple(record[name] for name in ROW_COLUMNS)
+
+
+class ColumnarPartition:
+    """一个年份的列式分区，按清单筛选序列，序列文件在首次读取时映射"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            self._entries = json.load(f)['series']
+        self._series = {}
+
+    def select(self, type_id=None, instrument_id=None, start_ts=None, end_ts=None):
+        """返回与过滤条件相交的序列"""
+        selected = []
+        for entry in self._entries:
+            if type_id and entry['type_id'] != type_id:
+                continue
+            if instrument_id and entry['instrument_id'] != instrument_id:
+                continue
+            if start_ts is not None and entry['end_ts'] < start_ts:
+                continue
+            if end_ts is not None and entry['start_ts'] > end_ts:
+                continue
+            if entry['file'] not in self._series:
+                self._series[entry['file']] = ColumnarSeries(os.path.join(self.directory, entry['file']))
+            selected.append(self._series[entry['file']])
+        return selected
+
+    def fetch(self, conn, scan, limit, offset=0):
+        """按 MeasurementScan 过滤并按时间倒序取 [offset, offset+limit) 的记录，返回 (记录列表, 匹配行数)
+
+        排序与SQLite按索引读取时一致：游标分页按 (measure_ts, id) 倒序，
+        否则按 (measure_ts, value, id) 倒序（NULL值排在同一时间的最后）。limit 为负数时不限制行数。
+        """
+        candidates = []
+        for series in self.select(scan.type_id, scan.instrument_id, scan.start_ts, scan.end_ts):
+            times, ids = series.times(), series.ids()
+            low = 0 if scan.start_ts is None else np.searchsorted(times, scan.start_ts, 'left')
+            high = len(times) if scan.end_ts is None else np.searchsorted(times, scan.end_ts, 'right')
+            rows = np.arange(low, high)
+            if scan.cursor:
+                cursor_ts, cursor_id = scan.cursor
+                rows = rows[(times[rows] < cursor_ts) | ((times[rows] == cursor_ts) & (ids[rows] < cursor_id))]
+            if len(rows):
+                candidates.append((series, rows, times, ids))
+        matched = sum(len(rows) for _, rows, _, _ in candidates)
+        if not candidates or limit == 0 or offset >= matched:
+            return [], matched
+
+        numbers = np.concatenate([np.full(len(rows), n) for n, (_, rows, _, _) in enumerate(candidates)])
+        rows = np.concatenate([rows for _, rows, _, _ in candidates])
+        times = np.concatenate([times[rows] for _, rows, times, _ in candidates])
+        ids = np.concatenate([ids[rows] for _, rows, _, ids in candidates])
+        if scan.keyset:
+            order = np.lexsort((ids, times))[::-1]
+        else:
+            values = sort_values([(series, rows) for series, rows, _, _ in candidates])
+            order = np.lexsort((ids, values, times))[::-1]
+        order = order[offset:] if limit < 0 else order[offset:offset + limit]
+
+        # 按序列分组后整列还原，避免对每个序列的少量行分别调用numpy
+        chosen = numbers[order]
+        grouped = np.argsort(chosen, kind='stable')
+        bounds = np.searchsorted(chosen[grouped], np.arange(len(candidates) + 1))
+        selected = rows[order]
+        pieces = [
+            (candidates[number][0], grouped[bounds[number]:bounds[number + 1]])
+            for number in range(len(candidates))
+            if bounds[number] < bounds[number + 1]
+        ]
+        pieces = [(series, positions, selected[positions]) for series, positions in pieces]
+        owners = [None] * len(order)
+        for series, positions, _ in pieces:
+            for position in positions.tolist():
+                owners[position] = series
+
+        types = {
+            row[0]: (row[1], row[2])
+            for row in conn.execute('SELECT id, name, unit FROM monitoring_type')
+        }
+        times = times[order]
+        columns = zip(
+            owners,
+            ids[order].tolist(),
+            format_times(times),
+            float_list(gather_floats(pieces, 'value', len(order))),
+            float_list(gather_floats(pieces, 'water_level', len(order))),
+            gather_strings(pieces, 'created_at', len(order)),
+            gather_strings(pieces, 'updated_at', len(order)),
+            times.tolist()
+        )
+        records = [
+            {
+                'id': measurement_id, 'type_id': series.type_id, 'instrument_id': series.instrument_id,
+                'measure_time': measure_time, 'value': value, 'water_level': water_level,
+                'created_at': created_at, 'updated_at': updated_at,
+                'type_name': types.get(series.type_id, (None, None))[0],
+                'unit': types.get(series.type_id, (None, None))[1],
+                'measure_ts': measure_ts
+            }
+            for series, measurement_id, measure_time, value, water_level, created_at, updated_at, measure_ts
+            in columns
+        ]
+        return records, matched
+
+    def values_between(self, start_ts, end_ts, type_id=None, instrument_id=None):
+        """返回时间范围内记录的值（NULL为None），顺序与SQLite按 (measure_ts, value) 索引读取时一致"""
+        pieces, times, ids = [], [], []
+        size = 0
+        for series in self.select(type_id, instrument_id, start_ts, end_ts):
+            series_times = series.times()
+            low = np.searchsorted(series_times, start_ts, 'left')
+            high = np.searchsorted(series_times, end_ts, 'right')
+            if low == high:
+                continue
+            pieces.append((series, np.arange(size, size + high - low), np.arange(low, high)))
+            times.append(series_times[low:high])
+            ids.append(series.ids()[low:high])
+            size += high - low
+        if not pieces:
+            return []
+        values = gather_floats(pieces, 'value', size)
+        keys = np.where(np.isnan(values), -np.inf, values)
+        order = np.lexsort((np.concatenate(ids), keys, np.concatenate(times)))
+        return float_list(values[order])
+
+    def iter_records(self, scan, types, chunk_size):
+        """按 MeasurementScan 过滤，按 (measure_ts, id) 升序逐条返回记录字典
+
+        序列内的时间唯一且升序，各序列分块还原后按时间合并；chunk_size 按序列数均分，
+        同时在内存中的记录数与时间范围无关。
+        """
+        selected = self.select(scan.type_id, scan.instrument_id, scan.start_ts, scan.end_ts)
+        size = max(MIN_CHUNK_ROWS, chunk_size // max(len(selected), 1))
+        streams = [series.iter_records(types, scan.start_ts, scan.end_ts, size) for series in selected]
+        return heapq.merge(*streams, key=lambda record: (record['measure_ts'], record['id']))
+
+    def iter_rows(self):
+        """按 ROW_COLUMNS 顺序逐行返回分区中的全部记录"""
+        for series in self.select():
+            yield from series.iter_rows()
@@ -0,0 +1,64 @@
+"""
+存储模块配置
+"""
+import os
+
+
+class StorageConfig:
+    """存储配置类"""
+    
+    # 数据库路径
+    DB_PATH = os.environ.get('DB_PATH', os.path.join(os.path.dirname(__file__), '../../backend/data/monitoring.db'))
+    
+    # 每个worker进程的连接池大小，0表示不使用连接池（每次新建连接）
+    POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+    
+    # 每个连接缓存的预编译语句数
+    CACHED_STATEMENTS = int(os.environ.get('DB_CACHED_STATEMENTS', 256))
+    
+    # 连接空闲超过该秒数后，取出时先做健康检查
+    HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_HEALTH_CHECK_INTERVAL', 30))
+    
+    # 连接池耗尽时等待空闲连接的秒数
+    POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+    
+    # 日志模式，WAL下读写互不阻塞
+    JOURNAL_MODE = os.environ.get('DB_JOURNAL_MODE', 'WAL')
+    
+    # 等待数据库锁的毫秒数
+    BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+    
+    # 每个连接的页缓存大小（KB）和内存映射大小（MB）
+    CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 16384))
+    MMAP_SIZE_MB = int(os.environ.get('DB_MMAP_SIZE_MB', 256))
+    
+    # 写连接的同步级别：API写连接默认FULL（WAL模式下每次提交都同步，已返回的写入断电不丢失）；
+    # 数据导入工具使用NORMAL（只在检查点时同步，断电最多丢失最近的提交，不会损坏数据库）
+    SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'FULL')
+    IMPORT_SYNCHRONOUS = os.environ.get('DB_IMPORT_SYNCHRONOUS', 'NORMAL')
+    
+    # 写入队列：合并提交的最大操作数和最长等待毫秒数
+    INGEST_MAX_BATCH = int(os.environ.get('INGEST_MAX_BATCH', 500))
+    INGEST_MAX_DELAY_MS = float(os.environ.get('INGEST_MAX_DELAY_MS', 5))
+    
+    # WAL检查点：写线程空闲该毫秒数后做被动检查点；持续写入时的最长间隔（秒）
+    CHECKPOINT_IDLE_MS = float(os.environ.get('WAL_CHECKPOINT_IDLE_MS', 1000))
+    CHECKPOINT_MAX_INTERVAL = float(os.environ.get('WAL_CHECKPOINT_MAX_INTERVAL', 30))
+    
+    # 检查点后WAL仍超过该页数时做截断检查点（TRUNCATE），限制-wal文件大小
+    CHECKPOINT_TRUNCATE_PAGES = int(os.environ.get('WAL_CHECKPOINT_TRUNCATE_PAGES', 4096))
+    
+    # 按年归档的分区文件目录
+    PARTITION_DIR = os.environ.get(
+        'DB_PARTITION_DIR', os.path.join(os.path.dirname(DB_PATH), 'partitions')
+    )
+    
+    # 每个读连接最多同时挂载的分区数（SQLite默认最多挂载10个数据库）
+    PARTITION_MAX_ATTACHED = int(os.environ.get('DB_PARTITION_MAX_ATTACHED', 8))
+    
+    # 统计和摘要的聚合引擎：sqlite（汇总表和计数器）或 duckdb（每个worker进程内的列式分析镜像，需要安装duckdb）
+    ANALYTICS_ENGINE = os.environ.get('DB_ANALYTICS_ENGINE', 'sqlite')
+    
+    # 读接口响应缓存：每个worker进程缓存的响应数（0表示不缓存）和单个响应的最大KB数
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 256))
+    RESPONSE_CACHE_MAX_ENTRY_KB = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRY_KB', 1024))
@@ -0,0 +1,61 @@
+"""
+派生表模块 - 由 measurement 上的触发器增量维护的表的重建、校验和触发器暂停
+"""
+import time
+from .catalog import aggregate_catalog, check_catalog, rebuild_catalog
+from .rollups import aggregate_rollups, check_rollups, rebuild_rollups
+from .stats import aggregate_stats, check_stats, rebuild_stats
+
+# (表名, 聚合函数, 重建函数, 校验函数)；聚合函数按指定的测量记录表计算派生行，
+# 重建函数返回重建后的行数，校验函数返回不一致的描述列表
+DERIVED_TABLES = [
+    ('measurement_rollup', aggregate_rollups, rebuild_rollups, check_rollups),
+    ('instrument', aggregate_catalog, rebuild_catalog, check_catalog),
+    ('measurement_stats', aggregate_stats, rebuild_stats, check_stats),
+]
+
+# 维护派生表的触发器名前缀
+TRIGGER_PREFIX = 'trg_measurement_'
+
+def suspend_triggers(conn):
+    """删除维护派生表的触发器并返回 [(名称, SQL)]，用于全量导入时改为导入后统一重建
+
+    需要在事务中调用，回滚时触发器随事务一起恢复。
+    """
+    triggers = conn.execute('''
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'trigger' AND tbl_name = 'measurement' AND name LIKE ?
+    ''', (TRIGGER_PREFIX + '%',)).fetchall()
+    for name, _ in triggers:
+        conn.execute(f'DROP TRIGGER "{name}"')
+    return triggers
+
+def restore_triggers(conn, triggers):
+    """重新创建 suspend_triggers 删除的触发器"""
+    for _, sql in triggers:
+        conn.execute(sql)
+
+def aggregate_derived(conn, table):
+    """按指定的测量记录表（如挂载的归档分区）计算全部派生行，返回 {表名: 行列表}"""
+    return {name: aggregate(conn, table) for name, aggregate, _, _ in DERIVED_TABLES}
+
+def rebuild_derived(conn, archived=None):
+    """按测量记录重建全部派生表，返回 {表名: (行数, 耗时秒)}
+
+    派生表覆盖包括归档分区在内的全部历史；有归档分区时 archived 需传入
+    partition_aggregates 的结果，否则重建结果只包含 measurement 表。
+    """
+    archived = archived or {}
+    results = {}
+    for name, _, rebuild, _ in DERIVED_TABLES:
+        started = time.perf_counter()
+        count = rebuild(conn, archived.get(name, ()))
+        results[name] = (count, time.perf_counter() - started)
+    # 触发器暂停期间的修改不会递增版本号，重建后统一递增，分析镜像据此重新加载
+    conn.execute("UPDATE data_version SET version = version + 1 WHERE scope = 'measurement'")
+    return results
+
+def check_derived(conn, archived=None):
+    """校验全部派生表，返回 {表名: 不一致的描述列表}，archived 同 rebuild_derived"""
+    archived = archived or {}
+    return {name: check(conn, archived=archived.get(name, ())) for name, _, _, check in DERIVED_TABLES}
@@ -0,0 +1,150 @@
+"""
+降采样模块 - 按 LTTB（Largest-Triangle-Three-Buckets）算法抽取保持曲线形状的测量点
+
+GET /api/measurements 带 max_points 参数时，时间范围内的每个 (监测类型, 仪器) 序列最多返回 max_points 个点，
+图表的数据量不随时间范围和采集频率增长。先只读取抽样用到的 id、measure_ts、value 等列（SQLite表在主数据库
+和挂载的分区上查询，列式分区直接读内存映射的列），按序列用NumPy计算选中的点，再按id读取这些点的完整记录。
+值为NULL的记录无法绘制，不参与抽样。
+"""
+import numpy as np
+import pandas as pd
+from .columnar import ColumnarPartition
+
+# 抽样用到的列
+POINT_COLUMNS = ['id', 'type_id', 'instrument_id', 'measure_ts', 'value']
+
+# 点数不超过此值的桶逐点比较，不调用numpy
+SMALL_BUCKET = 8
+
+# 按id读取完整记录时每条语句的id数
+ID_CHUNK = 500
+
+def lttb(times, values, threshold):
+    """返回按LTTB算法选中的下标（升序，包含首末点）
+
+    times 升序。除首末点外的点按下标平均分为 threshold-2 个桶，每个桶选出与上一个选中点、
+    下一个桶的平均点构成的三角形面积最大的点；点数不超过 threshold 时返回全部下标。
+    """
+    size = len(times)
+    if size <= threshold or threshold < 3:
+        return np.arange(size)
+    # 时间从0开始计，避免UTC秒与测量值相乘时损失精度
+    x = (np.asarray(times) - times[0]).astype(np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    # 第i个桶为 [edges[i], edges[i+1])，最后一个桶截止到末点之前
+    edges = (np.arange(threshold - 1) * ((size - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = size - 1
+    # 每个桶的下一个桶的平均点（最后一个桶的下一个桶为末点），用前缀和一次算出
+    next_start = edges[1:]
+    next_end = np.append(edges[2:], size)
+    x_sums = np.concatenate(([0.0], np.cumsum(x)))
+    y_sums = np.concatenate(([0.0], np.cumsum(y)))
+    counts = next_end - next_start
+    next_x = (x_sums[next_end] - x_sums[next_start]) / counts
+    next_y = (y_sums[next_end] - y_sums[next_start]) / counts
+    # 以上一个选中点 (px, py) 为顶点的三角形面积的两倍为 |px*a + py*b + c|，
+    # a、b、c 只与点本身和所在桶的下一个桶的平均点有关，对所有点一次算出
+    nx = np.repeat(next_x, np.diff(edges))
+    ny = np.repeat(next_y, np.diff(edges))
+    inner = slice(1, size - 1)
+    a = np.concatenate(([0.0], y[inner] - ny, [0.0]))
+    b = np.concatenate(([0.0], nx - x[inner], [0.0]))
+    c = np.concatenate(([0.0], x[inner] * ny - nx * y[inner], [0.0]))
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+    xs, ys, edges = x.tolist(), y.tolist(), edges.tolist()
+    small = (a.tolist(), b.tolist(), c.tolist()) if size < SMALL_BUCKET * threshold else None
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        px, py = xs[previous], ys[previous]
+        if small is not None and end - start <= SMALL_BUCKET:
+            # 点数很少的桶在Python中比较，省去numpy逐桶调用的开销
+            la, lb, lc = small
+            previous = max(range(start, end), key=lambda i: abs(px * la[i] + py * lb[i] + lc[i]))
+        else:
+            previous = start + int(np.argmax(np.abs(px * a[start:end] + py * b[start:end] + c[start:end])))
+        selected[bucket + 1] = previous
+    return selected
+
+def read_points(conn, tables, query, params, scan):
+    """读取 tables（PartitionRouter.sources 的结果）中值不为NULL的点，返回 (数据源列表, DataFrame)
+
+    DataFrame 的 source 列为数据源列表的下标，ref 列为读取完整记录时用的键：
+    SQLite表为记录id，列式分区为序列文件中的行下标（数据源为 ColumnarSeries）。
+    """
+    sources, frames = [], []
+    for table in tables:
+        if isinstance(table, ColumnarPartition):
+            for series in table.select(scan.type_id, scan.instrument_id, scan.start_ts, scan.end_ts):
+                times = series.times()
+                low = 0 if scan.start_ts is None else np.searchsorted(times, scan.start_ts, 'left')
+                high = len(times) if scan.end_ts is None else np.searchsorted(times, scan.end_ts, 'right')
+                rows = np.arange(low, high)
+                values = series.floats('value', rows)
+                present = ~np.isnan(values)
+                rows, values = rows[present], values[present]
+                if not len(rows):
+                    continue
+                frames.append(pd.DataFrame({
+                    'source': len(sources),
+                    'ref': rows,
+                    'id': series.ids()[rows],
+                    'type_id': series.type_id,
+                    'instrument_id': series.instrument_id,
+                    'measure_ts': times[rows],
+                    'value': values,
+                }))
+                sources.append(series)
+        else:
+            sql = f'SELECT {", ".join(POINT_COLUMNS)} FROM ({query.format(table=table)}) WHERE value IS NOT NULL'
+            frame = pd.DataFrame.from_records(conn.execute(sql, params).fetchall(), columns=POINT_COLUMNS)
+            if not len(frame):
+                continue
+            frame.insert(0, 'source', len(sources))
+            frame.insert(1, 'ref', frame['id'])
+            frames.append(frame)
+            sources.append(table)
+    if not frames:
+        return sources, None
+    return sources, pd.concat(frames, ignore_index=True)
+
+def downsample(conn, router, query, params, scan, max_points):
+    """按 (监测类型, 仪器) 分别抽取至多 max_points 个点，返回完整记录列表（按 measure_ts、id 倒序）
+
+    query、params、scan 与 fetch_ordered 的相同：query 中用 {table} 表示测量记录表，
+    不带 ORDER BY 和 LIMIT，选出的列包含 measure_ts；列式分区按 scan 过滤。
+    分区路由 router 按挂载数上限卸载较早挂载的分区，读取完整记录时重新取一次数据源，
+    每个SQLite表在迭代到（已挂载）时读取。
+    """
+    sources, points = read_points(conn, router.sources(conn, scan.start_ts, scan.end_ts), query, params, scan)
+    if points is None:
+        return []
+    points = points.sort_values(['type_id', 'instrument_id', 'measure_ts', 'id'], kind='stable')
+    chosen = []
+    for _, series in points.groupby(['type_id', 'instrument_id'], sort=False):
+        picked = lttb(series['measure_ts'].to_numpy(), series['value'].to_numpy(), max_points)
+        chosen.append(series.iloc[picked])
+    chosen = pd.concat(chosen)
+    refs = {sources[number]: group['ref'].to_numpy() for number, group in chosen.groupby('source')}
+
+    records = []
+    types = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute('SELECT id, name, unit FROM monitoring_type')
+    }
+    for source, rows in refs.items():
+        if not isinstance(source, str):
+            records += source.records(np.sort(rows), types)
+    for table in router.sources(conn, scan.start_ts, scan.end_ts):
+        if not isinstance(table, str) or table not in refs:
+            continue
+        sql = f'SELECT * FROM ({query.format(table=table)}) WHERE id IN '
+        ids = refs[table].tolist()
+        for i in range(0, len(ids), ID_CHUNK):
+            chunk = ids[i:i + ID_CHUNK]
+            rows = conn.execute(sql + f'({", ".join("?" * len(chunk))})', params + chunk).fetchall()
+            records += [dict(row) for row in rows]
+    records.sort(key=lambda record: (record['measure_ts'], record['id']), reverse=True)
+    return records
@@ -0,0 +1,52 @@
+"""
+时间换算模块 - measure_time 字符串与 measure_ts 整数（UTC秒）之间的换算，以及摘要时间段的边界
+
+measure_ts 是 measurement 上与 measure_time 同步的整数列（见迁移7），范围过滤和排序都在整数上进行。
+不带时区的时间按UTC处理，带时区的时间先转换为UTC。
+"""
+from datetime import datetime, timedelta, timezone
+
+# measure_time 的存储格式
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+EPOCH = datetime(1970, 1, 1)
+
+def parse_time(value):
+    """把ISO 8601时间字符串解析为UTC时间（naive datetime），无效时抛出 ValueError"""
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f'无效的时间: {value!r}')
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f'无效的时间: {value}')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def to_epoch(value):
+    """把时间字符串或datetime换算为UTC秒（与 measure_ts 一致，不足一秒的部分舍去）"""
+    if isinstance(value, str):
+        value = parse_time(value)
+    return (value - EPOCH) // timedelta(seconds=1)
+
+def from_epoch(seconds):
+    """把UTC秒换算为 measure_time 格式的字符串"""
+    return (EPOCH + timedelta(seconds=seconds)).strftime(TIME_FORMAT)
+
+def normalize_time(value):
+    """把时间字符串规范化为 measure_time 的存储格式（UTC），无效时抛出 ValueError"""
+    return parse_time(value).strftime(TIME_FORMAT)
+
+def period_start(moment, interval):
+    """返回 moment 所在摘要时间段的起点
+
+    与 rollup_interval 中的strftime格式分段一致：周（%W）从周一开始，跨年的一周在1月1日拆成两段。
+    """
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'day':
+        return day
+    if interval == 'week':
+        return max(day - timedelta(days=day.weekday()), day.replace(month=1, day=1))
+    if interval == 'month':
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
@@ -0,0 +1,160 @@
+"""
+导出模块 - 把测量记录按时间升序流式编码为CSV或NDJSON，内存占用与导出的时间范围无关
+
+数据源按时间从旧到新依次读取（热数据最后），SQLite表用游标每次 fetchmany 一块，列式分区按序列分块还原；
+导出多个仪器时每个仪器一个查询（按 instrument_id 索引读取），各查询的记录按 (measure_ts, id) 合并。
+long 布局每条记录一行；wide 布局每个测量时间一行，每个 (仪器, 监测类型) 一列测量值。
+编码后的块可以再经 gzip_chunks 边生成边压缩。
+"""
+import csv
+import heapq
+import io
+import itertools
+import json
+import zlib
+from .columnar import ColumnarPartition
+
+# 每次从游标读取和每个编码块的行数
+EXPORT_CHUNK = 2000
+
+# long 布局的列
+LONG_COLUMNS = ['id', 'measure_time', 'type_id', 'type_name', 'instrument_id', 'value', 'unit', 'water_level']
+
+# 各导出格式的MIME类型和文件扩展名
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+EXPORT_LAYOUTS = ('long', 'wide')
+
+def record_key(record):
+    return record['measure_ts'], record['id']
+
+def cursor_records(conn, sql, params, chunk_size):
+    """执行 sql 并逐条返回记录字典，每次从游标读取 chunk_size 行"""
+    cursor = conn.execute(sql, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+    finally:
+        cursor.close()
+
+def iter_records(conn, router, queries, start_ts=None, end_ts=None, chunk_size=EXPORT_CHUNK):
+    """按 (measure_ts, id) 升序逐条返回各查询匹配的记录字典
+
+    queries 为 (query, params, scan) 列表，query 中用 {table} 表示测量记录表，末尾不带 ORDER BY，
+    scan 为与之等价的 MeasurementScan（列式分区按它过滤）。数据源由分区路由按时间从旧到新给出，
+    时间互不重叠，每个数据源上各查询的记录合并后依次返回。
+    """
+    types = None
+    for table in router.sources(conn, start_ts, end_ts, oldest_first=True):
+        if isinstance(table, ColumnarPartition):
+            if types is None:
+                types = {
+                    row[0]: (row[1], row[2])
+                    for row in conn.execute('SELECT id, name, unit FROM monitoring_type')
+                }
+            streams = [table.iter_records(scan, types, chunk_size) for _, _, scan in queries]
+        else:
+            streams = [
+                cursor_records(conn, query.format(table=table) + ' ORDER BY m.measure_ts, m.id', params, chunk_size)
+                for query, params, _ in queries
+            ]
+        if len(streams) == 1:
+            yield from streams[0]
+        else:
+            yield from heapq.merge(*streams, key=record_key)
+
+def wide_columns(conn, type_id=None, instrument_ids=None):
+    """返回 wide 布局的测量值列 [((instrument_id, type_id), 列名)]
+
+    按仪器目录列出匹配的 (仪器, 监测类型)，仪器按 instrument_ids 的顺序（未指定时按编号）；
+    列名为仪器编号，仪器有多个监测类型时为 仪器编号(类型名称)。
+    """
+    query = '''
+        SELECT i.instrument_id, i.type_id, t.name
+        FROM instrument i
+        JOIN monitoring_type t ON i.type_id = t.id
+        WHERE 1=1
+    '''
+    params = []
+    if type_id:
+        query += ' AND i.type_id = ?'
+        params.append(type_id)
+    if instrument_ids:
+        query += f' AND i.instrument_id IN ({", ".join("?" * len(instrument_ids))})'
+        params += instrument_ids
+    rows = conn.execute(query + ' ORDER BY i.instrument_id, i.type_id', params).fetchall()
+    if instrument_ids:
+        order = {instrument_id: n for n, instrument_id in enumerate(instrument_ids)}
+        rows.sort(key=lambda row: order[row[0]])
+    counts = {}
+    for instrument_id, _, _ in rows:
+        counts[instrument_id] = counts.get(instrument_id, 0) + 1
+    return [
+        ((instrument_id, row_type_id), instrument_id if counts[instrument_id] == 1 else f'{instrument_id}({name})')
+        for instrument_id, row_type_id, name in rows
+    ]
+
+def wide_rows(records, columns):
+    """把按时间升序的记录按测量时间合并为行字典：measure_time 和各列的测量值（没有记录的列为None）"""
+    labels = dict(columns)
+    for _, group in itertools.groupby(records, key=lambda record: record['measure_ts']):
+        row = None
+        for record in group:
+            if row is None:
+                row = dict.fromkeys(['measure_time'] + list(labels.values()))
+                row['measure_time'] = record['measure_time']
+            label = labels.get((record['instrument_id'], record['type_id']))
+            if label is not None:
+                row[label] = record['value']
+        yield row
+
+def encode_csv(rows, header):
+    """编码为CSV（首行为列名），每 EXPORT_CHUNK 行返回一个UTF-8编码的块"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(header)
+    while True:
+        chunk = list(itertools.islice(rows, EXPORT_CHUNK))
+        for row in chunk:
+            writer.writerow([row[name] for name in header])
+        yield buffer.getvalue().encode('utf-8')
+        if not chunk:
+            return
+        buffer.seek(0)
+        buffer.truncate()
+
+def encode_ndjson(rows, header):
+    """编码为NDJSON（每行一个JSON对象，键按 header 的顺序），每 EXPORT_CHUNK 行返回一个块"""
+    while True:
+        chunk = list(itertools.islice(rows, EXPORT_CHUNK))
+        if not chunk:
+            return
+        yield ''.join(
+            json.dumps({name: row[name] for name in header}, ensure_ascii=False) + '\n'
+            for row in chunk
+        ).encode('utf-8')
+
+def export_chunks(records, export_format='csv', columns=None):
+    """把按时间升序的记录编码为 export_format 格式的字节块；columns 为 wide_columns 的结果时按 wide 布局"""
+    if columns is None:
+        rows, header = records, LONG_COLUMNS
+    else:
+        rows, header = wide_rows(records, columns), ['measure_time'] + [label for _, label in columns]
+    encode = encode_csv if export_format == 'csv' else encode_ndjson
+    return encode(iter(rows), header)
+
+def gzip_chunks(chunks, level=6):
+    """边生成边压缩为gzip格式，压缩器有输出时才返回块"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,226 @@
+"""
+写入队列模块 - 合并并发写入为一次事务提交（group commit）
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from .config import StorageConfig
+from .pragmas import configure_connection, set_journal_mode
+
+
+class IngestQueue:
+    """进程内写入队列
+
+    各请求把写操作提交到队列，后台写线程在 max_delay 秒内或凑满 max_batch 个操作后
+    用一个事务执行并提交，提交完成（数据已落盘）后再唤醒各请求。
+    写连接的同步级别为 synchronous（默认 StorageConfig.SYNCHRONOUS，即FULL）：WAL模式下每次提交都同步WAL文件，
+    已返回的写入在断电后也不会丢失；合并提交使一次同步分摊到整批操作上。
+    每个操作在独立的SAVEPOINT中执行，单个操作失败只回滚它自己。
+
+    写线程持有进程内唯一的写连接，并接管WAL检查点：关闭自动检查点，
+    空闲 checkpoint_idle 秒或距上次检查点超过 checkpoint_max_interval 秒时做被动检查点，
+    检查点后WAL仍超过 truncate_pages 页时做截断检查点。
+    """
+
+    def __init__(self, db_path, max_batch=500, max_delay=0.005, timeout=30, journal_mode=None,
+                 checkpoint_idle=1.0, checkpoint_max_interval=30, truncate_pages=4096, synchronous=None):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self.checkpoint_idle = checkpoint_idle
+        self.checkpoint_max_interval = checkpoint_max_interval
+        self.truncate_pages = truncate_pages
+        self.synchronous = synchronous or StorageConfig.SYNCHRONOUS
+        self._journal = None
+        self._wal = False
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stats = {
+            'batches': 0,
+            'operations': 0,
+            'failed_operations': 0,
+            'last_batch_size': 0,
+            'max_batch_size': 0,
+            'commit_ms_total': 0.0,
+            'commit_ms_max': 0.0,
+            'wait_ms_total': 0.0,
+            'checkpoints': 0,
+            'truncate_checkpoints': 0,
+            'checkpoint_ms_total': 0.0,
+            'last_checkpoint': None,
+        }
+
+    def submit(self, operation):
+        """提交写操作并等待所在批次提交，返回operation(cursor)的结果
+
+        operation在写线程中执行，异常会在调用方重新抛出。
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((operation, future, time.perf_counter()))
+        return future.result(timeout=self.timeout)
+
+    def metrics(self):
+        """返回队列深度、批大小和提交耗时等指标"""
+        with self._lock:
+            stats = dict(self._stats)
+        batches = stats['batches'] or 1
+        operations = stats['operations'] or 1
+        return {
+            'queue_depth': self._queue.qsize(),
+            'batches': stats['batches'],
+            'operations': stats['operations'],
+            'failed_operations': stats['failed_operations'],
+            'last_batch_size': stats['last_batch_size'],
+            'max_batch_size': stats['max_batch_size'],
+            'avg_batch_size': round(stats['operations'] / batches, 2),
+            'avg_commit_ms': round(stats['commit_ms_total'] / batches, 3),
+            'max_commit_ms': round(stats['commit_ms_max'], 3),
+            'avg_wait_ms': round(stats['wait_ms_total'] / operations, 3),
+            'max_batch': self.max_batch,
+            'max_delay_ms': self.max_delay * 1000,
+            'journal_mode': self._journal,
+            'synchronous': self.synchronous,
+            'checkpoints': stats['checkpoints'],
+            'truncate_checkpoints': stats['truncate_checkpoints'],
+            'avg_checkpoint_ms': round(stats['checkpoint_ms_total'] / (stats['checkpoints'] or 1), 3),
+            'last_checkpoint': stats['last_checkpoint'],
+        }
+
+    def _ensure_started(self):
+        """按需启动写线程；gunicorn fork出的worker进程中会重新启动"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+                self._thread.start()
+
+    def _connect(self):
+        """写线程专用连接，事务由写线程显式控制"""
+        if self.journal_mode:
+            set_journal_mode(self.db_path, self.journal_mode)
+        conn = configure_connection(
+            sqlite3.connect(self.db_path, isolation_level=None), synchronous=self.synchronous
+        )
+        conn.row_factory = sqlite3.Row
+        self._journal = conn.execute('PRAGMA journal_mode').fetchone()[0].lower()
+        self._wal = self._journal == 'wal'
+        if self._wal:
+            conn.execute('PRAGMA wal_autocheckpoint = 0')
+        return conn
+
+    def _collect(self, first):
+        """从第一个操作开始，在max_delay内继续收集，最多max_batch个"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            # 有未检查点的提交时限时等待，空闲超时即做检查点
+            try:
+                first = self._queue.get(timeout=self.checkpoint_idle if self._dirty else None)
+            except queue.Empty:
+                self._checkpoint(conn)
+                continue
+            self._execute(conn, self._collect(first))
+            self._dirty = self._wal
+            if self._dirty and time.monotonic() - self._last_checkpoint >= self.checkpoint_max_interval:
+                self._checkpoint(conn)
+
+    def _checkpoint(self, conn):
+        """被动检查点不等待读连接；WAL仍过大时做截断检查点（最多等待busy_timeout）"""
+        started = time.perf_counter()
+        mode = 'PASSIVE'
+        try:
+            busy, log_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+            if log_pages > self.truncate_pages:
+                mode = 'TRUNCATE'
+                busy, log_pages, checkpointed = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        except sqlite3.Error:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+        with self._lock:
+            stats = self._stats
+            stats['checkpoints'] += 1
+            if mode == 'TRUNCATE':
+                stats['truncate_checkpoints'] += 1
+            stats['checkpoint_ms_total'] += elapsed_ms
+            stats['last_checkpoint'] = {
+                'mode': mode,
+                'busy': bool(busy),
+                'wal_pages': log_pages,
+                'checkpointed_pages': checkpointed,
+                'ms': round(elapsed_ms, 3),
+            }
+
+    def _execute(self, conn, batch):
+        """在一个事务中执行一批操作，提交后再设置各操作的结果"""
+        cursor = conn.cursor()
+        outcomes = []
+        started = time.perf_counter()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for operation, future, _ in batch:
+                cursor.execute('SAVEPOINT ingest_op')
+                try:
+                    result = operation(cursor)
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO ingest_op')
+                    outcomes.append((future, None, e))
+                else:
+                    outcomes.append((future, result, None))
+                cursor.execute('RELEASE ingest_op')
+            cursor.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finished = time.perf_counter()
+
+        failed = 0
+        for future, result, error in outcomes:
+            if error is not None:
+                failed += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        commit_ms = (finished - started) * 1000
+        wait_ms = sum(finished - enqueued for _, _, enqueued in batch) * 1000
+        with self._lock:
+            stats = self._stats
+            stats['batches'] += 1
+            stats['operations'] += len(batch)
+            stats['failed_operations'] += failed
+            stats['last_batch_size'] = len(batch)
+            stats['max_batch_size'] = max(stats['max_batch_size'], len(batch))
+            stats['commit_ms_total'] += commit_ms
+            stats['commit_ms_max'] = max(stats['commit_ms_max'], commit_ms)
+            stats['wait_ms_total'] += wait_ms
@@ -0,0 +1,620 @@
+"""
+数据库迁移模块 - 管理 monitoring_type / measurement 及相关表的结构
+
+每个迁移是 (版本号, 说明, SQL脚本)，按版本号顺序在各自的事务中执行，
+已执行的版本记录在 schema_migrations 表中。只追加新迁移，不修改已发布的迁移。
+命令行入口见 flask_backend/migrate.py。
+"""
+import sqlite3
+from .config import StorageConfig
+from .pragmas import configure_connection
+
+# 汇总表触发器：把新记录计入各时间间隔的汇总行
+ROLLUP_ADD_NEW = '''
+            INSERT INTO measurement_rollup
+                (instrument_id, type_id, interval, period, row_count, value_count, value_sum, min_value, max_value)
+            SELECT NEW.instrument_id, NEW.type_id, interval, IFNULL(strftime(format, NEW.measure_time), ''),
+                   1, NEW.value IS NOT NULL, IFNULL(NEW.value, 0), NEW.value, NEW.value
+            FROM rollup_interval WHERE 1
+            ON CONFLICT (instrument_id, type_id, interval, period) DO UPDATE SET
+                row_count = row_count + 1,
+                value_count = value_count + excluded.value_count,
+                value_sum = value_sum + excluded.value_sum,
+                min_value = CASE WHEN min_value IS NULL OR excluded.min_value < min_value
+                                 THEN excluded.min_value ELSE min_value END,
+                max_value = CASE WHEN max_value IS NULL OR excluded.max_value > max_value
+                                 THEN excluded.max_value ELSE max_value END;
+'''
+
+# 汇总表触发器：从汇总行中扣除旧记录；旧值是最小/最大值时，在该时间段内重新计算
+ROLLUP_REMOVE_OLD = '''
+            UPDATE measurement_rollup SET
+                row_count = row_count - 1,
+                value_count = value_count - (OLD.value IS NOT NULL),
+                value_sum = value_sum - IFNULL(OLD.value, 0)
+            WHERE instrument_id = OLD.instrument_id AND type_id = OLD.type_id
+              AND (interval, period) IN (
+                  SELECT interval, IFNULL(strftime(format, OLD.measure_time), '') FROM rollup_interval
+              );
+
+            DELETE FROM measurement_rollup
+            WHERE instrument_id = OLD.instrument_id AND type_id = OLD.type_id
+              AND (interval, period) IN (
+                  SELECT interval, IFNULL(strftime(format, OLD.measure_time), '') FROM rollup_interval
+              )
+              AND row_count = 0;
+
+            UPDATE measurement_rollup SET (min_value, max_value) = (
+                SELECT MIN(m.value), MAX(m.value)
+                FROM measurement m JOIN rollup_interval i ON i.interval = measurement_rollup.interval
+                WHERE m.type_id = OLD.type_id AND m.instrument_id = OLD.instrument_id
+                  AND m.measure_time >= datetime(OLD.measure_time, printf('-%d days', i.span_days))
+                  AND m.measure_time <= datetime(OLD.measure_time, printf('+%d days', i.span_days))
+                  AND IFNULL(strftime(i.format, m.measure_time), '') = measurement_rollup.period
+            )
+            WHERE instrument_id = OLD.instrument_id AND type_id = OLD.type_id
+              AND (interval, period) IN (
+                  SELECT interval, IFNULL(strftime(format, OLD.measure_time), '') FROM rollup_interval
+              )
+              AND (OLD.value = min_value OR OLD.value = max_value);
+'''
+
+# 仪器目录触发器：把新记录计入仪器的记录数和首末时间
+CATALOG_ADD_NEW = '''
+            INSERT INTO instrument (instrument_id, type_id, row_count, first_time, last_time)
+            VALUES (NEW.instrument_id, NEW.type_id, 1, NEW.measure_time, NEW.measure_time)
+            ON CONFLICT (instrument_id, type_id) DO UPDATE SET
+                row_count = row_count + 1,
+                first_time = CASE WHEN first_time IS NULL OR excluded.first_time < first_time
+                                  THEN excluded.first_time ELSE first_time END,
+                last_time = CASE WHEN last_time IS NULL OR excluded.last_time > last_time
+                                 THEN excluded.last_time ELSE last_time END;
+'''
+
+# 仪器目录触发器：扣除旧记录；旧记录是首末记录时按唯一键索引重新取首末时间
+CATALOG_REMOVE_OLD = '''
+            UPDATE instrument SET row_count = row_count - 1
+            WHERE instrument_id = OLD.instrument_id AND type_id = OLD.type_id;
+
+            UPDATE instrument SET
+                first_time = (SELECT MIN(measure_time) FROM measurement
+                              WHERE type_id = OLD.type_id AND instrument_id = OLD.instrument_id),
+                last_time = (SELECT MAX(measure_time) FROM measurement
+                             WHERE type_id = OLD.type_id AND instrument_id = OLD.instrument_id)
+            WHERE instrument_id = OLD.instrument_id AND type_id = OLD.type_id
+              AND (OLD.measure_time = first_time OR OLD.measure_time = last_time);
+'''
+
+# instrument 表变化时递增目录的数据版本号
+CATALOG_BUMP_VERSION = '''
+            UPDATE data_version SET version = version + 1 WHERE scope = 'catalog';
+'''
+
+# 统计计数器触发器：把新记录计入所属监测类型的记录数、值的和与首末时间
+STATS_ADD_NEW = '''
+            INSERT INTO measurement_stats (type_id, row_count, value_count, value_sum, first_time, last_time)
+            VALUES (NEW.type_id, 1, NEW.value IS NOT NULL, IFNULL(NEW.value, 0), NEW.measure_time, NEW.measure_time)
+            ON CONFLICT (type_id) DO UPDATE SET
+                row_count = row_count + 1,
+                value_count = value_count + excluded.value_count,
+                value_sum = value_sum + excluded.value_sum,
+                first_time = CASE WHEN first_time IS NULL OR excluded.first_time < first_time
+                                  THEN excluded.first_time ELSE first_time END,
+                last_time = CASE WHEN last_time IS NULL OR excluded.last_time > last_time
+                                 THEN excluded.last_time ELSE last_time END;
+'''
+
+# 统计计数器触发器：扣除旧记录；旧记录是首末记录时按类型时间索引重新取首末时间
+STATS_REMOVE_OLD = '''
+            UPDATE measurement_stats SET
+                row_count = row_count - 1,
+                value_count = value_count - (OLD.value IS NOT NULL),
+                value_sum = value_sum - IFNULL(OLD.value, 0)
+            WHERE type_id = OLD.type_id;
+
+            UPDATE measurement_stats SET
+                first_time = (SELECT MIN(measure_time) FROM measurement WHERE type_id = OLD.type_id),
+                last_time = (SELECT MAX(measure_time) FROM measurement WHERE type_id = OLD.type_id)
+            WHERE type_id = OLD.type_id
+              AND (OLD.measure_time = first_time OR OLD.measure_time = last_time);
+'''
+
+# 分区登记触发器：递增 data_version 中 partition 的版本号
+PARTITION_BUMP_VERSION = '''
+            UPDATE data_version SET version = version + 1 WHERE scope = 'partition';
+'''
+
+# 测量记录修改或删除时递增 measurement 的数据版本号；追加的记录由分析镜像按id水位线感知
+MEASUREMENT_BUMP_VERSION = '''
+            UPDATE data_version SET version = version + 1 WHERE scope = 'measurement';
+'''
+
+# 监测类型变化时递增 type 的数据版本号（响应缓存据此失效）
+TYPE_BUMP_VERSION = '''
+            UPDATE data_version SET version = version + 1 WHERE scope = 'type';
+'''
+
+# 分区保护触发器：不早于最新归档分区结束时间的记录才能写入 measurement
+PARTITION_GUARD = '''
+            SELECT RAISE(ABORT, '该时间早于归档截止时间，已归档的数据只读');
+'''
+
+# 分区内各 (仪器, 监测类型) 的首末时间随登记行一起删除
+PARTITION_EXTENT_DELETE = '''
+            DELETE FROM partition_extent WHERE partition_id = OLD.partition_id;
+'''
+
+# 仪器目录触发器（迁移8起）：旧记录是首末记录时只重新取对应的一端；
+# 首时间先取归档分区中的，末时间先取 measurement 中的，热数据中没有记录时回退到归档分区
+CATALOG_REMOVE_OLD_ARCHIVED = '''
+            UPDATE instrument SET row_count = row_count - 1
+            WHERE instrument_id = OLD.instrument_id AND type_id = OLD.type_id;
+
+            UPDATE instrument SET
+                first_time = CASE WHEN OLD.measure_time = first_time THEN IFNULL(
+                    (SELECT MIN(first_time) FROM partition_extent
+                     WHERE instrument_id = OLD.instrument_id AND type_id = OLD.type_id),
+                    (SELECT MIN(measure_time) FROM measurement
+                     WHERE type_id = OLD.type_id AND instrument_id = OLD.instrument_id)
+                ) ELSE first_time END,
+                last_time = CASE WHEN OLD.measure_time = last_time THEN IFNULL(
+                    (SELECT MAX(measure_time) FROM measurement
+                     WHERE type_id = OLD.type_id AND instrument_id = OLD.instrument_id),
+                    (SELECT MAX(last_time) FROM partition_extent
+                     WHERE instrument_id = OLD.instrument_id AND type_id = OLD.type_id)
+                ) ELSE last_time END
+            WHERE instrument_id = OLD.instrument_id AND type_id = OLD.type_id
+              AND (OLD.measure_time = first_time OR OLD.measure_time = last_time);
+'''
+
+# 统计计数器触发器（迁移8起）：同上，measurement 中的首末记录按 (type_id, measure_ts) 索引查找
+STATS_REMOVE_OLD_ARCHIVED = '''
+            UPDATE measurement_stats SET
+                row_count = row_count - 1,
+                value_count = value_count - (OLD.value IS NOT NULL),
+                value_sum = value_sum - IFNULL(OLD.value, 0)
+            WHERE type_id = OLD.type_id;
+
+            UPDATE measurement_stats SET
+                first_time = CASE WHEN OLD.measure_time = first_time THEN IFNULL(
+                    (SELECT MIN(first_time) FROM partition_extent WHERE type_id = OLD.type_id),
+                    (SELECT measure_time FROM measurement WHERE type_id = OLD.type_id
+                     ORDER BY measure_ts LIMIT 1)
+                ) ELSE first_time END,
+                last_time = CASE WHEN OLD.measure_time = last_time THEN IFNULL(
+                    (SELECT measure_time FROM measurement WHERE type_id = OLD.type_id
+                     ORDER BY measure_ts DESC LIMIT 1),
+                    (SELECT MAX(last_time) FROM partition_extent WHERE type_id = OLD.type_id)
+                ) ELSE last_time END
+            WHERE type_id = OLD.type_id
+              AND (OLD.measure_time = first_time OR OLD.measure_time = last_time);
+'''
+
+# measure_ts 触发器：按 measure_time 重新计算整数时间
+MEASURE_TS_SYNC = '''
+            UPDATE measurement SET measure_ts = CAST(strftime('%s', NEW.measure_time) AS INTEGER)
+            WHERE id = NEW.id;
+'''
+
+MIGRATIONS = [
+    (1, '监测类型和测量数据表', '''
+        CREATE TABLE IF NOT EXISTS monitoring_type (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            description TEXT,
+            unit TEXT
+        );
+
+        INSERT OR IGNORE INTO monitoring_type (id, name, description, unit) VALUES
+            (1, '引张线', '引张线监测', 'mm'),
+            (2, '静力水准', '静力水准监测', 'mm'),
+            (3, '水位', '上下游水位监测', 'm'),
+            (4, '倒垂线', '倒垂线监测', 'mm');
+
+        CREATE TABLE IF NOT EXISTS measurement (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type_id INTEGER NOT NULL,
+            instrument_id TEXT NOT NULL,
+            measure_time TEXT NOT NULL,
+            value REAL,
+            water_level REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (type_id) REFERENCES monitoring_type(id)
+        );
+    '''),
+    (2, '测量数据唯一键和导入水位线表', '''
+        -- 建唯一索引前清理重复记录（保留最后写入的一条）
+        DELETE FROM measurement
+        WHERE id NOT IN (
+            SELECT MAX(id) FROM measurement
+            GROUP BY type_id, instrument_id, measure_time
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_measurement_key'
+        );
+
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_measurement_key
+            ON measurement (type_id, instrument_id, measure_time);
+
+        CREATE TABLE IF NOT EXISTS import_watermark (
+            source TEXT NOT NULL,
+            instrument_id TEXT NOT NULL,
+            type_id INTEGER NOT NULL,
+            last_measure_time TEXT,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            history_digest TEXT NOT NULL,
+            file_fingerprint TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source, instrument_id)
+        );
+    '''),
+    (3, '时间序列复合索引', '''
+        -- 按仪器/类型过滤并按时间排序的查询走索引范围扫描，
+        -- 索引带上value，摘要和统计查询不需要回表
+        CREATE INDEX IF NOT EXISTS idx_measurement_instrument_time
+            ON measurement (instrument_id, measure_time, value);
+
+        CREATE INDEX IF NOT EXISTS idx_measurement_type_time
+            ON measurement (type_id, measure_time, value);
+
+        CREATE INDEX IF NOT EXISTS idx_measurement_time_value
+            ON measurement (measure_time, value);
+
+        -- 被上面的复合索引取代
+        DROP INDEX IF EXISTS idx_measurement_type;
+        DROP INDEX IF EXISTS idx_measurement_time;
+
+        ANALYZE;
+    '''),
+    (4, '按仪器和时间间隔的汇总表', '''
+        CREATE TABLE IF NOT EXISTS rollup_interval (
+            interval TEXT PRIMARY KEY,
+            format TEXT NOT NULL,
+            span_days INTEGER NOT NULL
+        );
+
+        INSERT OR IGNORE INTO rollup_interval (interval, format, span_days) VALUES
+            ('day', '%Y-%m-%d', 1),
+            ('week', '%Y-%W', 7),
+            ('month', '%Y-%m', 31),
+            ('year', '%Y', 366);
+
+        CREATE TABLE IF NOT EXISTS measurement_rollup (
+            instrument_id TEXT NOT NULL,
+            type_id INTEGER NOT NULL,
+            interval TEXT NOT NULL,
+            period TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            value_count INTEGER NOT NULL,
+            value_sum REAL NOT NULL,
+            min_value REAL,
+            max_value REAL,
+            PRIMARY KEY (instrument_id, type_id, interval, period)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_rollup_interval_type
+            ON measurement_rollup (interval, type_id, period);
+
+        CREATE INDEX IF NOT EXISTS idx_rollup_interval_period
+            ON measurement_rollup (interval, period);
+
+        INSERT INTO measurement_rollup
+            (instrument_id, type_id, interval, period, row_count, value_count, value_sum, min_value, max_value)
+        SELECT m.instrument_id, m.type_id, i.interval, IFNULL(strftime(i.format, m.measure_time), ''),
+               COUNT(*), COUNT(m.value), TOTAL(m.value), MIN(m.value), MAX(m.value)
+        FROM measurement m CROSS JOIN rollup_interval i
+        GROUP BY 1, 2, 3, 4;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_rollup_insert
+        AFTER INSERT ON measurement
+        BEGIN''' + ROLLUP_ADD_NEW + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_rollup_delete
+        AFTER DELETE ON measurement
+        BEGIN''' + ROLLUP_REMOVE_OLD + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_rollup_update
+        AFTER UPDATE OF type_id, instrument_id, measure_time, value ON measurement
+        BEGIN''' + ROLLUP_REMOVE_OLD + ROLLUP_ADD_NEW + '''        END;
+    '''),
+    (5, '仪器目录表和数据版本表', '''
+        CREATE TABLE IF NOT EXISTS data_version (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+
+        INSERT OR IGNORE INTO data_version (scope, version) VALUES ('catalog', 0);
+
+        CREATE TABLE IF NOT EXISTS instrument (
+            instrument_id TEXT NOT NULL,
+            type_id INTEGER NOT NULL,
+            location TEXT,
+            position TEXT,
+            elevation REAL,
+            installed_at TEXT,
+            first_time TEXT,
+            last_time TEXT,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (instrument_id, type_id),
+            FOREIGN KEY (type_id) REFERENCES monitoring_type(id)
+        );
+
+        INSERT OR IGNORE INTO instrument (instrument_id, type_id, row_count, first_time, last_time)
+        SELECT instrument_id, type_id, COUNT(*), MIN(measure_time), MAX(measure_time)
+        FROM measurement
+        GROUP BY type_id, instrument_id;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_instrument_insert
+        AFTER INSERT ON measurement
+        BEGIN''' + CATALOG_ADD_NEW + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_instrument_delete
+        AFTER DELETE ON measurement
+        BEGIN''' + CATALOG_REMOVE_OLD + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_instrument_update
+        AFTER UPDATE OF type_id, instrument_id, measure_time ON measurement
+        BEGIN''' + CATALOG_REMOVE_OLD + CATALOG_ADD_NEW + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_instrument_version_insert
+        AFTER INSERT ON instrument
+        BEGIN''' + CATALOG_BUMP_VERSION + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_instrument_version_update
+        AFTER UPDATE ON instrument
+        BEGIN''' + CATALOG_BUMP_VERSION + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_instrument_version_delete
+        AFTER DELETE ON instrument
+        BEGIN''' + CATALOG_BUMP_VERSION + '''        END;
+    '''),
+    (6, '按监测类型的统计计数器', '''
+        CREATE TABLE IF NOT EXISTS measurement_stats (
+            type_id INTEGER PRIMARY KEY,
+            row_count INTEGER NOT NULL,
+            value_count INTEGER NOT NULL,
+            value_sum REAL NOT NULL,
+            first_time TEXT,
+            last_time TEXT
+        );
+
+        INSERT OR IGNORE INTO measurement_stats (type_id, row_count, value_count, value_sum, first_time, last_time)
+        SELECT type_id, COUNT(*), COUNT(value), TOTAL(value), MIN(measure_time), MAX(measure_time)
+        FROM measurement
+        GROUP BY type_id;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_stats_insert
+        AFTER INSERT ON measurement
+        BEGIN''' + STATS_ADD_NEW + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_stats_delete
+        AFTER DELETE ON measurement
+        BEGIN''' + STATS_REMOVE_OLD + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_stats_update
+        AFTER UPDATE OF type_id, measure_time, value ON measurement
+        BEGIN''' + STATS_REMOVE_OLD + STATS_ADD_NEW + '''        END;
+    '''),
+    (7, '整数时间列 measure_ts 及时间索引', '''
+        -- 统一 measure_time 的格式（带时区的转换为UTC），与已有记录冲突的保持原样
+        UPDATE OR IGNORE measurement SET measure_time = datetime(measure_time)
+        WHERE datetime(measure_time) IS NOT NULL AND datetime(measure_time) != measure_time;
+
+        -- measure_time 换算的UTC秒，无法解析的时间为NULL。使用普通列而不是生成列：
+        -- SQLite不把生成列上的索引当作覆盖索引，按时间范围读取值时需要回表
+        ALTER TABLE measurement ADD COLUMN measure_ts INTEGER;
+
+        UPDATE measurement SET measure_ts = CAST(strftime('%s', measure_time) AS INTEGER);
+
+        -- 批量写入在INSERT中直接计算 measure_ts，其他写入（及不一致的值）由触发器补齐
+        CREATE TRIGGER IF NOT EXISTS trg_measure_ts_insert
+        AFTER INSERT ON measurement
+        WHEN NEW.measure_ts IS NOT CAST(strftime('%s', NEW.measure_time) AS INTEGER)
+        BEGIN''' + MEASURE_TS_SYNC + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measure_ts_update
+        AFTER UPDATE OF measure_time, measure_ts ON measurement
+        WHEN NEW.measure_ts IS NOT CAST(strftime('%s', NEW.measure_time) AS INTEGER)
+        BEGIN''' + MEASURE_TS_SYNC + '''        END;
+
+        CREATE INDEX IF NOT EXISTS idx_measurement_instrument_ts
+            ON measurement (instrument_id, measure_ts, value);
+
+        CREATE INDEX IF NOT EXISTS idx_measurement_type_ts
+            ON measurement (type_id, measure_ts, value);
+
+        CREATE INDEX IF NOT EXISTS idx_measurement_ts_value
+            ON measurement (measure_ts, value);
+
+        -- 范围过滤和排序改用 measure_ts，按 measure_time 的索引不再需要
+        DROP INDEX IF EXISTS idx_measurement_instrument_time;
+        DROP INDEX IF EXISTS idx_measurement_type_time;
+        DROP INDEX IF EXISTS idx_measurement_time_value;
+
+        ANALYZE;
+    '''),
+    (8, '按年归档的只读分区', '''
+        INSERT OR IGNORE INTO data_version (scope, version) VALUES ('partition', 0);
+
+        -- 已归档年份的分区文件，path 相对于主数据库所在目录
+        CREATE TABLE IF NOT EXISTS measurement_partition (
+            partition_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            year INTEGER NOT NULL UNIQUE,
+            path TEXT NOT NULL,
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_partition_version_insert
+        AFTER INSERT ON measurement_partition
+        BEGIN''' + PARTITION_BUMP_VERSION + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_partition_version_delete
+        AFTER DELETE ON measurement_partition
+        BEGIN''' + PARTITION_BUMP_VERSION + PARTITION_EXTENT_DELETE + '''        END;
+
+        -- 每个分区内各 (仪器, 监测类型) 的记录数和首末时间，删除热数据中的首末记录时据此保留归档部分的首末时间
+        CREATE TABLE IF NOT EXISTS partition_extent (
+            partition_id INTEGER NOT NULL,
+            instrument_id TEXT NOT NULL,
+            type_id INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            first_time TEXT,
+            last_time TEXT,
+            PRIMARY KEY (instrument_id, type_id, partition_id)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_partition_extent_type ON partition_extent(type_id);
+
+        DROP TRIGGER IF EXISTS trg_measurement_instrument_delete;
+        CREATE TRIGGER trg_measurement_instrument_delete
+        AFTER DELETE ON measurement
+        BEGIN''' + CATALOG_REMOVE_OLD_ARCHIVED + '''        END;
+
+        DROP TRIGGER IF EXISTS trg_measurement_instrument_update;
+        CREATE TRIGGER trg_measurement_instrument_update
+        AFTER UPDATE OF type_id, instrument_id, measure_time ON measurement
+        BEGIN''' + CATALOG_REMOVE_OLD_ARCHIVED + CATALOG_ADD_NEW + '''        END;
+
+        DROP TRIGGER IF EXISTS trg_measurement_stats_delete;
+        CREATE TRIGGER trg_measurement_stats_delete
+        AFTER DELETE ON measurement
+        BEGIN''' + STATS_REMOVE_OLD_ARCHIVED + '''        END;
+
+        DROP TRIGGER IF EXISTS trg_measurement_stats_update;
+        CREATE TRIGGER trg_measurement_stats_update
+        AFTER UPDATE OF type_id, measure_time, value ON measurement
+        BEGIN''' + STATS_REMOVE_OLD_ARCHIVED + STATS_ADD_NEW + '''        END;
+
+        -- 归档截止时间之前的数据只在分区中，measurement 只接受更新的记录
+        CREATE TRIGGER IF NOT EXISTS trg_partition_guard_insert
+        BEFORE INSERT ON measurement
+        WHEN CAST(strftime('%s', NEW.measure_time) AS INTEGER) <= (SELECT MAX(end_ts) FROM measurement_partition)
+        BEGIN''' + PARTITION_GUARD + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_partition_guard_update
+        BEFORE UPDATE OF measure_time ON measurement
+        WHEN CAST(strftime('%s', NEW.measure_time) AS INTEGER) <= (SELECT MAX(end_ts) FROM measurement_partition)
+        BEGIN''' + PARTITION_GUARD + '''        END;
+    '''),
+    (9, '列式冷存储分区', '''
+        -- sqlite: measurement_<年份>.db；columnar: measurement_<年份>.col 目录（见 storage/columnar.py）
+        ALTER TABLE measurement_partition ADD COLUMN format TEXT NOT NULL DEFAULT 'sqlite';
+
+        CREATE TRIGGER IF NOT EXISTS trg_partition_version_update
+        AFTER UPDATE ON measurement_partition
+        BEGIN''' + PARTITION_BUMP_VERSION + '''        END;
+    '''),
+    (10, '测量记录修改版本号', '''
+        INSERT OR IGNORE INTO data_version (scope, version) VALUES ('measurement', 0);
+
+        -- 与派生表触发器同名前缀，全量导入暂停触发器后由 rebuild_derived 递增版本号
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_version_update
+        AFTER UPDATE ON measurement
+        BEGIN''' + MEASUREMENT_BUMP_VERSION + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_measurement_version_delete
+        AFTER DELETE ON measurement
+        BEGIN''' + MEASUREMENT_BUMP_VERSION + '''        END;
+    '''),
+    (11, '监测类型版本号', '''
+        INSERT OR IGNORE INTO data_version (scope, version) VALUES ('type', 0);
+
+        CREATE TRIGGER IF NOT EXISTS trg_type_version_insert
+        AFTER INSERT ON monitoring_type
+        BEGIN''' + TYPE_BUMP_VERSION + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_type_version_update
+        AFTER UPDATE ON monitoring_type
+        BEGIN''' + TYPE_BUMP_VERSION + '''        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_type_version_delete
+        AFTER DELETE ON monitoring_type
+        BEGIN''' + TYPE_BUMP_VERSION + '''        END;
+    '''),
+]
+
+SCHEMA_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+def split_statements(script):
+    """把SQL脚本拆成单条语句（触发器中的分号不会被拆开）"""
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        if not buffer and line.strip().startswith('--'):
+            continue
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ''
+    if buffer.strip():
+        statements.append(buffer.strip())
+    return statements
+
+def applied_versions(conn):
+    """返回已执行的迁移版本号集合"""
+    conn.execute(SCHEMA_TABLE)
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+def current_version(conn):
+    """返回数据库当前的迁移版本号（未执行任何迁移时为0）"""
+    return max(applied_versions(conn), default=0)
+
+def migrate(conn, target=None):
+    """执行未应用的迁移，返回本次执行的版本号列表
+
+    每个迁移在 BEGIN IMMEDIATE 事务中执行并重新检查版本，
+    多个worker进程同时启动时只有一个会执行同一个迁移。
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    applied = []
+    try:
+        done = applied_versions(conn)
+        for version, description, script in MIGRATIONS:
+            if target is not None and version > target:
+                break
+            if version in done:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if version in applied_versions(conn):
+                    conn.execute('COMMIT')
+                    continue
+                for statement in split_statements(script):
+                    conn.execute(statement)
+                conn.execute(
+                    'INSERT INTO schema_migrations (version, description) VALUES (?, ?)',
+                    (version, description)
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            applied.append(version)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
+
+def migration_status(conn):
+    """返回各迁移的 (版本号, 说明, 执行时间)，未执行的执行时间为None"""
+    conn.execute(SCHEMA_TABLE)
+    applied = dict(conn.execute('SELECT version, applied_at FROM schema_migrations').fetchall())
+    return [(version, description, applied.get(version)) for version, description, _ in MIGRATIONS]
+
+def migrate_database(db_path=None, target=None):
+    """打开数据库并执行未应用的迁移，返回本次执行的版本号列表"""
+    conn = configure_connection(sqlite3.connect(db_path or StorageConfig.DB_PATH))
+    try:
+        return migrate(conn, target)
+    finally:
+        conn.close()
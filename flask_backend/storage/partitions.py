@@ -0,0 +1,503 @@
+"""
+分区模块 - 把已结束年份的测量记录按年归档为只读的SQLite文件，查询时按时间范围裁剪分区
+
+measurement 表只保存归档截止时间之后的热数据，截止时间之前的每个年份一个分区文件
+（measurement_<年份>.db，表结构和索引与 measurement 相同），登记在 measurement_partition 表中（见迁移8）。
+分区只能从最早的年份开始依次归档、从最新的分区开始依次恢复，热数据总比所有分区新，
+按时间倒序读取时依次查询热数据和各分区，取够需要的行数即停止，不需要同时挂载全部分区。
+派生表（汇总表、仪器目录、统计计数器）始终覆盖包括分区在内的全部历史，归档和恢复时不变。
+SQLite分区可以再转换为列式分区（见 columnar.py，迁移9的 format 列），读取时内存映射，在Python中过滤合并。
+"""
+import os
+import shutil
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+from urllib.parse import quote
+from .catalog import aggregate_catalog, data_version
+from .columnar import ColumnarPartition, directory_size, write_partition
+from .config import StorageConfig
+from .derived import aggregate_derived, restore_triggers, suspend_triggers
+from .epoch import from_epoch, to_epoch
+
+# 分区文件和 measurement 表共有的列
+PARTITION_COLUMNS = 'id, type_id, instrument_id, measure_time, value, water_level, created_at, updated_at, measure_ts'
+
+# 分区文件的表结构，{schema} 为挂载名
+PARTITION_SCHEMA = '''
+    CREATE TABLE {schema}.measurement (
+        id INTEGER PRIMARY KEY,
+        type_id INTEGER NOT NULL,
+        instrument_id TEXT NOT NULL,
+        measure_time TEXT NOT NULL,
+        value REAL,
+        water_level REAL,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP,
+        measure_ts INTEGER
+    );
+    CREATE UNIQUE INDEX {schema}.ux_measurement_key ON measurement (type_id, instrument_id, measure_time);
+    CREATE INDEX {schema}.idx_measurement_instrument_ts ON measurement (instrument_id, measure_ts, value);
+    CREATE INDEX {schema}.idx_measurement_type_ts ON measurement (type_id, measure_ts, value);
+    CREATE INDEX {schema}.idx_measurement_ts_value ON measurement (measure_ts, value);
+'''
+
+# 归档、恢复和校验时临时挂载分区文件用的名称
+WORK_SCHEMA = 'archive'
+
+Partition = namedtuple('Partition', 'partition_id year path start_ts end_ts row_count archived_at format')
+
+# GET /api/measurements 的过滤条件，列式分区按它在Python中过滤；cursor 为上一页最后一条的 (measure_ts, id)，
+# keyset 为True时按 (measure_ts, id) 倒序排序
+MeasurementScan = namedtuple('MeasurementScan', 'type_id instrument_id start_ts end_ts cursor keyset')
+
+def year_bounds(year):
+    """返回年份的 (起始UTC秒, 结束UTC秒)，两端都包含"""
+    return to_epoch(datetime(year, 1, 1)), to_epoch(datetime(year + 1, 1, 1)) - 1
+
+def database_directory(conn):
+    """返回连接的主数据库文件所在目录"""
+    for _, name, path in conn.execute('PRAGMA database_list'):
+        if name == 'main':
+            return os.path.dirname(path)
+    raise ValueError('无法确定主数据库的路径')
+
+def list_partitions(conn):
+    """返回已登记的分区，按年份从新到旧，path 为绝对路径"""
+    directory = database_directory(conn)
+    rows = conn.execute(f'''
+        SELECT {', '.join(Partition._fields)} FROM measurement_partition ORDER BY year DESC
+    ''').fetchall()
+    return [
+        Partition(*row[:2], os.path.join(directory, row[2]), *row[3:])
+        for row in rows
+    ]
+
+def archived_until(conn):
+    """返回最新分区的结束时间（UTC秒），此前的记录只读；没有分区时为None"""
+    return conn.execute('SELECT MAX(end_ts) FROM measurement_partition').fetchone()[0]
+
+def autocommit(conn):
+    """切换为手动管理事务（ATTACH/DETACH 不能在事务中执行），返回原来的 isolation_level"""
+    if conn.in_transaction:
+        raise ValueError('归档和恢复分区需要在事务之外执行')
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    return isolation_level
+
+def remove_database_file(path):
+    """删除数据库文件及其日志文件"""
+    for suffix in ('', '-journal', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def partition_size(partition):
+    """返回分区文件（列式分区为目录中的文件）的总字节数"""
+    if partition.format == 'columnar':
+        return directory_size(partition.path)
+    return os.path.getsize(partition.path)
+
+def remove_partition_files(partition):
+    """删除分区文件（列式分区为整个目录）"""
+    if partition.format == 'columnar':
+        shutil.rmtree(partition.path, ignore_errors=True)
+    else:
+        remove_database_file(partition.path)
+
+def archive_year(conn, year, directory=None):
+    """把 measurement 中一个已结束年份的记录移到分区文件，返回归档的行数
+
+    先在分区文件中写入副本，再在主数据库的一个事务中删除原记录并登记分区。
+    删除时暂停派生表的触发器，派生表保持不变；同时在 partition_extent 中登记分区内各仪器的首末时间，
+    供派生表的触发器在删除热数据中的首末记录时使用。中途失败时主数据库不变，残留的分区文件在下次归档时覆盖。
+    """
+    if year >= datetime.now(timezone.utc).year:
+        raise ValueError(f'{year} 年尚未结束，不能归档')
+    if conn.execute('SELECT 1 FROM measurement_partition WHERE year = ?', (year,)).fetchone():
+        raise ValueError(f'{year} 年已归档')
+    start_ts, end_ts = year_bounds(year)
+    older = conn.execute('SELECT COUNT(*) FROM measurement WHERE measure_ts < ?', (start_ts,)).fetchone()[0]
+    if older:
+        raise ValueError(f'{year} 年之前还有 {older} 条未归档的记录，需要从最早的年份开始依次归档')
+
+    directory = directory or StorageConfig.PARTITION_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.abspath(os.path.join(directory, f'measurement_{year}.db'))
+    remove_database_file(path)
+
+    isolation_level = autocommit(conn)
+    registered = False
+    try:
+        conn.execute('ATTACH DATABASE ? AS ' + WORK_SCHEMA, (path,))
+        try:
+            copied = copy_year(conn, start_ts, end_ts)
+            if not copied:
+                raise ValueError(f'{year} 年没有测量记录')
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                suspended = suspend_triggers(conn)
+                deleted = conn.execute(
+                    'DELETE FROM main.measurement WHERE measure_ts >= ? AND measure_ts <= ?',
+                    (start_ts, end_ts)
+                ).rowcount
+                restore_triggers(conn, suspended)
+                if deleted != copied:
+                    raise ValueError(f'归档期间 {year} 年的记录发生了变化，请重试')
+                partition_id = conn.execute('''
+                    INSERT INTO measurement_partition (year, path, start_ts, end_ts, row_count)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (year, os.path.relpath(path, database_directory(conn)), start_ts, end_ts, copied)).lastrowid
+                conn.executemany(
+                    'INSERT INTO partition_extent VALUES (?, ?, ?, ?, ?, ?)',
+                    [(partition_id,) + tuple(row) for row in aggregate_catalog(conn, f'{WORK_SCHEMA}.measurement')]
+                )
+                conn.execute('COMMIT')
+                registered = True
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.execute('DETACH DATABASE ' + WORK_SCHEMA)
+    except BaseException:
+        if not registered:
+            remove_database_file(path)
+        raise
+    finally:
+        conn.isolation_level = isolation_level
+    # 分区文件只读，读连接以 immutable 方式挂载
+    os.chmod(path, 0o444)
+    return copied
+
+def copy_year(conn, start_ts, end_ts):
+    """在挂载的空分区文件中建表并写入时间范围内的记录，返回行数"""
+    conn.execute('BEGIN')
+    try:
+        for statement in PARTITION_SCHEMA.format(schema=WORK_SCHEMA).split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        copied = conn.execute(f'''
+            INSERT INTO {WORK_SCHEMA}.measurement ({PARTITION_COLUMNS})
+            SELECT {PARTITION_COLUMNS} FROM main.measurement
+            WHERE measure_ts >= ? AND measure_ts <= ?
+            ORDER BY measure_ts
+        ''', (start_ts, end_ts)).rowcount
+        conn.execute(f'ANALYZE {WORK_SCHEMA}')
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return copied
+
+def archive_before(conn, year, directory=None):
+    """从最早的年份开始依次归档 year 之前的全部年份，返回 [(年份, 行数)]"""
+    archived = []
+    while True:
+        first = conn.execute('SELECT MIN(measure_ts) FROM measurement').fetchone()[0]
+        if first is None:
+            break
+        first_year = int(from_epoch(first)[:4])
+        if first_year >= year:
+            break
+        archived.append((first_year, archive_year(conn, first_year, directory)))
+    return archived
+
+def restore_partition(conn):
+    """把最新的分区移回 measurement 并删除分区文件，返回 (年份, 行数)；没有分区时返回None"""
+    partitions = list_partitions(conn)
+    if not partitions:
+        return None
+    partition = partitions[0]
+    columnar = partition.format == 'columnar'
+
+    isolation_level = autocommit(conn)
+    try:
+        if not columnar:
+            conn.execute('ATTACH DATABASE ? AS ' + WORK_SCHEMA, (partition.path,))
+    except BaseException:
+        conn.isolation_level = isolation_level
+        raise
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 先注销分区，保护触发器才允许把记录写回 measurement
+            conn.execute('DELETE FROM measurement_partition WHERE year = ?', (partition.year,))
+            suspended = suspend_triggers(conn)
+            if columnar:
+                restored = conn.executemany(f'''
+                    INSERT INTO main.measurement ({PARTITION_COLUMNS}) VALUES ({', '.join('?' * 9)})
+                ''', ColumnarPartition(partition.path).iter_rows()).rowcount
+            else:
+                restored = conn.execute(f'''
+                    INSERT INTO main.measurement ({PARTITION_COLUMNS})
+                    SELECT {PARTITION_COLUMNS} FROM {WORK_SCHEMA}.measurement
+                ''').rowcount
+            restore_triggers(conn, suspended)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        if not columnar:
+            conn.execute('DETACH DATABASE ' + WORK_SCHEMA)
+        conn.isolation_level = isolation_level
+    remove_partition_files(partition)
+    return partition.year, restored
+
+def compact_partition(conn, partition):
+    """把SQLite分区转换为列式分区，返回 (行数, 转换前字节数, 转换后字节数)
+
+    先在临时目录写好列式文件并核对行数，再在一个事务中把登记改为列式分区，最后删除SQLite文件。
+    """
+    if partition.format == 'columnar':
+        raise ValueError(f'{partition.year} 年已是列式分区')
+    directory = os.path.splitext(partition.path)[0] + '.col'
+    staging = directory + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    isolation_level = autocommit(conn)
+    try:
+        conn.execute('ATTACH DATABASE ? AS ' + WORK_SCHEMA, (partition.path,))
+        try:
+            written = write_partition(staging, conn.execute(f'''
+                SELECT {PARTITION_COLUMNS} FROM {WORK_SCHEMA}.measurement
+                ORDER BY type_id, instrument_id, measure_ts
+            '''))
+        finally:
+            conn.execute('DETACH DATABASE ' + WORK_SCHEMA)
+        if written != partition.row_count:
+            raise ValueError(f'{partition.year} 年分区的行数不一致：登记 {partition.row_count}，写入 {written}')
+        for entry in os.scandir(staging):
+            os.chmod(entry.path, 0o444)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(staging, directory)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('''
+                UPDATE measurement_partition SET path = ?, format = 'columnar' WHERE partition_id = ?
+            ''', (os.path.relpath(directory, database_directory(conn)), partition.partition_id))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        conn.isolation_level = isolation_level
+    before = os.path.getsize(partition.path)
+    remove_database_file(partition.path)
+    return written, before, directory_size(directory)
+
+def compact_partitions(conn):
+    """把全部SQLite分区转换为列式分区，返回 [(年份, 行数, 转换前字节数, 转换后字节数)]"""
+    return [
+        (partition.year,) + compact_partition(conn, partition)
+        for partition in reversed(list_partitions(conn))
+        if partition.format != 'columnar'
+    ]
+
+def partition_aggregates(conn):
+    """依次挂载各分区计算派生行，返回 {表名: 行列表}，用于 rebuild_derived / check_derived
+
+    列式分区的记录先写入临时的内存数据库，再用同样的SQL计算。需要在事务之外调用（挂载分区不能在事务中进行）。
+    """
+    results = {}
+    for partition in list_partitions(conn):
+        if partition.format == 'columnar':
+            conn.execute(f"ATTACH DATABASE ':memory:' AS {WORK_SCHEMA}")
+        else:
+            conn.execute('ATTACH DATABASE ? AS ' + WORK_SCHEMA, (partition.path,))
+        try:
+            if partition.format == 'columnar':
+                load_columnar(conn, partition)
+            for name, rows in aggregate_derived(conn, f'{WORK_SCHEMA}.measurement').items():
+                results.setdefault(name, []).extend(rows)
+        finally:
+            conn.execute('DETACH DATABASE ' + WORK_SCHEMA)
+    return results
+
+def load_columnar(conn, partition):
+    """把列式分区的记录写入挂载的空内存数据库"""
+    conn.execute('BEGIN')
+    for statement in PARTITION_SCHEMA.format(schema=WORK_SCHEMA).split(';'):
+        if statement.strip():
+            conn.execute(statement)
+    conn.executemany(f'''
+        INSERT INTO {WORK_SCHEMA}.measurement ({PARTITION_COLUMNS}) VALUES ({', '.join('?' * 9)})
+    ''', ColumnarPartition(partition.path).iter_rows())
+    conn.execute('COMMIT')
+
+def fetch_ordered(conn, tables, query, params, limit, offset=0, scan=None):
+    """依次在各表上执行按时间倒序的 query，取够 limit 条后停止，返回行列表
+
+    tables 为 PartitionRouter.sources 的结果（按时间从新到旧、时间互不重叠），
+    query 中用 {table} 表示测量记录表，末尾不带 LIMIT。offset 落在后面的表时，
+    前面的表按 COUNT(*) 整体跳过。limit 为负数时与SQLite一样不限制行数。
+    列式分区按 scan（与 query 等价的 MeasurementScan）过滤，返回记录字典。
+    """
+    rows = []
+    if limit == 0:
+        return rows
+    for table in tables:
+        remaining = limit - len(rows) if limit > 0 else -1
+        if isinstance(table, ColumnarPartition):
+            page, matched = table.fetch(conn, scan, remaining, offset)
+        else:
+            sql = query.format(table=table)
+            page = conn.execute(sql + ' LIMIT ? OFFSET ?', params + [remaining, offset]).fetchall()
+            if offset and not page:
+                matched = conn.execute(f'SELECT COUNT(*) FROM ({sql})', params).fetchone()[0]
+        if offset and not page:
+            offset -= matched
+            continue
+        offset = 0
+        rows += page
+        if 0 < limit <= len(rows):
+            break
+    return rows
+
+def fetch_batch(conn, queries):
+    """在一条 UNION ALL 语句中执行多个分页查询，返回各查询的行列表
+
+    queries 为 (query, params, limit, offset) 列表，query 中的表名已确定、末尾不带 LIMIT；
+    每个查询作为带 LIMIT/OFFSET 的子查询，仍按各自的索引读取，多出的第一列为查询的下标。
+    """
+    parts, params = [], []
+    for number, (query, query_params, limit, offset) in enumerate(queries):
+        parts.append(f'SELECT {number} AS batch_index, * FROM ({query} LIMIT ? OFFSET ?)')
+        params += list(query_params) + [limit, offset]
+    pages = [[] for _ in queries]
+    if parts:
+        for row in conn.execute(' UNION ALL '.join(parts), params).fetchall():
+            pages[row[0]].append(row)
+    return pages
+
+class PartitionRouter:
+    """进程内的分区路由
+
+    分区列表按 data_version 中 partition 的版本号缓存（每次读取一次主键查找）；
+    sources() 按时间范围裁剪分区，并在连接上按需挂载用到的分区：读连接以 mode=ro&immutable=1
+    只读挂载，每个连接最多同时挂载 max_attached 个分区，已注销的分区在下次使用连接时卸载。
+    列式分区不挂载，每个进程按分区缓存一个 ColumnarPartition（序列文件内存映射），随版本号失效。
+    """
+
+    SCHEMA_PREFIX = 'part_'
+
+    def __init__(self, scope='partition', readonly=True, max_attached=None):
+        self.scope = scope
+        self.readonly = readonly
+        self.max_attached = max_attached or StorageConfig.PARTITION_MAX_ATTACHED
+        self._lock = threading.Lock()
+        self._version = None
+        self._partitions = None
+        self._columnar = {}
+        self._stats = {'queries': 0, 'pruned': 0, 'attaches': 0, 'detaches': 0, 'mapped': 0}
+
+    def partitions(self, conn):
+        """返回已登记的分区，按年份从新到旧"""
+        version = data_version(conn, self.scope)
+        with self._lock:
+            if self._partitions is not None and version == self._version:
+                return self._partitions
+        partitions = list_partitions(conn) if version else []
+        with self._lock:
+            if version != self._version:
+                self._columnar = {}
+            self._version = version
+            self._partitions = partitions
+        return partitions
+
+    def archived_until(self, conn):
+        """返回归档截止时间（最新分区的结束时间，UTC秒），没有分区时为None"""
+        partitions = self.partitions(conn)
+        return partitions[0].end_ts if partitions else None
+
+    def sources(self, conn, start_ts=None, end_ts=None, oldest_first=False):
+        """返回与时间范围 [start_ts, end_ts] 相交的测量记录表名，按时间从新到旧（oldest_first 时从旧到新）
+
+        热数据为 measurement，SQLite分区为 <挂载名>.measurement，列式分区为 ColumnarPartition 对象。
+        分区在迭代到时才挂载，调用方取够数据提前停止时不会挂载更早的分区。
+        """
+        partitions = self.partitions(conn)
+        if not partitions:
+            return iter(['measurement'])
+        selected = [
+            partition for partition in partitions
+            if (start_ts is None or partition.end_ts >= start_ts)
+            and (end_ts is None or partition.start_ts <= end_ts)
+        ]
+        include_hot = end_ts is None or end_ts > partitions[0].end_ts
+        with self._lock:
+            self._stats['queries'] += 1
+            self._stats['pruned'] += len(partitions) - len(selected)
+        return self._iter_sources(conn, partitions, selected, include_hot, oldest_first)
+
+    def _iter_sources(self, conn, partitions, selected, include_hot, oldest_first):
+        if include_hot and not oldest_first:
+            yield 'measurement'
+        if selected:
+            self._detach_stale(conn, partitions)
+        for partition in reversed(selected) if oldest_first else selected:
+            if partition.format == 'columnar':
+                yield self._mapped(partition)
+            else:
+                yield self._attach(conn, partition) + '.measurement'
+        if include_hot and oldest_first:
+            yield 'measurement'
+
+    def _mapped(self, partition):
+        with self._lock:
+            columnar = self._columnar.get(partition.partition_id)
+        if columnar is None:
+            columnar = ColumnarPartition(partition.path)
+            with self._lock:
+                self._columnar[partition.partition_id] = columnar
+                self._stats['mapped'] += 1
+        return columnar
+
+    def _schema(self, partition):
+        return f'{self.SCHEMA_PREFIX}{partition.partition_id}'
+
+    def _attached(self, conn):
+        return [
+            name for _, name, _ in conn.execute('PRAGMA database_list')
+            if name.startswith(self.SCHEMA_PREFIX)
+        ]
+
+    def _detach(self, conn, schema):
+        conn.execute(f'DETACH DATABASE "{schema}"')
+        with self._lock:
+            self._stats['detaches'] += 1
+
+    def _detach_stale(self, conn, partitions):
+        """卸载已注销（恢复、重新归档或转换为列式）的分区"""
+        current = {self._schema(partition) for partition in partitions if partition.format != 'columnar'}
+        for schema in self._attached(conn):
+            if schema not in current:
+                self._detach(conn, schema)
+
+    def _attach(self, conn, partition):
+        schema = self._schema(partition)
+        attached = self._attached(conn)
+        if schema in attached:
+            return schema
+        # 挂载数达到上限时卸载最早挂载的分区
+        for old in attached[:max(0, len(attached) - self.max_attached + 1)]:
+            self._detach(conn, old)
+        if self.readonly:
+            target = 'file:' + quote(partition.path) + '?mode=ro&immutable=1'
+        else:
+            target = partition.path
+        conn.execute(f'ATTACH DATABASE ? AS "{schema}"', (target,))
+        with self._lock:
+            self._stats['attaches'] += 1
+        return schema
+
+    def metrics(self):
+        """返回路由指标"""
+        with self._lock:
+            return dict(
+                self._stats,
+                version=self._version,
+                partitions=len(self._partitions or [])
+            )
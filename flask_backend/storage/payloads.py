@@ -0,0 +1,88 @@
+"""
+响应格式模块 - GET /api/measurements 的列式表示，按请求头 Accept 协商
+
+默认的JSON响应每条记录一个对象，type_name、unit、instrument_id 等键和值在每条记录中重复。列式表示把记录拆成
+按行对齐的并列数组，(监测类型, 仪器) 的元数据在 series 中只出现一次，每行用 series_index 引用：
+- 列式JSON（COLUMNAR_JSON）：{rows, series, series_index, id, measure_ts, value, water_level}，NULL为null
+- 二进制（COLUMNAR_BINARY）：MAGIC + 头部长度（uint64）+ UTF-8 JSON头部（rows、series 和各列的
+  dtype/offset/count），之后是按8字节对齐的小端数组：series_index int32、id int64、measure_ts int64、
+  value float64、water_level float64（NULL为NaN），浏览器中可以直接用 TypedArray 读取
+行的顺序与JSON响应相同；时间为UTC秒（measure_ts），不包含 measure_time 字符串和 created_at、updated_at。
+"""
+import json
+import struct
+import numpy as np
+
+COLUMNAR_JSON = 'application/vnd.smartwater.columnar+json'
+COLUMNAR_BINARY = 'application/vnd.smartwater.columnar'
+
+MAGIC = b'SWCOL\x01\x00\x00'
+
+# 二进制表示的各列，按此顺序排列
+BINARY_COLUMNS = [
+    ('series_index', '<i4'),
+    ('id', '<i8'),
+    ('measure_ts', '<i8'),
+    ('value', '<f8'),
+    ('water_level', '<f8'),
+]
+
+def padding(size, alignment=8):
+    return -size % alignment
+
+def columnar_columns(rows):
+    """把记录（sqlite3.Row 或字典）拆成 (series, 各列的列表)，series 为首次出现顺序的序列元数据"""
+    series, numbers = [], {}
+    columns = {name: [] for name, _ in BINARY_COLUMNS}
+    for row in rows:
+        key = (row['type_id'], row['instrument_id'])
+        number = numbers.get(key)
+        if number is None:
+            number = numbers[key] = len(series)
+            series.append({
+                'type_id': row['type_id'], 'type_name': row['type_name'], 'unit': row['unit'],
+                'instrument_id': row['instrument_id']
+            })
+        columns['series_index'].append(number)
+        columns['id'].append(row['id'])
+        columns['measure_ts'].append(row['measure_ts'])
+        columns['value'].append(row['value'])
+        columns['water_level'].append(row['water_level'])
+    return series, columns
+
+def encode_columnar_json(rows, meta=None):
+    """编码为列式JSON，meta 中的键（如 next_cursor）加在顶层"""
+    series, columns = columnar_columns(rows)
+    payload = dict(meta or {}, rows=len(columns['id']), series=series, **columns)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def encode_columnar_binary(rows, meta=None):
+    """编码为二进制列式表示，meta 中的键加在头部"""
+    series, columns = columnar_columns(rows)
+    size = len(columns['id'])
+    buffers, layout, offset = [], [], 0
+    for name, dtype in BINARY_COLUMNS:
+        values = columns[name]
+        if dtype == '<f8':
+            values = [np.nan if value is None else value for value in values]
+        data = np.asarray(values, dtype=dtype).tobytes()
+        layout.append({'name': name, 'dtype': dtype, 'offset': offset, 'count': size})
+        buffers += [data, bytes(padding(len(data)))]
+        offset += len(data) + padding(len(data))
+    header = json.dumps(dict(meta or {}, rows=size, series=series, columns=layout), ensure_ascii=False).encode('utf-8')
+    header += b' ' * padding(len(header))
+    return b''.join([MAGIC, struct.pack('<Q', len(header)), header] + buffers)
+
+def decode_columnar_binary(body):
+    """解码二进制列式表示，返回 (头部, {列名: numpy数组})"""
+    if body[:len(MAGIC)] != MAGIC:
+        raise ValueError('不是列式响应')
+    length = struct.unpack_from('<Q', body, len(MAGIC))[0]
+    start = len(MAGIC) + 8
+    header = json.loads(body[start:start + length].decode('utf-8'))
+    data = start + length
+    columns = {
+        column['name']: np.frombuffer(body, column['dtype'], column['count'], data + column['offset'])
+        for column in header['columns']
+    }
+    return header, columns
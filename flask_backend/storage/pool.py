@@ -0,0 +1,206 @@
+"""
+数据库连接池模块
+"""
+import os
+import sqlite3
+import threading
+import time
+from flask import g, has_app_context
+from .pragmas import configure_connection, connect_readonly, set_journal_mode
+
+
+class PooledConnection:
+    """连接代理：close() 把连接归还连接池而不是真正关闭"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+
+class RequestConnection(PooledConnection):
+    """请求范围内共享的连接：close() 为空操作，请求结束时统一归还"""
+
+    def close(self):
+        pass
+
+    def release(self):
+        PooledConnection.close(self)
+
+
+class ConnectionPool:
+    """每个worker进程一个的SQLite连接池
+
+    连接长期复用，sqlite3按连接缓存预编译语句（cached_statements），
+    空闲过久的连接取出时先执行 SELECT 1 检查；fork后的子进程会丢弃继承的连接。
+    readonly=True 时以只读方式打开连接，写入统一交给写入队列的专用连接。
+    """
+
+    def __init__(self, db_path, size=8, cached_statements=256, health_check_interval=30,
+                 timeout=10, readonly=False, journal_mode=None):
+        self.db_path = db_path
+        self.size = size
+        self.readonly = readonly
+        self.journal_mode = journal_mode
+        self._trace_callback = None
+        self.cached_statements = cached_statements
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._open = 0
+        self._stats = {'checkouts': 0, 'created': 0, 'discarded': 0, 'waits': 0}
+        self._journal_checked = False
+
+    def _connect(self):
+        if not self._journal_checked:
+            # 只读连接不能切换日志模式，由每个进程第一次建连时设置
+            if self.journal_mode:
+                set_journal_mode(self.db_path, self.journal_mode)
+            self._journal_checked = True
+        if self.readonly:
+            conn = connect_readonly(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            )
+        else:
+            conn = configure_connection(sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=self.cached_statements
+            ))
+        conn.row_factory = sqlite3.Row  # 返回字典格式的结果
+        if self._trace_callback is not None:
+            conn.set_trace_callback(self._trace_callback)
+        return conn
+
+    def _healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """取出一个连接，池中无空闲连接且已达上限时等待"""
+        if self.size <= 0:
+            return self._connect()
+
+        with self._condition:
+            if self._pid != os.getpid():
+                self._reset()
+            self._stats['checkouts'] += 1
+            deadline = time.monotonic() + self.timeout
+            while not self._idle and self._open >= self.size:
+                self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise TimeoutError('数据库连接池已耗尽')
+            if self._idle:
+                conn, idle_since = self._idle.pop()
+            else:
+                conn, idle_since = None, None
+                self._open += 1
+                self._stats['created'] += 1
+
+        if conn is not None and time.monotonic() - idle_since > self.health_check_interval:
+            if not self._healthy(conn):
+                conn.close()
+                with self._condition:
+                    self._stats['discarded'] += 1
+                    self._stats['created'] += 1
+                conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._condition:
+                    self._open -= 1
+                    self._condition.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        """归还连接，未结束的事务会被回滚"""
+        if self.size <= 0:
+            conn.close()
+            return
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            healthy = True
+        except sqlite3.Error:
+            healthy = False
+
+        with self._condition:
+            if self._pid != os.getpid():
+                return
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._open -= 1
+                self._stats['discarded'] += 1
+                conn.close()
+            self._condition.notify()
+
+    def connection(self):
+        """获取连接
+
+        在Flask请求中返回请求范围内共享的连接（认证和数据路由共用同一个），
+        请求结束时归还；请求之外返回close()时归还连接池的连接。
+        """
+        if has_app_context():
+            conn = g.get('_db_connection')
+            if conn is None:
+                conn = g._db_connection = RequestConnection(self, self.acquire())
+            return conn
+        return PooledConnection(self, self.acquire())
+
+    def detached(self):
+        """获取不随请求结束归还的连接（close()时归还），供请求结束后仍在读取的流式响应使用"""
+        return PooledConnection(self, self.acquire())
+
+    def init_app(self, app):
+        """注册请求结束时归还连接的回调"""
+        @app.teardown_appcontext
+        def release_request_connection(exc):
+            conn = g.pop('_db_connection', None)
+            if conn is not None:
+                conn.release()
+
+    def set_trace_callback(self, callback):
+        """为池中所有连接设置SQL跟踪回调（参数为展开后的SQL），None表示取消"""
+        with self._condition:
+            self._trace_callback = callback
+            for conn, _ in self._idle:
+                conn.set_trace_callback(callback)
+
+    def metrics(self):
+        """返回连接池指标"""
+        with self._condition:
+            return dict(
+                self._stats,
+                size=self.size,
+                readonly=self.readonly,
+                open=self._open,
+                idle=len(self._idle)
+            )
@@ -0,0 +1,41 @@
+"""
+SQLite连接设置模块 - 日志模式、缓存和内存映射
+"""
+import os
+import sqlite3
+from urllib.parse import quote
+from .config import StorageConfig
+
+
+def set_journal_mode(db_path, mode=None):
+    """设置数据库的日志模式并返回实际生效的模式
+
+    journal_mode=WAL 记录在数据库文件中，对之后所有连接（包括其他进程）生效；
+    WAL模式下读连接不会被写事务阻塞，写连接也不会等待读连接结束。
+    """
+    mode = mode or StorageConfig.JOURNAL_MODE
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f'PRAGMA busy_timeout = {StorageConfig.BUSY_TIMEOUT_MS}')
+        return conn.execute(f'PRAGMA journal_mode = {mode}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def configure_connection(conn, readonly=False, synchronous=None):
+    """设置连接级PRAGMA（每个连接都需要设置）
+
+    可写连接的同步级别为 synchronous，默认 StorageConfig.SYNCHRONOUS。
+    """
+    conn.execute(f'PRAGMA busy_timeout = {StorageConfig.BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA cache_size = -{StorageConfig.CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {StorageConfig.MMAP_SIZE_MB * 1024 * 1024}')
+    if not readonly:
+        conn.execute(f'PRAGMA synchronous = {synchronous or StorageConfig.SYNCHRONOUS}')
+    return conn
+
+
+def connect_readonly(db_path, **kwargs):
+    """以只读方式打开数据库（mode=ro），误写入会抛出 sqlite3.OperationalError"""
+    uri = 'file:' + quote(os.path.abspath(db_path)) + '?mode=ro'
+    return configure_connection(sqlite3.connect(uri, uri=True, **kwargs), readonly=True)
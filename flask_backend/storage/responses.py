@@ -0,0 +1,100 @@
+"""
+响应缓存模块 - 按数据版本失效的进程内响应缓存，读接口据此返回强ETag和304
+
+缓存键为 (端点, 规范化的查询参数, 角色)，缓存项记录生成时的数据版本。数据版本取 data_version 中
+相关范围的版本号：测量记录的每次写入都会更新仪器目录而递增 catalog，修改和删除递增 measurement，
+归档和恢复递增 partition，监测类型的变化递增 type；全量导入在重建派生表时递增这些版本号。
+带 instrument_id 的查询改用该仪器在目录中的记录数和首末时间代替 catalog，其他仪器的写入不会使其失效。
+"""
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+# 缓存项：生成时的数据版本、强ETag（响应体的哈希）、响应体和MIME类型
+CachedResponse = namedtuple('CachedResponse', 'version etag body mimetype')
+
+# 测量数据类接口依赖的版本范围
+MEASUREMENT_SCOPES = ('catalog', 'measurement', 'partition', 'type')
+
+INSTRUMENT_VERSION_SQL = '''
+    SELECT IFNULL(SUM(row_count), 0), MIN(first_time), MAX(last_time)
+    FROM instrument
+    WHERE instrument_id = ?
+'''
+
+def response_etag(body):
+    """按响应体计算强ETag（不含引号）"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """进程内的LRU响应缓存
+
+    lookup() 只返回与当前数据版本一致的缓存项；版本号只会递增，旧版本的缓存项在下次查找时被替换。
+    超过 max_entry_bytes 的响应不缓存（仍然返回ETag），max_entries 为0时不缓存任何响应。
+    """
+
+    def __init__(self, max_entries=256, max_entry_bytes=1024 * 1024):
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'not_modified': 0, 'evictions': 0, 'uncacheable': 0}
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def version(self, conn, scopes, instrument_id=None):
+        """返回 scopes 中各范围的版本号；传入 instrument_id 时用该仪器的目录记录代替 catalog"""
+        if instrument_id is not None and 'catalog' in scopes:
+            scopes = tuple(scope for scope in scopes if scope != 'catalog')
+            instrument = tuple(conn.execute(INSTRUMENT_VERSION_SQL, (instrument_id,)).fetchone())
+        else:
+            instrument = None
+        placeholders = ', '.join('?' * len(scopes))
+        versions = dict(conn.execute(
+            f'SELECT scope, version FROM data_version WHERE scope IN ({placeholders})', scopes
+        ).fetchall())
+        return tuple(versions.get(scope, 0) for scope in scopes) + (instrument,)
+
+    def lookup(self, key, version):
+        """返回与 version 一致的缓存项，没有时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry
+            self._stats['stale' if entry is not None else 'misses'] += 1
+            return None
+
+    def store(self, key, version, body, mimetype):
+        """保存响应并返回缓存项（响应过大时只返回，不保存）"""
+        entry = CachedResponse(version, response_etag(body), body, mimetype)
+        with self._lock:
+            if len(body) > self.max_entry_bytes:
+                self._stats['uncacheable'] += 1
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+        return entry
+
+    def record_not_modified(self):
+        with self._lock:
+            self._stats['not_modified'] += 1
+
+    def metrics(self):
+        """返回缓存指标"""
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses'] + self._stats['stale']
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                bytes=sum(len(entry.body) for entry in self._entries.values()),
+                hit_rate=round(self._stats['hits'] / lookups, 4) if lookups else None,
+                max_entries=self.max_entries
+            )
@@ -0,0 +1,222 @@
+"""
+汇总表模块 - measurement_rollup 按仪器、时间间隔和时间段保存记录数、值的和、最小值和最大值
+
+汇总表由 measurement 上的触发器增量维护（见迁移4），这里提供全量重建、一致性校验和摘要查询。
+"""
+import itertools
+import json
+from .epoch import parse_time, period_start, to_epoch
+
+# 时间间隔对应的strftime格式，与 rollup_interval 表一致；其他取值按年汇总
+INTERVAL_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-%W',
+    'month': '%Y-%m',
+    'year': '%Y',
+}
+
+# 从测量记录直接计算汇总行
+AGGREGATE_SQL = '''
+    SELECT m.instrument_id, m.type_id, i.interval, IFNULL(strftime(i.format, m.measure_time), '') AS period,
+           COUNT(*), COUNT(m.value), TOTAL(m.value), MIN(m.value), MAX(m.value)
+    FROM {table} m CROSS JOIN rollup_interval i
+    GROUP BY 1, 2, 3, 4
+'''
+
+ROLLUP_COLUMNS = '''
+    instrument_id, type_id, interval, period, row_count, value_count, value_sum, min_value, max_value
+'''
+
+# 把归档分区的汇总行累加到汇总表
+MERGE_SQL = f'''
+    INSERT INTO measurement_rollup ({ROLLUP_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (instrument_id, type_id, interval, period) DO UPDATE SET
+        row_count = row_count + excluded.row_count,
+        value_count = value_count + excluded.value_count,
+        value_sum = value_sum + excluded.value_sum,
+        min_value = CASE WHEN min_value IS NULL OR excluded.min_value < min_value
+                         THEN excluded.min_value ELSE min_value END,
+        max_value = CASE WHEN max_value IS NULL OR excluded.max_value > max_value
+                         THEN excluded.max_value ELSE max_value END
+'''
+
+def aggregate_rollups(conn, table='measurement'):
+    """按指定的测量记录表计算汇总行"""
+    return conn.execute(AGGREGATE_SQL.format(table=table)).fetchall()
+
+def rebuild_rollups(conn, archived=()):
+    """清空并按测量记录重新计算汇总表，返回汇总行数（在调用方的事务中执行）
+
+    archived 为归档分区的汇总行（aggregate_rollups 的结果），累加到 measurement 表的结果上。
+    """
+    conn.execute('DELETE FROM measurement_rollup')
+    conn.execute(f'INSERT INTO measurement_rollup ({ROLLUP_COLUMNS}) {AGGREGATE_SQL.format(table="measurement")}')
+    conn.executemany(MERGE_SQL, archived)
+    return conn.execute('SELECT COUNT(*) FROM measurement_rollup').fetchone()[0]
+
+def check_rollups(conn, tolerance=1e-6, archived=()):
+    """对比汇总表和按测量记录（及归档分区的汇总行）重新计算的结果，返回不一致的描述列表"""
+    expected = {}
+    for row in itertools.chain(aggregate_rollups(conn), archived):
+        merge_totals(expected, tuple(row[:4]), tuple(row[4:]))
+    actual = {
+        tuple(row[:4]): tuple(row[4:])
+        for row in conn.execute(f'SELECT {ROLLUP_COLUMNS} FROM measurement_rollup')
+    }
+    problems = []
+    for key in sorted(expected.keys() - actual.keys()):
+        problems.append(f'缺少汇总行 {key}')
+    for key in sorted(actual.keys() - expected.keys()):
+        problems.append(f'多余的汇总行 {key}: {actual[key]}')
+    for key in sorted(expected.keys() & actual.keys()):
+        if not rollup_values_equal(expected[key], actual[key], tolerance):
+            problems.append(f'汇总行 {key} 不一致: 应为 {expected[key]}，实际 {actual[key]}')
+    return problems
+
+def merge_totals(expected, key, values):
+    """把 (计数和累加值..., 最小值, 最大值) 合并到 expected[key]：前面各项相加，最后两项取最小/最大（忽略NULL）"""
+    known = expected.get(key)
+    if known is not None:
+        low = min((v for v in (known[-2], values[-2]) if v is not None), key=sqlite_order, default=None)
+        high = max((v for v in (known[-1], values[-1]) if v is not None), key=sqlite_order, default=None)
+        values = tuple(a + b for a, b in zip(known[:-2], values[:-2])) + (low, high)
+    expected[key] = values
+
+def sqlite_order(value):
+    """与SQLite的比较顺序一致的排序键：数字在文本之前，列中混有文本值时也能比较"""
+    return isinstance(value, (str, bytes)), value
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def rollup_values_equal(expected, actual, tolerance):
+    """比较 (row_count, value_count, value_sum, min_value, max_value)，value_sum允许浮点误差
+
+    value_sum 不是数字（如测量值为文本时）不抛出异常，只在两边完全相同时视为一致。
+    """
+    if expected[:2] != actual[:2] or expected[3:] != actual[3:]:
+        return False
+    if not (is_number(expected[2]) and is_number(actual[2])):
+        return expected[2] == actual[2]
+    return abs(expected[2] - actual[2]) <= tolerance * max(1.0, abs(expected[2]))
+
+def summary_source(conn, interval, type_id=None, instrument_ids=None, end_time=None, router=None):
+    """返回摘要的数据源SQL和参数：汇总表中的完整时间段 UNION ALL end_time 所在时间段的记录
+
+    每行为 (instrument_id, period, row_count, value_count, value_sum, min_value, max_value)，
+    instrument_ids 为仪器列表时按 instrument_id IN (...) 过滤。end_time 无效时抛出 ValueError。
+    """
+    date_format = INTERVAL_FORMATS[interval]
+
+    rollup_query = '''
+        SELECT instrument_id, period, row_count, value_count, value_sum, min_value, max_value
+        FROM measurement_rollup
+        WHERE interval = ?
+    '''
+    rollup_params = [interval]
+    raw_query = None
+    raw_params = []
+
+    filters = ''
+    filter_params = []
+    if type_id:
+        filters += ' AND type_id = ?'
+        filter_params.append(type_id)
+    if instrument_ids:
+        filters += f' AND instrument_id IN ({", ".join("?" * len(instrument_ids))})'
+        filter_params += list(instrument_ids)
+    rollup_query += filters
+    rollup_params += filter_params
+
+    if end_time:
+        # end_time所在时间段的起止换算为整数秒，按 measure_ts 索引范围读取，不逐行解析时间
+        end = parse_time(end_time)
+        start = period_start(end, interval)
+        period = start.strftime(date_format)
+        rollup_query += ' AND period < ?'
+        rollup_params.append(period)
+        start_ts, end_ts = to_epoch(start), to_epoch(end)
+        tables = router.sources(conn, start_ts, end_ts) if router else ['measurement']
+        parts = []
+        for table in tables:
+            if isinstance(table, str):
+                parts.append(f'''
+                SELECT instrument_id, ?, 1, value IS NOT NULL, IFNULL(value, 0), value, value
+                FROM {table}
+                WHERE measure_ts >= ? AND measure_ts <= ?
+                  {filters}
+                ''')
+                raw_params += [period, start_ts, end_ts] + filter_params
+            else:
+                # 列式分区按索引顺序取出该时间段的值，以JSON数组传入，与SQLite分区按同样的顺序累加
+                for instrument_id in instrument_ids or [None]:
+                    parts.append('''
+                    SELECT ?, ?, 1, value IS NOT NULL, IFNULL(value, 0), value, value
+                    FROM json_each(?)
+                    ''')
+                    raw_params += [instrument_id, period, json.dumps(
+                        table.values_between(start_ts, end_ts, type_id, instrument_id)
+                    )]
+        raw_query = ' UNION ALL '.join(parts) or None
+
+    if raw_query:
+        return f'{rollup_query} UNION ALL {raw_query}', rollup_params + raw_params
+    return rollup_query, rollup_params
+
+def query_summary(conn, interval, type_id=None, instrument_id=None, end_time=None, limit=12,
+                  router=None):
+    """按时间段返回 (period, count, avg_value, min_value, max_value)，按时间段倒序
+
+    完整的时间段直接读汇总表；end_time 所在的时间段只统计 measure_time <= end_time 的记录，
+    从 measurement 中按索引读取该时间段内的记录计算。end_time 无效时抛出 ValueError。
+    传入分区路由 router 时，该时间段的记录从路由裁剪后的热数据或归档分区中读取
+    （时间段不跨年，通常只涉及一个表），列式分区的值按与索引相同的顺序以JSON数组传入。
+    """
+    if interval not in INTERVAL_FORMATS:
+        interval = 'year'
+    source, params = summary_source(
+        conn, interval, type_id, [instrument_id] if instrument_id else None, end_time, router
+    )
+    query = f'''
+        SELECT period,
+               SUM(row_count) AS count,
+               SUM(value_sum) / NULLIF(SUM(value_count), 0) AS avg_value,
+               MIN(min_value) AS min_value,
+               MAX(max_value) AS max_value
+        FROM ({source})
+        GROUP BY period
+        ORDER BY period DESC
+        LIMIT ?
+    '''
+    return conn.execute(query, params + [limit]).fetchall()
+
+def query_summaries(conn, interval, instrument_ids, type_id=None, end_time=None, limit=12, router=None):
+    """按仪器返回 query_summary 的结果 {instrument_id: 行列表}，多个仪器共用一条SQL
+
+    汇总表和 end_time 所在时间段的记录按 instrument_id IN (...) 一次读取，按仪器和时间段分组，
+    再用 ROW_NUMBER 窗口函数为每个仪器取最新的 limit 个时间段（limit 为负数时不限制）。
+    每行比 query_summary 多出第一列 instrument_id。
+    """
+    if interval not in INTERVAL_FORMATS:
+        interval = 'year'
+    instrument_ids = list(dict.fromkeys(instrument_ids))
+    source, params = summary_source(conn, interval, type_id, instrument_ids, end_time, router)
+    query = f'''
+        SELECT instrument_id, period, count, avg_value, min_value, max_value
+        FROM (
+            SELECT instrument_id, period,
+                   SUM(row_count) AS count,
+                   SUM(value_sum) / NULLIF(SUM(value_count), 0) AS avg_value,
+                   MIN(min_value) AS min_value,
+                   MAX(max_value) AS max_value,
+                   ROW_NUMBER() OVER (PARTITION BY instrument_id ORDER BY period DESC) AS period_rank
+            FROM ({source})
+            GROUP BY instrument_id, period
+        )
+        WHERE period_rank <= ? OR ? < 0
+        ORDER BY instrument_id, period DESC
+    '''
+    summaries = {instrument_id: [] for instrument_id in instrument_ids}
+    for row in conn.execute(query, params + [limit, limit]).fetchall():
+        summaries[row[0]].append(row)
+    return summaries
@@ -0,0 +1,97 @@
+"""
+统计计数器模块 - measurement_stats 按监测类型保存记录数、值的个数与和、首末观测时间
+
+计数器由 measurement 上的触发器在写入的同一事务中维护（见迁移6），/api/statistics 只读取
+每个监测类型一行的计数器和仪器目录，耗时与测量记录数无关。这里提供全量重建、漂移校验和查询。
+"""
+import itertools
+from .rollups import is_number, merge_totals, rollup_values_equal
+
+# 从测量记录直接计算计数器
+AGGREGATE_SQL = '''
+    SELECT type_id, COUNT(*), COUNT(value), TOTAL(value), MIN(measure_time), MAX(measure_time)
+    FROM {table}
+    GROUP BY type_id
+'''
+
+STATS_COLUMNS = 'type_id, row_count, value_count, value_sum, first_time, last_time'
+
+# 把归档分区的计数累加到计数器
+MERGE_SQL = f'''
+    INSERT INTO measurement_stats ({STATS_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (type_id) DO UPDATE SET
+        row_count = row_count + excluded.row_count,
+        value_count = value_count + excluded.value_count,
+        value_sum = value_sum + excluded.value_sum,
+        first_time = CASE WHEN first_time IS NULL OR excluded.first_time < first_time
+                          THEN excluded.first_time ELSE first_time END,
+        last_time = CASE WHEN last_time IS NULL OR excluded.last_time > last_time
+                         THEN excluded.last_time ELSE last_time END
+'''
+
+def aggregate_stats(conn, table='measurement'):
+    """按指定的测量记录表计算计数器"""
+    return conn.execute(AGGREGATE_SQL.format(table=table)).fetchall()
+
+def rebuild_stats(conn, archived=()):
+    """清空并按测量记录重新计算计数器，返回监测类型数（在调用方的事务中执行）
+
+    archived 为归档分区的计数（aggregate_stats 的结果），累加到 measurement 表的结果上。
+    """
+    conn.execute('DELETE FROM measurement_stats')
+    conn.execute(f'INSERT INTO measurement_stats ({STATS_COLUMNS}) {AGGREGATE_SQL.format(table="measurement")}')
+    conn.executemany(MERGE_SQL, archived)
+    return conn.execute('SELECT COUNT(*) FROM measurement_stats').fetchone()[0]
+
+def check_stats(conn, tolerance=1e-6, archived=()):
+    """对比计数器和按测量记录（及归档分区的计数）重新计算的结果，返回漂移的描述列表
+
+    记录数为0的计数器行等同于不存在；value_sum 按相对误差比较，超出容差时报告漂移量。
+    """
+    expected = {}
+    for row in itertools.chain(aggregate_stats(conn), archived):
+        merge_totals(expected, row[0], tuple(row[1:]))
+    actual = {
+        row[0]: tuple(row[1:])
+        for row in conn.execute(f'SELECT {STATS_COLUMNS} FROM measurement_stats WHERE row_count != 0')
+    }
+    problems = []
+    for type_id in sorted(expected.keys() - actual.keys()):
+        problems.append(f'缺少类型 {type_id} 的计数器')
+    for type_id in sorted(actual.keys() - expected.keys()):
+        problems.append(f'多余的类型 {type_id} 计数器: {actual[type_id]}')
+    for type_id in sorted(expected.keys() & actual.keys()):
+        want, got = expected[type_id], actual[type_id]
+        # (row_count, value_count, value_sum, first_time, last_time) 与汇总行的比较方式相同
+        if not rollup_values_equal(want, got, tolerance):
+            problem = f'类型 {type_id} 计数器漂移: 应为 {want}，实际 {got}'
+            # value_sum 不是数字（测量值为文本）时无法计算偏差
+            if is_number(want[2]) and is_number(got[2]):
+                problem += f'，value_sum 偏差 {got[2] - want[2]:.6g}'
+            problems.append(problem)
+    return problems
+
+def query_statistics(conn):
+    """返回总体统计：{total_measurements, type_statistics, time_range, instrument_count}"""
+    type_stats = conn.execute('''
+        SELECT t.name, s.row_count AS count, s.value_sum / NULLIF(s.value_count, 0) AS avg_value,
+               s.first_time, s.last_time
+        FROM measurement_stats s
+        JOIN monitoring_type t ON s.type_id = t.id
+        WHERE s.row_count > 0
+        ORDER BY s.type_id
+    ''').fetchall()
+    total, first_time, last_time = conn.execute('''
+        SELECT IFNULL(SUM(row_count), 0), MIN(first_time), MAX(last_time)
+        FROM measurement_stats
+        WHERE row_count > 0
+    ''').fetchone()
+    instrument_count = conn.execute(
+        'SELECT COUNT(DISTINCT instrument_id) FROM instrument WHERE row_count > 0'
+    ).fetchone()[0]
+    return {
+        'total_measurements': total,
+        'type_statistics': type_stats,
+        'time_range': (first_time, last_time),
+        'instrument_count': instrument_count
+    }
@@ -0,0 +1,23 @@
+"""
+测试公共夹具 - 在临时目录中按迁移建立只有表结构的数据库
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# 应用和模块级连接池使用临时目录中的数据库，不读写 backend/data/monitoring.db
+os.environ['DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='smartwater-tests-'), 'monitoring.db')
+
+from storage import migrate_database, set_journal_mode
+
+
+@pytest.fixture
+def schema_db(tmp_path):
+    """执行全部迁移的空数据库（WAL模式），返回数据库路径"""
+    db_path = str(tmp_path / 'monitoring.db')
+    set_journal_mode(db_path, 'WAL')
+    migrate_database(db_path)
+    return db_path
@@ -0,0 +1,108 @@
+"""
+并发测试 - 写入队列执行批量写入事务期间，连接池的只读连接仍能在限定时间内完成查询
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from storage import ConnectionPool, IngestQueue
+
+# 批量写入的行数和读线程数
+BULK_ROWS = 50000
+READERS = 4
+READS_PER_READER = 20
+
+# 写事务打开期间单次读取的最长耗时（秒）；被写事务阻塞时会等到 busy_timeout（5秒）才失败
+READ_BOUND = 1.0
+
+# 读请求使用的查询：明细、汇总表、仪器目录和计数器
+READ_QUERIES = [
+    'SELECT COUNT(*) FROM measurement',
+    'SELECT id, measure_time, value FROM measurement WHERE type_id = 1 ORDER BY measure_ts DESC, id DESC LIMIT 100',
+    "SELECT period, row_count, value_sum FROM measurement_rollup WHERE interval = 'day'",
+    'SELECT instrument_id, type_id FROM instrument',
+    'SELECT type_id, row_count FROM measurement_stats',
+]
+
+
+def bulk_rows(count, instrument_id='BULK'):
+    start = datetime(2030, 1, 1)
+    return [
+        (1, instrument_id, (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'), float(i))
+        for i in range(count)
+    ]
+
+
+def test_reads_continue_during_bulk_write(schema_db):
+    ingest = IngestQueue(schema_db, journal_mode='WAL', timeout=60)
+    pool = ConnectionPool(schema_db, size=READERS, readonly=True, journal_mode='WAL')
+    rows = bulk_rows(BULK_ROWS)
+    write_open = threading.Event()
+    reads_done = threading.Event()
+    write_result = {}
+
+    def bulk_insert(cursor):
+        # 页缓存放不下整批写入，提交前就要把脏页写入数据库文件（与大批量导入相同）；
+        # 回滚日志模式下这需要排他锁，读连接会被阻塞，WAL模式下只写入WAL文件
+        cursor.execute('PRAGMA cache_size = -1024')
+        cursor.executemany('''
+            INSERT INTO measurement (type_id, instrument_id, measure_time, value, measure_ts)
+            VALUES (?1, ?2, ?3, ?4, CAST(strftime('%s', ?3) AS INTEGER))
+        ''', rows)
+        # 写事务保持打开，直到读线程全部结束（或超时）
+        write_open.set()
+        reads_done.wait(timeout=15)
+        return cursor.rowcount
+
+    def writer():
+        write_result['rows'] = ingest.submit(bulk_insert)
+
+    write_thread = threading.Thread(target=writer)
+    write_thread.start()
+    assert write_open.wait(timeout=30), '批量写入没有开始'
+
+    latencies, counts, errors = [], [], []
+    lock = threading.Lock()
+
+    def reader():
+        conn = None
+        try:
+            conn = pool.acquire()
+            for n in range(READS_PER_READER):
+                sql = READ_QUERIES[n % len(READ_QUERIES)]
+                started = time.perf_counter()
+                result = conn.execute(sql).fetchall()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if sql == READ_QUERIES[0]:
+                        counts.append(result[0][0])
+        except Exception as e:
+            with lock:
+                errors.append(e)
+        finally:
+            if conn is not None:
+                pool.release(conn)
+
+    read_threads = [threading.Thread(target=reader) for _ in range(READERS)]
+    for thread in read_threads:
+        thread.start()
+    for thread in read_threads:
+        thread.join(timeout=30)
+    write_still_open = write_thread.is_alive()
+    reads_done.set()
+    write_thread.join(timeout=60)
+
+    assert errors == []
+    assert len(latencies) == READERS * READS_PER_READER
+    assert max(latencies) < READ_BOUND, f'写事务期间读取最长耗时 {max(latencies):.3f} 秒'
+    # 读取在写事务提交之前完成，看到的是写入前的快照
+    assert write_still_open
+    assert set(counts) == {0}
+
+    assert write_result['rows'] == BULK_ROWS
+    conn = pool.acquire()
+    try:
+        assert conn.execute('SELECT COUNT(*) FROM measurement').fetchone()[0] == BULK_ROWS
+        assert conn.execute('SELECT row_count FROM measurement_stats WHERE type_id = 1').fetchone()[0] == BULK_ROWS
+    finally:
+        pool.release(conn)
@@ -0,0 +1,48 @@
+"""
+导入测试 - 旧导入流程遇到重复的时间时，派生表与测量记录保持一致（migrate.py --check 的校验）
+"""
+import os
+import sqlite3
+import pandas as pd
+import data_import
+from storage import check_derived, configure_connection
+
+# 同一时间出现两次的工作簿：后一行改写前一行
+WORKBOOKS = {
+    '水位': pd.DataFrame({
+        '观测时间': ['2024-01-01 08:00:00', '2024-01-01 08:00:00', '2024-01-02 08:00:00'],
+        '上游': [100.0, 101.0, 102.0],
+        '下游': [50.0, 51.0, None],
+    }),
+    '静力水准': pd.DataFrame({
+        '观测时间': ['2024-01-01 08:00:00', '2024-01-02 08:00:00', '2024-01-02 08:00:00'],
+        'SL1': [1.0, 2.0, 3.0],
+        'SL2': [4.0, 5.0, 6.0],
+    }),
+}
+
+
+def read_workbook(path, *args, **kwargs):
+    return WORKBOOKS[os.path.splitext(os.path.basename(path))[0]].copy()
+
+
+def test_legacy_import_with_duplicate_times(schema_db, monkeypatch):
+    monkeypatch.setattr(data_import.pd, 'read_excel', read_workbook)
+    conn = configure_connection(sqlite3.connect(schema_db))
+    try:
+        data_import.import_water_level(conn)
+        data_import.import_static_level(conn)
+        conn.commit()
+        # 再次导入：每条记录都与已有记录冲突
+        data_import.import_water_level(conn)
+        conn.commit()
+
+        assert check_derived(conn) == {'measurement_rollup': [], 'instrument': [], 'measurement_stats': []}
+        assert conn.execute('SELECT COUNT(*) FROM measurement').fetchone()[0] == 7
+        assert dict(conn.execute('SELECT type_id, row_count FROM measurement_stats').fetchall()) == {2: 4, 3: 3}
+        assert conn.execute('''
+            SELECT value FROM measurement
+            WHERE instrument_id = '上游' AND measure_time = '2024-01-01 08:00:00'
+        ''').fetchone()[0] == 101.0
+    finally:
+        conn.close()
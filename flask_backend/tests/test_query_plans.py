@@ -0,0 +1,28 @@
+"""
+执行计划测试 - 各读接口执行的查询不能对 measurement 全表扫描，新增的读接口必须纳入检查
+"""
+import sqlite3
+from storage import StorageConfig, configure_connection, migrate_database
+from migrate import check_plans, endpoint_paths, uncovered_endpoints
+
+
+def test_endpoint_queries_avoid_full_scans():
+    migrate_database()
+    conn = configure_connection(sqlite3.connect(StorageConfig.DB_PATH))
+    try:
+        assert check_plans(conn) == []
+    finally:
+        conn.close()
+
+
+def test_new_read_endpoint_is_reported():
+    migrate_database()
+    conn = configure_connection(sqlite3.connect(StorageConfig.DB_PATH))
+    try:
+        paths = endpoint_paths(conn)
+    finally:
+        conn.close()
+    assert uncovered_endpoints(paths) == []
+    # 去掉导出接口的请求后，该端点被报告为没有检查
+    paths = [path for path in paths if not str(path).startswith('/api/measurements/export')]
+    assert uncovered_endpoints(paths) == ['export_measurements']
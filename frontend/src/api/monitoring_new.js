@@ -30,6 +30,7 @@ export async function getInstruments() {
  * @param {string} params.end_time - 结束时间（可选）
  * @param {number} params.limit - 返回记录数（可选，默认100）
  * @param {number} params.offset - 偏移量（可选，默认0）
+ * @param {number} params.max_points - 每个序列的最大点数（可选，服务端按LTTB降采样，忽略limit/offset）
  * @returns {Promise} 测量数据列表
  */
 export async function getMeasurements(params = {}) {
@@ -46,6 +47,46 @@ export async function getStatistics() {
   return response.data
 }
 
+// 测量数据的列式表示（请求头Accept协商）
+const COLUMNAR_JSON = 'application/vnd.smartwater.columnar+json'
+const COLUMNAR_BINARY = 'application/vnd.smartwater.columnar'
+
+/**
+ * 解码二进制列式响应：8字节标识 + 头部长度(uint64) + JSON头部，之后是按8字节对齐的小端数组
+ * @param {ArrayBuffer} buffer - 响应体
+ * @returns {Object} 与列式JSON相同的结构，各列为TypedArray（value/water_level中NULL为NaN，id/measure_ts转换为Number）
+ */
+function decodeColumnarBinary(buffer) {
+  const view = new DataView(buffer)
+  const headerLength = Number(view.getBigUint64(8, true))
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 16, headerLength)))
+  const dataStart = 16 + headerLength
+  const arrays = { '<i4': Int32Array, '<i8': BigInt64Array, '<f8': Float64Array }
+  const result = { ...header }
+  delete result.columns
+  for (const column of header.columns) {
+    const values = new arrays[column.dtype](buffer, dataStart + column.offset, column.count)
+    result[column.name] = column.dtype === '<i8' ? Float64Array.from(values, Number) : values
+  }
+  return result
+}
+
+/**
+ * 按列获取测量数据：参数与getMeasurements相同，序列元数据只返回一次
+ * @param {Object} params - 查询参数（同getMeasurements）
+ * @param {boolean} binary - 是否使用二进制表示（默认列式JSON）
+ * @returns {Promise<Object>} {rows, series, series_index, id, measure_ts, value, water_level}，
+ *   第i行的类型名称、单位和仪器为series[series_index[i]]，measure_ts为UTC秒；游标分页时另含next_cursor
+ */
+export async function getMeasurementColumns(params = {}, binary = false) {
+  const response = await http.get('/api/measurements', {
+    params,
+    headers: { Accept: binary ? COLUMNAR_BINARY : COLUMNAR_JSON },
+    responseType: binary ? 'arraybuffer' : 'json'
+  })
+  return binary ? decodeColumnarBinary(response.data) : response.data
+}
+
 /**
  * 获取数据摘要
  * @param {Object} params - 查询参数
@@ -61,6 +102,42 @@ export async function getMeasurementsSummary(params = {}) {
   return response.data
 }
 
+/**
+ * 批量查询：一个请求执行多个测量数据和摘要子查询
+ * @param {Array<Object>} queries - 子查询列表，kind 为 'measurements' 或 'summary'，其余参数与
+ *   getMeasurements/getMeasurementsSummary 相同（不支持cursor），每次最多50个
+ * @returns {Promise<Array>} 与 queries 一一对应的结果（参数无效的子查询为 {error, message}）
+ */
+export async function batchQuery(queries) {
+  const response = await http.post('/api/batch', { queries })
+  return response.data.results
+}
+
+/**
+ * 导出测量数据文件（服务端按时间升序流式生成，不受条数限制）
+ * @param {Object} params - 查询参数
+ * @param {number} params.type_id - 监测类型ID（可选）
+ * @param {string|Array<string>} params.instrument_id - 仪器ID，可以是多个（可选）
+ * @param {string} params.start_time - 开始时间（可选）
+ * @param {string} params.end_time - 结束时间（可选）
+ * @param {string} params.format - 文件格式（csv/ndjson，默认csv）
+ * @param {string} params.layout - 布局（long每条记录一行/wide每个测量时间一行，默认long）
+ * @returns {Promise<Blob>} 导出的文件
+ */
+export async function exportMeasurements(params = {}) {
+  const { instrument_id, ...rest } = params
+  const response = await http.get('/api/measurements/export', {
+    params: {
+      ...rest,
+      instrument_id: Array.isArray(instrument_id) ? instrument_id.join(',') : instrument_id
+    },
+    responseType: 'blob',
+    // 导出全部历史可能超过默认的请求超时
+    timeout: 0
+  })
+  return response.data
+}
+
 /**
  * 创建新的测量记录（需要管理员权限）
  * @param {Object} data - 测量记录数据